@@ -2,48 +2,63 @@
 API endpoints for the notification organizer app
 """
 
-from flask import jsonify, request
-from datetime import datetime, timedelta
-from functions.config import get_config, get_logs, get_log_stats
+from flask import Response, jsonify, request
+from datetime import datetime
+from functions.config import get_config, get_recent_logs, query_logs, search_logs, logs_truncated, get_log_count, get_log_stats, get_config_cache_stats
 from functions.flow_stats import get_flow_statistics, get_recent_flow_activity
 from functions.notifications import send_discord_notification
-from functions.utils import get_notification_logs
+from functions.utils import search_notification_logs, count_notification_logs, notification_logs_truncated, get_log_filter_stats
 from functions.version import get_version, get_version_info
+from functions.flow_state import merge_flow_state
+from functions.write_behind import get_write_behind_stats
+from functions.file_lock import get_lock_stats
+from functions.log_writer import get_log_writer_stats
+from functions.counters import get_total_sent, get_counter_snapshot
+from functions.flow_spec import get_flow_specs, get_flow_spec, find_flows, get_flow_spec_stats
+from functions.rollups import RESOLUTIONS, get_timeseries, get_window_totals
+from functions.timestamps import now_ms, record_ts
+from functions.log_buffer import MAX_LOG_PAGE_SIZE
+from functions.live_tail import FEED_KINDS, LIVE_TAIL_KEEPALIVE, get_live_feed, get_live_tail_stats, matches
+from functions.template_deps import get_render_memo_stats
 import json
 import sys
 
+SEARCH_SOURCES = ('all', 'logs', 'notifications')
+
+# Milliseconds EventSource waits before reconnecting to the live tail
+SSE_RETRY_MS = 3000
+
 def init_api_routes(app):
     """Initialize API routes"""
     
     @app.route('/api/status')
     def api_status():
         """Get overall app status"""
-        config = get_config()
-        flows = config.get('notification_flows', [])
-        active_flows = [flow for flow in flows if flow.get('active', False)]
+        flows = get_flow_specs()
+        active_flows = [flow for flow in flows if flow.active]
         
         return jsonify({
             'status': 'running',
             'timestamp': datetime.now().isoformat(),
             'total_flows': len(flows),
             'active_flows': len(active_flows),
-            'version': get_version()
+            'version': get_version(),
+            'notifications_sent': get_total_sent(),
+            'config_cache': get_config_cache_stats(),
+            'write_behind': get_write_behind_stats(),
+            'flow_specs': get_flow_spec_stats(),
+            'file_locks': get_lock_stats(),
+            'log_writer': get_log_writer_stats(),
+            'log_filter': get_log_filter_stats(),
+            'live_tail': get_live_tail_stats(),
+            'render_memo': get_render_memo_stats()
         })
     
     @app.route('/api/flows')
     def api_flows():
         """Get all notification flows"""
-        config = get_config()
-        flows = config.get('notification_flows', [])
-        
-        # Clean up sensitive data
-        safe_flows = []
-        for flow in flows:
-            safe_flow = flow.copy()
-            # Remove webhook URLs for security
-            safe_flow.pop('webhook_url', None)
-            safe_flow.pop('webhook_secret', None)
-            safe_flows.append(safe_flow)
+        # Webhook URLs and secrets are left out for security
+        safe_flows = [merge_flow_state(flow.public_dict()) for flow in get_flow_specs()]
         
         return jsonify({
             'flows': safe_flows,
@@ -53,17 +68,8 @@ def init_api_routes(app):
     @app.route('/api/flows/active')
     def api_active_flows():
         """Get only active notification flows"""
-        config = get_config()
-        flows = config.get('notification_flows', [])
-        active_flows = [flow for flow in flows if flow.get('active', False)]
-        
-        # Clean up sensitive data
-        safe_flows = []
-        for flow in active_flows:
-            safe_flow = flow.copy()
-            safe_flow.pop('webhook_url', None)
-            safe_flow.pop('webhook_secret', None)
-            safe_flows.append(safe_flow)
+        # Webhook URLs and secrets are left out for security
+        safe_flows = [merge_flow_state(flow.public_dict()) for flow in find_flows(active=True)]
         
         return jsonify({
             'flows': safe_flows,
@@ -73,32 +79,43 @@ def init_api_routes(app):
     @app.route('/api/flows/<flow_name>')
     def api_flow_details(flow_name):
         """Get details for a specific flow"""
-        config = get_config()
-        flows = config.get('notification_flows', [])
-        
-        flow = next((f for f in flows if f['name'] == flow_name), None)
+        flow = get_flow_spec(flow_name)
         if not flow:
             return jsonify({'error': 'Flow not found'}), 404
         
-        # Clean up sensitive data
-        safe_flow = flow.copy()
-        safe_flow.pop('webhook_url', None)
-        safe_flow.pop('webhook_secret', None)
+        # Webhook URL and secret are left out for security
+        return jsonify(merge_flow_state(flow.public_dict()))
+    
+    @app.route('/api/flows/<flow_name>/timeseries')
+    def api_flow_timeseries(flow_name):
+        """Get a flow's activity and latency per minute, hour or day"""
+        if not get_flow_spec(flow_name):
+            return jsonify({'error': 'Flow not found'}), 404
         
-        return jsonify(safe_flow)
+        resolution = request.args.get('resolution', 'hour')
+        if resolution not in RESOLUTIONS:
+            return jsonify({'error': f"Invalid resolution, expected one of: {', '.join(RESOLUTIONS)}"}), 400
+        buckets = request.args.get('buckets', type=int)
+        hours = request.args.get('hours', 24, type=int)
+        
+        return jsonify({
+            'flow': flow_name,
+            'resolution': resolution,
+            'bucket_seconds': RESOLUTIONS[resolution][0],
+            'buckets': get_timeseries(flow_name, resolution, buckets),
+            'totals': get_window_totals(flow_name, hours)
+        })
     
     @app.route('/api/statistics')
     def api_statistics():
         """Get comprehensive app statistics"""
-        config = get_config()
-        flows = config.get('notification_flows', [])
-        logs = get_logs()
+        flows = get_flow_specs()
         
         # Basic flow statistics
-        active_flows = [flow for flow in flows if flow.get('active', False)]
-        timer_flows = [flow for flow in flows if flow.get('trigger_type') == 'timer']
-        change_flows = [flow for flow in flows if flow.get('trigger_type') == 'on_change']
-        webhook_flows = [flow for flow in flows if flow.get('trigger_type') == 'on_incoming']
+        active_flows = [flow for flow in flows if flow.active]
+        timer_flows = [flow for flow in flows if flow.trigger_type == 'timer']
+        change_flows = [flow for flow in flows if flow.trigger_type == 'on_change']
+        webhook_flows = [flow for flow in flows if flow.is_webhook]
         
         # Get detailed flow statistics
         flow_stats = get_flow_statistics()
@@ -107,25 +124,16 @@ def init_api_routes(app):
         recent_activity = get_recent_flow_activity(24)
         
         # Log statistics
-        total_logs = len(logs)
-        recent_logs = len([log for log in logs if 
-                          datetime.now() - datetime.strptime(log['timestamp'], '%Y-%m-%d %H:%M:%S') < timedelta(hours=24)])
+        total_logs = get_log_count()
+        recent_logs = len(get_recent_logs(since=now_ms() - 24 * 3600 * 1000))
         
         # Notification statistics
-        notification_logs = get_notification_logs()
-        total_notifications_in_log = len(notification_logs)
-        total_notifications_sent = config.get('total_notifications_sent', 0)
+        # Counted in the search index, which holds every retained record
+        total_notifications_in_log = count_notification_logs()
+        counters = get_counter_snapshot()
         
-        # Calculate notifications in last 24 hours
-        now = datetime.now()
-        notifications_24h = 0
-        for notification in notification_logs:
-            try:
-                notification_time = datetime.strptime(notification['timestamp'], '%Y-%m-%d %H:%M:%S')
-                if now - notification_time < timedelta(hours=24):
-                    notifications_24h += 1
-            except (ValueError, KeyError):
-                continue
+        # Sent-notification records of the last 24 hours, counted in the search index
+        notifications_24h = count_notification_logs(since=now_ms() - 24 * 3600 * 1000)
         
         return jsonify({
             'timestamp': datetime.now().isoformat(),
@@ -146,7 +154,8 @@ def init_api_routes(app):
                 'last_24h': recent_logs
             },
             'notifications': {
-                'total_sent': total_notifications_sent,
+                'total_sent': counters['total'],
+                'by_flow': counters['flows'],
                 'total_in_current_log': total_notifications_in_log,
                 'last_24h': notifications_24h
             }
@@ -154,19 +163,107 @@ def init_api_routes(app):
     
     @app.route('/api/logs')
     def api_logs():
-        """Get recent logs"""
+        """Get a page of logs, newest first, with optional filters"""
         limit = request.args.get('limit', 50, type=int)
-        limit = min(limit, 1000)  # Cap at 1000 logs
+        limit = max(1, min(limit, MAX_LOG_PAGE_SIZE))  # Cap at 1000 logs per page
         
-        logs = get_logs()
-        recent_logs = list(reversed(logs))[:limit]
+        since = request.args.get('since', type=int)
+        try:
+            logs, next_cursor = query_logs(
+                limit,
+                category=request.args.get('category'),
+                since=since,
+                until=request.args.get('until', type=int),
+                search=request.args.get('q'),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'logs': recent_logs,
-            'count': len(recent_logs),
-            'total_logs': len(logs)
+            'logs': logs,
+            'count': len(logs),
+            'next_cursor': next_cursor,
+            'total_logs': get_log_count(),
+            # The last page reached the oldest retained entry and log_retention dropped older ones
+            'truncated': next_cursor is None and logs_truncated(since)
         })
     
+    @app.route('/api/search')
+    def api_search():
+        """Full-text search over the system logs and sent notifications"""
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Missing search query (q)'}), 400
+        source = request.args.get('source', 'all')
+        if source not in SEARCH_SOURCES:
+            return jsonify({'error': f"Invalid source, expected one of: {', '.join(SEARCH_SOURCES)}"}), 400
+        limit = max(1, min(request.args.get('limit', 50, type=int), MAX_LOG_PAGE_SIZE))
+        filters = {
+            'flow': request.args.get('flow'),
+            'category': request.args.get('category'),
+            'since': request.args.get('since', type=int),
+            'until': request.args.get('until', type=int)
+        }
+        
+        results = []
+        truncated = False
+        if source in ('all', 'logs'):
+            results.extend(dict(entry, source='logs') for entry in search_logs(query, limit, **filters))
+            truncated = logs_truncated(filters['since'])
+        if source in ('all', 'notifications'):
+            results.extend(dict(entry, source='notifications')
+                           for entry in search_notification_logs(query, limit, **filters))
+            truncated = truncated or notification_logs_truncated(filters['since'])
+        # Newest first across both sources
+        results.sort(key=record_ts, reverse=True)
+        results = results[:limit]
+        
+        return jsonify({
+            'query': query,
+            'source': source,
+            'results': results,
+            'count': len(results),
+            # Only retained entries are searched; older matches may have been dropped
+            'truncated': len(results) < limit and truncated
+        })
+    
+    @app.route('/api/logs/stream')
+    def api_logs_stream():
+        """Stream new logs, deliveries and sent notifications as Server-Sent Events"""
+        kinds = request.args.get('types')
+        kinds = set(kinds.split(',')) if kinds else set(FEED_KINDS)
+        if not kinds <= set(FEED_KINDS):
+            return jsonify({'error': f"Invalid types, expected any of: {', '.join(FEED_KINDS)}"}), 400
+        category = request.args.get('category') or None
+        flow = request.args.get('flow') or None
+        # Sent back by EventSource when it reconnects
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+        
+        feed = get_live_feed()
+        after_id = feed.resume_id(last_event_id)
+        
+        def stream():
+            position = after_id
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                items = feed.read_after(position, LIVE_TAIL_KEEPALIVE)
+                if not items:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                for event_id, kind, item in items:
+                    position = event_id
+                    if kind in kinds and matches(kind, item, category, flow):
+                        yield f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(item)}\n\n"
+        
+        return Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
     @app.route('/api/logs/stats')
     def api_log_stats():
         """Get log statistics"""
@@ -246,7 +343,7 @@ def init_api_routes(app):
             }
             
             # Send notification
-            if send_discord_notification(message, test_flow):
+            if send_discord_notification(message, test_flow, trigger='test'):
                 return jsonify({
                     'success': True,
                     'message': 'Test notification sent successfully'
@@ -277,9 +374,12 @@ def init_api_routes(app):
                 'GET /api/flows': 'Get all notification flows',
                 'GET /api/flows/active': 'Get only active flows',
                 'GET /api/flows/<name>': 'Get specific flow details',
+                'GET /api/flows/<name>/timeseries': 'Get flow activity per minute/hour/day (optional: ?resolution=hour&buckets=24&hours=24)',
                 'GET /api/statistics': 'Get comprehensive statistics',
-                'GET /api/logs': 'Get recent logs (optional: ?limit=50)',
+                'GET /api/logs': 'Get a page of logs (optional: ?limit=50&category=&since=&until=&q=&cursor=)',
                 'GET /api/logs/stats': 'Get log statistics',
+                'GET /api/logs/stream': 'Live tail of logs, deliveries and sent notifications as Server-Sent Events (optional: ?types=log,delivery,notification&category=&flow=)',
+                'GET /api/search': 'Search logs and sent notifications (?q=radarr 429, optional: &source=all&flow=&category=&since=&until=&limit=50)',
                 'GET /api/health': 'Health check endpoint',
                 'POST /api/test': 'Send test notification',
                 'POST /api/webhook/<flow_name>': 'Webhook endpoint for flows'
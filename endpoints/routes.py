@@ -1,16 +1,24 @@
 from flask import render_template, request, redirect, url_for, jsonify, flash, abort, send_file
 import secrets
+import sys
 import requests
 import json
 import io
 from datetime import datetime
-from functions.config import get_config, save_config, get_logs, clear_logs, get_log_stats
+from functions.config import get_config, get_config_for_update, save_config, query_logs, get_log_categories, clear_logs, get_log_stats
+from functions.log_buffer import LOG_PAGE_SIZE
 from functions.utils import log_notification, get_notification_logs, format_message_template
 from functions.notifications import send_discord_notification, make_api_request
 from functions.embed_utils import validate_embed_config, create_discord_embed
 from functions.flow_templates import FLOW_TEMPLATES, get_template_categories, get_templates_by_category, get_template
 from functions.flow_stats import get_flow_statistics, get_flow_success_rate, get_recent_flow_activity, export_flow_config, import_flow_config, duplicate_flow
 from functions.version import get_version, get_version_info
+from functions.flow_state import get_flow_state, merge_flow_state, update_flow_state, delete_flow_state, rename_flow_state, payload_to_store
+from functions.counters import rename_flow_counter, delete_flow_counter
+from functions.flow_aggregates import rename_flow_stats, delete_flow_stats
+from functions.flow_spec import get_flow_spec, get_webhook_spec, find_flows
+from functions.log_levels import LOG_LEVELS, DEFAULT_LOG_LEVEL
+from functions.template_tokenizer import check_template
 
 def init_routes(app):
     """Initialize all Flask routes"""
@@ -49,7 +57,7 @@ def init_routes(app):
                 }
                 
                 if test_flow['webhook_url']:
-                    test_result = send_discord_notification(test_message, test_flow)
+                    test_result = send_discord_notification(test_message, test_flow, trigger='test')
                     if test_result:
                         log_notification(f"🧪 Homepage test notification sent: {test_message}")
                         flash('Test notification sent successfully!', 'success')
@@ -62,8 +70,8 @@ def init_routes(app):
                 # Redirect to prevent form resubmission
                 return redirect(url_for('index'))
         
-        active_flows = [flow for flow in config.get('notification_flows', []) 
-                      if flow.get('active', False)]
+        # Merge runtime state into copies so display formatting doesn't leak into the shared config snapshot
+        active_flows = [merge_flow_state(flow.raw) for flow in find_flows(active=True, config=config)]
         
         # Convert last_run timestamp to readable format if it exists
         for flow in active_flows:
@@ -79,7 +87,8 @@ def init_routes(app):
 
     @app.route('/configure', methods=['GET', 'POST'])
     def configure():
-        config = get_config()
+        # Edits go to a private copy; the shared snapshot only changes once saved
+        config = get_config_for_update() if request.method == 'POST' else get_config()
         user_variables = config.get('user_variables', {})
         if request.method == 'POST':
             try:
@@ -91,6 +100,7 @@ def init_routes(app):
                 check_interval = int(request.form.get('check_interval', 5))
                 log_retention = int(request.form.get('log_retention', 1000))
                 notification_log_retention = int(request.form.get('notification_log_retention', 500))
+                log_level = request.form.get('log_level', config.get('log_level', DEFAULT_LOG_LEVEL))
                 # User variables
                 var_keys = request.form.getlist('var_key[]')
                 var_vals = request.form.getlist('var_value[]')
@@ -112,6 +122,9 @@ def init_routes(app):
                 if notification_log_retention < 10 or notification_log_retention > 500:
                     flash('Notification log retention must be between 10 and 500 entries', 'error')
                     return redirect(url_for('configure'))
+                if log_level not in LOG_LEVELS:
+                    flash('Log level must be one of debug, info, warn or error', 'error')
+                    return redirect(url_for('configure'))
                 # Update configuration
                 config['discord_webhook'] = webhook_url
                 config['default_webhook_name'] = default_webhook_name
@@ -119,6 +132,7 @@ def init_routes(app):
                 config['check_interval'] = check_interval
                 config['log_retention'] = log_retention
                 config['notification_log_retention'] = notification_log_retention
+                config['log_level'] = log_level
                 config['user_variables'] = user_variables
                 save_config(config)
                 log_notification("System configuration updated")
@@ -135,21 +149,20 @@ def init_routes(app):
     @app.route('/logs')
     def show_logs():
         category = request.args.get('category', '')
-        logs = get_logs()
-        
-        # Filter by category if specified
-        if category:
-            logs = [log for log in logs if log.get('category', 'General') == category]
+        search = request.args.get('q', '')
+        # First page only, newest first; the page fetches older ones from /api/logs as needed
+        logs, next_cursor = query_logs(LOG_PAGE_SIZE, category=category, search=search)
         
         # Get unique categories for filter dropdown
-        all_logs = get_logs()
-        categories = list(set(log.get('category', 'General') for log in all_logs))
-        categories.sort()
+        categories = get_log_categories()
         
         return render_template('logs.html', 
-                             logs=reversed(logs), 
+                             logs=logs, 
+                             next_cursor=next_cursor,
+                             page_size=LOG_PAGE_SIZE,
                              categories=categories,
-                             selected_category=category)
+                             selected_category=category,
+                             search=search)
 
     @app.route('/logs/clear', methods=['POST'])
     def clear_notification_logs():
@@ -165,7 +178,8 @@ def init_routes(app):
 
     @app.route('/builder', methods=['GET', 'POST'])
     def notification_builder():
-        config = get_config()
+        # Edits go to a private copy; the shared snapshot only changes once saved
+        config = get_config_for_update() if request.method == 'POST' else get_config()
         edit_index = request.args.get('edit', type=int)
         editing_flow = None
         
@@ -296,14 +310,11 @@ def init_routes(app):
                 elif 'webhook_secret' in updated_flow:
                     del updated_flow['webhook_secret']
                 
-                # Preserve existing tracking data if editing
-                if editing_flow:
-                    if 'last_value' in editing_flow:
-                        updated_flow['last_value'] = editing_flow['last_value']
-                    if 'last_run' in editing_flow:
-                        updated_flow['last_run'] = editing_flow['last_run']
-                    if 'last_data' in editing_flow:
-                        updated_flow['last_data'] = editing_flow['last_data']
+                # Tracking data lives in the state store; carry it over if the flow was renamed
+                if editing_flow and editing_flow.get('name') != updated_flow['name']:
+                    rename_flow_state(editing_flow['name'], updated_flow['name'])
+                    rename_flow_counter(editing_flow['name'], updated_flow['name'])
+                    rename_flow_stats(editing_flow['name'], updated_flow['name'])
                 
                 # Initialize flows list if it doesn't exist
                 if 'notification_flows' not in config:
@@ -359,19 +370,20 @@ def init_routes(app):
             if not isinstance(data['flow_name'], str) or not isinstance(data['active'], bool):
                 return jsonify({'success': False, 'error': 'Invalid data types: flow_name must be string, active must be boolean'}), 400
             
-            config = get_config()
-            
-            for flow in config['notification_flows']:
-                if flow['name'] == data['flow_name']:
-                    flow['active'] = data['active']
-                    try:
-                        save_config(config)
-                        return jsonify({'success': True})
-                    except Exception as save_error:
-                        log_notification(f"Failed to save config when toggling flow {data['flow_name']}: {str(save_error)}")
-                        return jsonify({'success': False, 'error': 'Failed to save configuration'}), 500
+            shared = get_config()
             
-            return jsonify({'success': False, 'error': 'Flow not found'}), 404
+            flow = get_flow_spec(data['flow_name'], shared)
+            if flow is None:
+                return jsonify({'success': False, 'error': 'Flow not found'}), 404
+
+            config = get_config_for_update(shared)
+            config['notification_flows'][flow.index]['active'] = data['active']
+            try:
+                save_config(config)
+                return jsonify({'success': True})
+            except Exception as save_error:
+                log_notification(f"Failed to save config when toggling flow {data['flow_name']}: {str(save_error)}")
+                return jsonify({'success': False, 'error': 'Failed to save configuration'}), 500
             
         except ValueError as json_error:
             return jsonify({'success': False, 'error': 'Invalid JSON format'}), 400
@@ -381,10 +393,13 @@ def init_routes(app):
 
     @app.route('/delete_flow/<int:index>')
     def delete_flow(index):
-        config = get_config()
+        config = get_config_for_update()
         if 0 <= index < len(config.get('notification_flows', [])):
-            config['notification_flows'].pop(index)
+            removed_flow = config['notification_flows'].pop(index)
             save_config(config)
+            delete_flow_state(removed_flow.get('name', ''))
+            delete_flow_counter(removed_flow.get('name', ''))
+            delete_flow_stats(removed_flow.get('name', ''))
             flash('Notification flow deleted', 'success')
         # Redirect to the referring page, or statistics if not available
         return redirect(request.referrer)
@@ -530,7 +545,7 @@ def init_routes(app):
             
             # Send notification
             log_notification(f"🧪 Test notification: Sending test for flow '{test_flow['name']}'")
-            if send_discord_notification(test_flow['message_template'], test_flow, sample_data):
+            if send_discord_notification(test_flow['message_template'], test_flow, sample_data, trigger='test'):
                 return jsonify({'success': True})
             else:
                 return jsonify({'success': False, 'error': 'Failed to send Discord notification'})
@@ -541,19 +556,15 @@ def init_routes(app):
 
     @app.route('/api/webhook/<flow_name>', methods=['POST'])
     def handle_webhook(flow_name):
-        config = get_config()
-        
-        # Find the flow
-        flow = next((f for f in config.get('notification_flows', []) 
-                   if f['name'] == flow_name and f['active'] and 
-                   f['trigger_type'] == 'webhook'), None)
+        # Find the first active webhook flow with this name
+        flow = get_webhook_spec(flow_name)
         
         if not flow:
             abort(404, description="Flow not found, inactive, or not accepting webhooks")
         
         # Verify secret if present
-        if flow.get('webhook_secret'):
-            if request.headers.get('X-Secret') != flow['webhook_secret']:
+        if flow.webhook_secret:
+            if request.headers.get('X-Secret') != flow.webhook_secret:
                 abort(403, description="Invalid webhook secret")
         
         try:
@@ -572,31 +583,29 @@ def init_routes(app):
                 log_notification(f"Webhook error for {flow_name}: Data too large ({data_size} bytes)")
                 abort(413, description="Request data too large")
             
-            # Store the data in the flow for use in message formatting
-            flow['last_data'] = data
-            
             # Create enhanced data object with old_value support
             webhook_data = data.copy() if isinstance(data, dict) else {}
             # Add old_value from previous webhook call if available
-            webhook_data['old_value'] = flow.get('last_value')
+            webhook_data['old_value'] = get_flow_state(flow_name).get('last_value')
             
             # Extract value from current data if there's a field configured
             current_value = None
-            if flow.get('field'):
+            if flow.field:
                 from functions.notifications import extract_field_value
-                current_value = extract_field_value(data, flow['field'])
+                current_value = extract_field_value(data, flow.field)
                 webhook_data['value'] = current_value
             
             # Send notification
             log_notification(f"🌐 Webhook received: Processing webhook for flow '{flow_name}'")
-            if send_discord_notification(flow['message_template'], flow, webhook_data):
-                # Store current value as last_value for next webhook call
+            if send_discord_notification(flow.message_template, flow, webhook_data, trigger='webhook'):
+                # Store the payload, and current value as last_value for next webhook call
+                state_changes = {'last_data': payload_to_store(data, flow.dependencies)}
                 if current_value is not None:
-                    flow['last_value'] = current_value
+                    state_changes['last_value'] = current_value
                 try:
-                    save_config(config)  # Save the updated flow with last_data
+                    update_flow_state(flow_name, **state_changes)
                 except Exception as save_error:
-                    log_notification(f"Failed to save config after webhook for {flow_name}: {str(save_error)}")
+                    log_notification(f"Failed to save flow state after webhook for {flow_name}: {str(save_error)}")
                     # Continue execution - notification was sent successfully
                 return jsonify({"status": "success"})
             else:
@@ -819,6 +828,7 @@ def init_routes(app):
 
             # Format the message
             formatted_message = format_message_template(message_template, sample_data, user_variables)
+            template_errors = [f"Message: {error}" for error in check_template(message_template)]
             
             # Create embed preview if enabled
             embed_preview = None
@@ -862,12 +872,16 @@ def init_routes(app):
                     }
 
                 embed_preview = create_discord_embed(embed_config, sample_data, user_variables)
+                for key in ('title', 'description', 'url', 'footer_text', 'author_name', 'thumbnail_url', 'image_url'):
+                    template_errors.extend(f"Embed {key.replace('_', ' ')}: {error}"
+                                           for error in check_template(embed_config[key]))
             
             return jsonify({
                 'success': True,
                 'message': formatted_message,
                 'embed': embed_preview,
-                'sample_data': sample_data
+                'sample_data': sample_data,
+                'template_errors': template_errors
             })
             
         except Exception as e:
@@ -883,25 +897,12 @@ def init_routes(app):
         category = request.args.get('category', '')
         trigger_type = request.args.get('trigger_type', '')
         
-        config = get_config()
-        flows = config.get('notification_flows', [])
+        # Category and trigger type come straight from the attribute index
+        flows = find_flows(trigger_type=trigger_type or None, category=category or None)
         
-        # Filter flows
-        filtered_flows = []
-        for flow in flows:
-            # Search by name
-            if query and query not in flow['name'].lower():
-                continue
-            
-            # Filter by category
-            if category and flow.get('category', 'General') != category:
-                continue
-            
-            # Filter by trigger type
-            if trigger_type and flow['trigger_type'] != trigger_type:
-                continue
-            
-            filtered_flows.append(flow)
+        # Search by name
+        filtered_flows = [merge_flow_state(flow.raw) for flow in flows
+                          if not query or query in flow.name.lower()]
         
         return jsonify({
             'flows': filtered_flows,
@@ -0,0 +1,118 @@
+"""
+Content-addressed store for flow payloads (last_data).
+
+Each payload is serialized as canonical JSON, zlib-compressed and written
+once to data/blobs/<sha256>. Identical payloads from different flows share
+a single file, and flow state only keeps the hash.
+
+Storing a blob holds a shared lock on the blob directory and garbage
+collection an exclusive one. Collection also spares blobs stored in the
+last BLOB_GC_GRACE seconds: another worker may have just stored one whose
+reference is still waiting in its state write-behind buffer.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functions.config import get_data_dir
+from functions.file_lock import file_lock
+
+BLOB_DIRNAME = 'blobs'
+
+# Number of decompressed payloads kept in memory
+BLOB_CACHE_SIZE = 64
+
+# Seconds a stored blob is kept even if nothing refers to it yet, well past
+# the state write-behind delay (state_flush_interval)
+BLOB_GC_GRACE = 600.0
+
+_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+_blob_cache_lock = threading.Lock()
+# blob path -> decompressed JSON text
+_blob_cache = OrderedDict()
+
+def get_blob_dir():
+    """Get the directory holding payload blobs"""
+    return os.path.join(get_data_dir(), BLOB_DIRNAME)
+
+def _blob_path(digest):
+    return os.path.join(get_blob_dir(), digest)
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+def put_blob(value):
+    """Store a JSON-serializable payload and return its hash"""
+    text = _encode(value)
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    path = _blob_path(digest)
+    os.makedirs(get_blob_dir(), exist_ok=True)
+    with file_lock(get_blob_dir(), exclusive=False):
+        if os.path.exists(path):
+            # Same content, same name: an existing blob never needs rewriting,
+            # only its age reset so garbage collection spares it again
+            os.utime(path)
+        else:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(text.encode('utf-8')))
+            os.replace(tmp_path, path)
+    return digest
+
+def _read_blob_text(path):
+    with _blob_cache_lock:
+        if path in _blob_cache:
+            _blob_cache.move_to_end(path)
+            return _blob_cache[path]
+    with open(path, 'rb') as f:
+        text = zlib.decompress(f.read()).decode('utf-8')
+    with _blob_cache_lock:
+        _blob_cache[path] = text
+        while len(_blob_cache) > BLOB_CACHE_SIZE:
+            _blob_cache.popitem(last=False)
+    return text
+
+def get_blob(digest):
+    """Load a payload by hash (None if it is missing or unreadable)"""
+    if not isinstance(digest, str) or not _HASH_RE.match(digest):
+        return None
+    try:
+        # Parsed fresh each time so callers get their own copy
+        return json.loads(_read_blob_text(_blob_path(digest)))
+    except FileNotFoundError:
+        return None
+    except (zlib.error, ValueError) as e:
+        print(f"Error reading blob {digest}: {e}")
+        return None
+
+def remove_unreferenced_blobs(referenced, grace=None):
+    """Delete blobs whose hash is not in referenced and that are older than
+    grace seconds (BLOB_GC_GRACE by default). Returns the number removed."""
+    grace = BLOB_GC_GRACE if grace is None else grace
+    try:
+        names = os.listdir(get_blob_dir())
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    with file_lock(get_blob_dir()):
+        cutoff = time.time() - grace
+        for name in names:
+            if name in referenced or not _HASH_RE.match(name):
+                continue
+            path = _blob_path(name)
+            try:
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            with _blob_cache_lock:
+                _blob_cache.pop(path, None)
+    return removed
@@ -0,0 +1,97 @@
+"""
+Compiled arithmetic for [calculation] and {calc:...} template expressions.
+
+compile_calculation parses an expression once (cached per expression
+string) into a function of a name lookup. Evaluating it only looks up the
+names the expression uses, when it reaches them, instead of collecting
+every value of the payload first.
+
+Template values inserted into an expression (a {variable} reference or a
+placeholder inside [...]) are compiled as names starting with REF_PREFIX
+and looked up like variables; the caller gives them the number the text
+would have had. As the text of a negative number binds looser than **
+("-2 ** 2" is -4), a reference that is the bare base of a power is
+evaluated the same way.
+"""
+
+import ast
+import operator
+import re
+from functools import lru_cache
+
+# Names standing for values inserted into an expression
+REF_PREFIX = '_calc_ref_'
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+# Number literals whose int()/float() is what the same text means in an expression
+_NUMBER_RE = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?')
+
+def parse_number(text):
+    """The int or float a value's text stands for in an expression; raises ValueError for anything else"""
+    if not _NUMBER_RE.fullmatch(text):
+        raise ValueError(f"Not a number: {text!r}")
+    return float(text) if '.' in text or 'e' in text or 'E' in text else int(text)
+
+def _is_bare_ref(node, source):
+    """Whether node is a reference that is not wrapped in its own parentheses"""
+    if not (isinstance(node, ast.Name) and node.id.startswith(REF_PREFIX)):
+        return False
+    # Offsets are in UTF-8 bytes
+    before = source[:node.col_offset].rstrip()
+    after = source[node.end_col_offset:].lstrip()
+    return not (before.endswith(b'(') and after.startswith(b')'))
+
+def _ref_power(base, exponent):
+    if isinstance(base, (int, float)) and base < 0:
+        return -operator.pow(-base, exponent)
+    return operator.pow(base, exponent)
+
+def _compile_node(node, source):
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda lookup: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda lookup: lookup(name)
+    if isinstance(node, ast.BinOp):
+        op = _BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operation: {type(node.op)}")
+        left = _compile_node(node.left, source)
+        right = _compile_node(node.right, source)
+        if op is operator.pow and _is_bare_ref(node.left, source):
+            return lambda lookup: _ref_power(left(lookup), right(lookup))
+        return lambda lookup: op(left(lookup), right(lookup))
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported unary operation: {type(node.op)}")
+        operand = _compile_node(node.operand, source)
+        return lambda lookup: op(operand(lookup))
+    raise ValueError(f"Unsupported node type: {type(node)}")
+
+@lru_cache(maxsize=512)
+def compile_calculation(expression):
+    """Compile an arithmetic expression into a function of lookup(name), or None if it is invalid.
+
+    The function raises whatever lookup or the arithmetic raise.
+    """
+    try:
+        tree = ast.parse(expression, mode='eval')
+        return _compile_node(tree.body, expression.encode())
+    except (SyntaxError, ValueError, RecursionError):
+        return None
@@ -1,13 +1,78 @@
+import copy
 import json
 import os
 import sys
+import threading
+import time
 from datetime import datetime
+from functions.file_lock import file_lock
+from functions.log_segments import SegmentLog, LOG_SEGMENT_DIRNAME
+from functions.log_writer import AsyncLogWriter, batch_per_target
+from functions.log_buffer import LogRingBuffer, LOG_PAGE_SIZE
+from functions.timestamps import add_epoch_ts
+from functions.live_tail import publish
 
 
 
 # Configuration files
 CONFIG_FILE = 'data/config.json'
 LOG_FILE = 'data/notification_logs.json'
+NOTIFICATION_LOG_FILE = 'data/sent_notifications.json'
+DB_FILENAME = 'turtifications.db'
+
+# Storage backend: 'json' (default) or 'sqlite'
+STORAGE_BACKEND = os.environ.get('TURTIFICATIONS_STORAGE', 'json').lower()
+
+# Files modified within this many seconds of being cached are re-read on the
+# next access, since a second write in the same timestamp tick with the same
+# size would otherwise be invisible to the stat check.
+CONFIG_CACHE_RACY_WINDOW = 1.0
+
+# Shared parsed config snapshot, keyed by path and file identity
+_config_cache_lock = threading.Lock()
+_config_cache = {
+    'path': None,
+    'stat_key': None,
+    'generation': -1,
+    'loaded_at': 0.0,
+    'config': None,
+}
+_config_generation = 0
+_config_cache_stats = {'hits': 0, 'misses': 0}
+
+# Segment log per log directory
+_segment_logs = {}
+_segment_logs_lock = threading.Lock()
+
+# Recent logs kept in memory, per log target
+_log_buffers = {}
+_log_buffers_lock = threading.Lock()
+
+def get_data_dir():
+    """Get the directory holding all data files"""
+    return os.path.dirname(CONFIG_FILE) or '.'
+
+def get_db_path():
+    """Get the path of the SQLite database"""
+    return os.path.join(get_data_dir(), DB_FILENAME)
+
+def get_log_dir(log_file=None):
+    """Get the directory holding the JSONL log segments"""
+    return os.path.join(os.path.dirname(log_file or LOG_FILE) or '.', LOG_SEGMENT_DIRNAME)
+
+def is_sqlite_backend():
+    """Check whether the SQLite storage backend is enabled"""
+    return STORAGE_BACKEND == 'sqlite'
+
+def _default_config():
+    return {
+        "discord_webhook": "",
+        "check_interval": 5,
+        "log_retention": 1000,
+        "notification_log_retention": 500,
+        "user_variables": {},
+        "total_notifications_sent": 0
+    }
 
 def initialize_files():
     """Initialize config and log files if they don't exist"""
@@ -16,36 +81,139 @@ def initialize_files():
     if not os.path.exists(data_dir):
         os.makedirs(data_dir, exist_ok=True)
     
-    # Initialize default config if file doesn't exist
-    if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump({
-                "discord_webhook": "",
-                "check_interval": 5,
-                "log_retention": 1000,
-                "notification_log_retention": 500,
-                "user_variables": {},
-                "total_notifications_sent": 0
-            }, f)
-
-    # Initialize log file if it doesn't exist
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'w') as f:
-            json.dump([], f)
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        db_path = get_db_path()
+        # One-shot import of existing JSON files, then fall back to defaults
+        summary = sqlite_store.migrate_from_json(db_path, CONFIG_FILE, LOG_FILE, NOTIFICATION_LOG_FILE)
+        if summary:
+            print(f"Migrated JSON data into SQLite: {summary}")
+        elif not sqlite_store.has_config(db_path):
+            sqlite_store.save_config(db_path, _default_config())
+    else:
+        # Initialize default config if file doesn't exist
+        with file_lock(CONFIG_FILE):
+            if not os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, 'w') as f:
+                    json.dump(_default_config(), f)
+
+        # Initialize the log directory, importing an old notification_logs.json once
+        os.makedirs(get_log_dir(), exist_ok=True)
+        migrated = migrate_log_timestamps()
+        if migrated:
+            print(f"Added epoch timestamps to {migrated} log entries")
+    
+    # Sent-notification records get epoch timestamps too (SQLite rows are upgraded on connect)
+    from functions.utils import migrate_notification_log_timestamps
+    migrated = migrate_notification_log_timestamps()
+    if migrated:
+        print(f"Added epoch timestamps to {migrated} sent-notification records")
+    
+    # Move runtime state still embedded in flow definitions into the state store
+    from functions.flow_state import migrate_legacy_state, collect_blob_garbage
+    config = get_config_for_update()
+    if migrate_legacy_state(config):
+        save_config(config)
+    
+    # Drop stored payloads that no flow refers to any more
+    collect_blob_garbage()
+
+def _config_stat_key(path):
+    """Identity of the config source: inode, size and mtime of the file,
+    or the generation counter stored in the database"""
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        return ('sqlite', sqlite_store.get_config_generation(get_db_path()))
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _is_racy(stat_key, loaded_at):
+    """A file modified right around load time may change again unnoticed"""
+    if stat_key[0] == 'sqlite':
+        return False
+    return stat_key[2] / 1e9 >= loaded_at - CONFIG_CACHE_RACY_WINDOW
+
+def _read_config_source(path):
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        return sqlite_store.load_config(get_db_path())
+    with file_lock(path, exclusive=False):
+        with open(path, 'r') as f:
+            return json.load(f)
 
 def get_config():
-    """Get configuration from file"""
-    with open(CONFIG_FILE, 'r') as f:
-        config = json.load(f)
-    if 'user_variables' not in config:
-        config['user_variables'] = {}
-    return config
+    """Get configuration from file.
 
-def save_config(config):
-    """Save configuration to file with proper serialization."""
-    
+    Returns a shared parsed snapshot that is only re-read when the file's
+    inode/size/mtime changes or save_config bumps the generation counter.
+    Callers must not modify it; get_config_for_update gives a private copy
+    to edit and pass to save_config.
+    """
+    path = CONFIG_FILE
+    stat_key = _config_stat_key(path)
+    with _config_cache_lock:
+        cache = _config_cache
+        if (cache['config'] is not None
+                and cache['path'] == path
+                and cache['stat_key'] == stat_key
+                and cache['generation'] == _config_generation
+                and not _is_racy(stat_key, cache['loaded_at'])):
+            _config_cache_stats['hits'] += 1
+            return cache['config']
+        _config_cache_stats['misses'] += 1
+        loaded_at = time.time()
+        config = _read_config_source(path)
+        if 'user_variables' not in config:
+            config['user_variables'] = {}
+        cache.update({
+            'path': path,
+            'stat_key': stat_key,
+            'generation': _config_generation,
+            'loaded_at': loaded_at,
+            'config': config,
+        })
+        return config
+
+def get_config_for_update(config=None):
+    """Get a private deep copy of the configuration (the current snapshot by
+    default) to edit and pass to save_config.
+
+    Every thread reads the shared snapshot, so it must never hold changes
+    that are half made or whose save failed.
+    """
+    return copy.deepcopy(get_config() if config is None else config)
+
+def invalidate_config_cache():
+    """Drop the cached config snapshot so the next get_config re-reads the file"""
+    global _config_generation
+    with _config_cache_lock:
+        _config_generation += 1
+        _config_cache['config'] = None
+
+def get_config_cache_stats():
+    """Get config cache hit/miss counters"""
+    with _config_cache_lock:
+        hits = _config_cache_stats['hits']
+        misses = _config_cache_stats['misses']
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits / total * 100) if total else 0,
+            'generation': _config_generation
+        }
+
+def get_config_generation():
+    """Get the in-process config generation, bumped by every save_config"""
+    with _config_cache_lock:
+        return _config_generation
+
+def _write_config(config, config_file, use_sqlite):
+    """Serialize and persist a config dict"""
     # Prepare a serializable copy first (convert any complex last_data to string)
     config_copy = config.copy()
+    if 'notification_flows' in config_copy:
+        config_copy['notification_flows'] = [flow.copy() for flow in config_copy['notification_flows']]
     for flow in config_copy.get('notification_flows', []):
         if 'last_data' in flow and not isinstance(flow['last_data'], str):
             try:
@@ -55,26 +223,172 @@ def save_config(config):
                 flow['last_data'] = ""
     
     # Ensure data directory exists
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(config_file), exist_ok=True)
+    
+    if use_sqlite:
+        # Only the rows that actually changed are written
+        from functions import sqlite_store
+        sqlite_store.save_config(os.path.join(os.path.dirname(config_file) or '.', DB_FILENAME), config_copy)
+    else:
+        # Atomic write using a temporary file, one writer at a time across workers
+        with file_lock(config_file):
+            tmp_path = config_file + '.tmp'
+            with open(tmp_path, 'w') as tf:
+                json.dump(config_copy, tf, indent=4)
+            os.replace(tmp_path, config_file)
+
+def save_config(config):
+    """Save configuration to file with proper serialization."""
+    global _config_generation
     
-    # Simple atomic write using temporary file
-    tmp_path = CONFIG_FILE + '.tmp'
-    with open(tmp_path, 'w') as tf:
-        json.dump(config_copy, tf, indent=4)
-    os.replace(tmp_path, CONFIG_FILE)
-
-def get_logs():
-    """Get logs from the separate log file"""
+    _write_config(config, CONFIG_FILE, is_sqlite_backend())
+    
+    # New generation: the next get_config re-reads what was just written
+    with _config_cache_lock:
+        _config_generation += 1
+        _config_cache['config'] = None
+
+def _segment_log(log_file=None):
+    """Get the segment log for LOG_FILE, importing a legacy JSON log on first use"""
+    log_file = log_file or LOG_FILE
+    directory = get_log_dir(log_file)
+    with _segment_logs_lock:
+        log = _segment_logs.get(directory)
+        if log is None:
+            log = SegmentLog(directory)
+            imported = log.import_legacy(log_file)
+            if imported:
+                print(f"Moved {imported} log entries from {log_file} into {directory}")
+            _segment_logs[directory] = log
+        return log
+
+def migrate_log_timestamps():
+    """Give JSON log entries written before epoch timestamps a ts. Returns how many changed."""
+    log = _segment_log()
+    logs = log.read_all()
+    changed = add_epoch_ts(logs)
+    if changed:
+        log.replace(logs)
+    return changed
+
+def _log_target():
+    """Where queued log entries go, resolved when they are queued"""
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', LOG_FILE)
+
+_log_writer = AsyncLogWriter('logs', batch_per_target(
+    'append_logs', lambda path, entries, retention: _segment_log(path).append_many(entries, retention)))
+
+def queue_log(log_entry, retention):
+    """Hand a log entry to the background writer without waiting for disk"""
+    target = _log_target()
+    # In memory first, so readers see it before it reaches the disk
+    _get_log_buffer(target, retention).append(log_entry)
+    publish('log', log_entry)
+    _log_writer.submit((target, log_entry, retention))
+
+def flush_logs():
+    """Wait until every queued log entry is written"""
+    _log_writer.flush()
+
+def _read_stored_logs(target, limit=None):
+    """Read logs from disk, oldest first; with limit only the newest limit entries"""
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        return sqlite_store.get_logs(path, limit)
+    if limit is None:
+        logs = _segment_log(path).read_all()
+    else:
+        logs = _segment_log(path).read_recent(limit)
+        logs.reverse()
+    return logs
+
+def _log_retention():
     try:
-        with open(LOG_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+        return int(get_config().get('log_retention', 1000))
+    except Exception:
+        return 1000
+
+def _get_log_buffer(target=None, retention=None):
+    """Get the in-memory buffer of recent logs, warming it up from disk on first use"""
+    target = target or _log_target()
+    retention = retention or _log_retention()
+    with _log_buffers_lock:
+        buffer = _log_buffers.get(target)
+        if buffer is None:
+            # Entries still queued for this target have to be on disk before it is read
+            flush_logs()
+            buffer = _log_buffers[target] = LogRingBuffer(retention, _read_stored_logs(target, retention))
+    if buffer.capacity != retention:
+        buffer.resize(retention)
+    return buffer
+
+def get_logs(limit=None):
+    """Get recent logs, oldest first; with limit only the newest limit entries.
+
+    Served from the in-memory buffer of the last log_retention entries.
+    """
+    return _get_log_buffer().oldest_first(limit)
+
+def get_recent_logs(limit=None, category=None, since=None):
+    """Get recent logs newest first, optionally of one category only and from epoch ms since on"""
+    return _get_log_buffer().newest(limit, category or None, since)
+
+def query_logs(limit=LOG_PAGE_SIZE, category=None, since=None, until=None, search=None, cursor=None):
+    """Get one page of logs newest first and the cursor of the next page (None after the last).
+
+    Filters by category, time range (epoch ms, until exclusive) and a
+    case-insensitive message substring. Raises ValueError for a malformed cursor.
+    """
+    return _get_log_buffer().query(limit, category or None, since, until, search or None, cursor or None)
+
+def search_logs(query, limit=LOG_PAGE_SIZE, category=None, flow=None, since=None, until=None):
+    """Get up to limit logs containing every word of query, newest first (see LogRingBuffer.search)"""
+    return _get_log_buffer().search(query, limit, category or None, flow or None, since, until)
+
+def logs_truncated(since=None):
+    """Whether log_retention dropped entries older than the retained ones (from epoch ms since on)"""
+    return _get_log_buffer().truncated(since)
+
+def get_log_categories():
+    """Get the sorted categories of the retained logs"""
+    return _get_log_buffer().categories()
+
+def get_log_count():
+    """Get the number of retained log entries"""
+    return len(_get_log_buffer())
 
 def save_logs(logs):
-    """Save logs to the separate log file"""
-    with open(LOG_FILE, 'w') as f:
-        json.dump(logs, f, indent=2)
+    """Replace all logs"""
+    buffer = _get_log_buffer()
+    # Entries logged before the replace must not land after it
+    flush_logs()
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        sqlite_store.replace_logs(get_db_path(), logs)
+    else:
+        _segment_log().replace(logs)
+    buffer.replace(logs)
+
+def append_log(log_entry, retention):
+    """Append a single log entry, keeping at least the last `retention` entries.
+
+    With the JSON backend this is one append to the newest log segment;
+    old segments are dropped whole once the newer ones hold `retention`
+    entries.
+    """
+    # Warmed up before the write so the entry isn't read back from disk as well
+    buffer = _get_log_buffer(retention=retention)
+    if is_sqlite_backend():
+        # One row insert instead of a whole-file rewrite
+        from functions import sqlite_store
+        sqlite_store.append_log(get_db_path(), log_entry, retention)
+    else:
+        _segment_log().append(log_entry, retention)
+    buffer.append(log_entry)
+    publish('log', log_entry)
 
 def clear_logs():
     """Clear all logs"""
@@ -82,45 +396,18 @@ def clear_logs():
 
 def get_log_stats(category=None):
     """Get log statistics, optionally filtered by category"""
-    logs = get_logs()
-    
-    # Filter by category if specified
-    if category:
-        logs = [log for log in logs if log.get('category', 'General') == category]
-    
-    # Get category breakdown
-    all_logs = get_logs()
-    category_counts = {}
-    for log in all_logs:
-        cat = log.get('category', 'General')
-        category_counts[cat] = category_counts.get(cat, 0) + 1
-    
-    return {
-        'total_logs': len(logs),
-        'oldest_log': logs[0]['timestamp'] if logs else None,
-        'newest_log': logs[-1]['timestamp'] if logs else None,
-        'category_counts': category_counts,
-        'filtered_category': category
-    } 
-
-def increment_notification_counter():
-    """Simple function to increment total_notifications_sent by 1"""
-    print("Incrementing notification counter")
+    return _get_log_buffer().stats(category or None)
+
+def increment_notification_counter(flow_name=None):
+    """Increment the sent-notification counters, globally and for flow_name.
+
+    The counts live in memory and are persisted periodically by
+    functions.counters, so a send no longer rewrites the config.
+    """
+    from functions.counters import record_notification_sent
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-        
-        current_total = config.get('total_notifications_sent', 0)
-        config['total_notifications_sent'] = current_total + 1
-        
-        # Use atomic write like save_config
-        tmp_path = CONFIG_FILE + '.tmp'
-        with open(tmp_path, 'w') as tf:
-            json.dump(config, tf, indent=4)
-        os.replace(tmp_path, CONFIG_FILE)
-
-        print(f"Notification counter incremented to {config['total_notifications_sent']}")
-            
+        total = record_notification_sent(flow_name)
+        print(f"Notification counter incremented to {total}")
     except Exception as e:
         # If something goes wrong, just log it and continue
-        print(f"Failed to increment notification counter: {e}")
\ No newline at end of file
+        print(f"Failed to increment notification counter: {e}")
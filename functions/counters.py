@@ -0,0 +1,136 @@
+"""
+Notification counters, kept in memory globally and per flow.
+
+Recording a sent notification only bumps the in-memory counts; they are
+persisted through a write-behind buffer to data/counters.json (or the
+counters table with the SQLite backend), so a send no longer rewrites
+config.json and reads never go to disk once the counts are loaded.
+
+Each process journals the changes it made since its last flush and a
+flush replays them onto the stored counts (see functions.journal), so
+several workers sharing the data directory add up instead of overwriting
+each other.
+"""
+
+import json
+import os
+from functions.config import get_config, get_data_dir, is_sqlite_backend, get_db_path
+from functions.write_behind import WriteBehind
+from functions.journal import Journal
+
+COUNTERS_FILENAME = 'counters.json'
+
+# Default seconds between counter flushes (counter_flush_interval setting); <= 0 writes through
+COUNTER_FLUSH_INTERVAL = 5.0
+
+def get_counters_file():
+    """Get the path of the JSON counters file"""
+    return os.path.join(get_data_dir(), COUNTERS_FILENAME)
+
+def _target():
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', get_counters_file())
+
+def _load_counters(target):
+    backend, path = target
+    stored = None
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        stored = sqlite_store.get_counters(path)
+    else:
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = None
+    if stored is None:
+        # First run with counters: carry over the legacy total from config
+        try:
+            total = int(get_config().get('total_notifications_sent', 0) or 0)
+        except Exception:
+            total = 0
+        stored = {'total': total, 'flows': {}}
+    return {'total': int(stored.get('total', 0)), 'flows': dict(stored.get('flows', {}))}
+
+def _store_counters(target, snapshot):
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        sqlite_store.save_counters(path, snapshot)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def _apply(counts, op):
+    """Apply one journaled change to a counts dict"""
+    kind = op[0]
+    flows = counts['flows']
+    if kind == 'sent':
+        counts['total'] += 1
+        if op[1]:
+            flows[op[1]] = flows.get(op[1], 0) + 1
+    elif kind == 'rename':
+        if op[1] in flows:
+            flows[op[2]] = flows.get(op[2], 0) + flows.pop(op[1])
+    elif kind == 'delete':
+        flows.pop(op[1], None)
+
+# Live counts per storage target: {'total': int, 'flows': {flow_name: int}}
+_journal = Journal(_load_counters, _store_counters, _apply)
+
+def _counter_flush_interval():
+    return get_config().get('counter_flush_interval', COUNTER_FLUSH_INTERVAL)
+
+_counter_writer = WriteBehind('counters', _journal.replay, _counter_flush_interval)
+
+def _snapshot(counts):
+    return {'total': counts['total'], 'flows': dict(counts['flows'])}
+
+def _update(target, op):
+    with _journal.lock:
+        snapshot = _snapshot(_journal.record(target, op))
+    # Outside the lock: in write-through mode this writes right away
+    _counter_writer.mark_dirty(target, True)
+    return snapshot
+
+def record_notification_sent(flow_name=None):
+    """Count one sent notification, globally and for its flow. Returns the new total."""
+    return _update(_target(), ('sent', flow_name))['total']
+
+def get_total_sent():
+    """Get the number of notifications sent since the first start"""
+    with _journal.lock:
+        return _journal.get(_target())['total']
+
+def get_flow_sent(flow_name):
+    """Get the number of notifications a flow has sent"""
+    with _journal.lock:
+        return _journal.get(_target())['flows'].get(flow_name, 0)
+
+def get_counter_snapshot():
+    """Get a copy of all counts: {'total': int, 'flows': {name: int}}"""
+    with _journal.lock:
+        return _snapshot(_journal.get(_target()))
+
+def rename_flow_counter(old_name, new_name):
+    """Carry a flow's count over to its new name"""
+    if old_name == new_name:
+        return
+    _update(_target(), ('rename', old_name, new_name))
+
+def delete_flow_counter(flow_name):
+    """Forget a deleted flow's count (the global total is kept)"""
+    _update(_target(), ('delete', flow_name))
+
+def flush_counters():
+    """Persist buffered counts now"""
+    _counter_writer.flush()
+
+def clear_counter_cache():
+    """Flush buffered counts and drop them so the next read goes to storage"""
+    _counter_writer.flush()
+    _journal.clear()
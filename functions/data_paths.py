@@ -0,0 +1,39 @@
+"""
+Compiled lookups of values in webhook and API data by path.
+
+Paths are written in dot notation (result.0.title), bracket notation
+(result['0']['title']) or a mix of both. compile_path parses a path once
+into a tuple of typed keys, cached per path string, so a lookup only
+walks the data: nothing is split, replaced or converted per call.
+
+Each key is a (name, index) pair: name looks the key up in a dict and
+index, the int of an all-digit name (None otherwise), indexes a list.
+"""
+
+from functools import lru_cache
+
+@lru_cache(maxsize=1024)
+def compile_path(path):
+    """Parse a path like result['0']['title'] or result.0.title into ((name, index), ...)"""
+    names = path.replace("['", ".").replace("']", "").split('.')
+    return tuple((name, int(name) if name.isascii() and name.isdigit() else None) for name in names)
+
+def resolve_path(data, keys):
+    """Get the value at compiled keys, or None if a key is missing or an index out of range"""
+    current = data
+    for name, index in keys:
+        if isinstance(current, dict):
+            if name not in current:
+                return None
+            current = current[name]
+        elif isinstance(current, list) and index is not None and index < len(current):
+            current = current[index]
+        else:
+            return None
+    return current
+
+def get_path_value(data, path):
+    """Get the value at a path string, or None"""
+    if not isinstance(path, str):
+        return None
+    return resolve_path(data, compile_path(path))
@@ -3,7 +3,13 @@ import re
 import ast
 import operator
 from datetime import datetime
-from functions.utils import format_message_template
+from functions.utils import format_message_template, template_dependencies
+from functions.data_paths import get_path_value, compile_path
+from functions.template_deps import TemplateDependencies, NO_DEPENDENCIES, WHOLE_DATA
+
+# Embed settings rendered as message templates
+EMBED_TEMPLATE_KEYS = ('title', 'description', 'url', 'footer_text', 'footer_icon',
+                       'author_name', 'author_icon', 'author_url', 'thumbnail_url', 'image_url')
 
 def create_discord_embed(embed_config, data=None, user_variables=None):
     """Create a Discord embed from configuration and data, with user variable support"""
@@ -107,6 +113,34 @@ def create_discord_embed(embed_config, data=None, user_variables=None):
     
     return embed
 
+def embed_dependencies(embed_config):
+    """What an embed created by create_discord_embed depends on, apart from its timestamp"""
+    if not embed_config or not embed_config.get('enabled', False):
+        return NO_DEPENDENCIES
+    try:
+        templates = [embed_config[key] for key in EMBED_TEMPLATE_KEYS if embed_config.get(key)]
+        for field_config in embed_config.get('fields') or []:
+            if field_config.get('name') and field_config.get('value'):
+                templates.extend((field_config['name'], field_config['value']))
+        deps = []
+        mode = embed_config.get('color_mode', 'static')
+        if mode == 'if':
+            # Color rules see the whole data
+            deps.append(WHOLE_DATA)
+        elif mode == 'gradient':
+            gradient = embed_config.get('gradient') or {}
+            if embed_config.get('color_monitor', ''):
+                templates.append(str(embed_config['color_monitor']))
+            templates.extend((str(gradient.get('start_value', '')), str(gradient.get('end_value', ''))))
+        for field_config in embed_config.get('dynamic_fields') or []:
+            if field_config.get('enabled', False) and field_config.get('name') and field_config.get('path'):
+                templates.append(field_config['name'])
+                path = field_config['path']
+                deps.append(TemplateDependencies([compile_path(path)]) if isinstance(path, str) else NO_DEPENDENCIES)
+        return NO_DEPENDENCIES.union(*deps, *(template_dependencies(template) for template in templates))
+    except (AttributeError, TypeError):
+        return WHOLE_DATA
+
 def compute_embed_color(embed_config, data, user_variables):
     """Compute embed color based on color_mode.
     Returns a hex string like '#RRGGBB' or None.
@@ -337,23 +371,7 @@ def parse_dynamic_fields(fields_config, data, user_variables):
 
 def get_nested_value(data, path):
     """Safely get nested dictionary value using dot notation"""
-    try:
-        keys = path.split('.')
-        current = data
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            elif isinstance(current, list) and key.isdigit():
-                index = int(key)
-                if 0 <= index < len(current):
-                    current = current[index]
-                else:
-                    return None
-            else:
-                return None
-        return current
-    except:
-        return None
+    return get_path_value(data, path)
 
 def format_field_value(value, format_type):
     """Format a field value based on the specified format type"""
@@ -0,0 +1,137 @@
+"""
+Typed flow events.
+
+Every delivery attempt is recorded as an event with explicit fields
+instead of being recovered from log messages:
+
+    {'ts': 1705329000000, 'flow_name': 'Price Watch', 'trigger': 'change',
+     'outcome': 'sent', 'http_status': 204, 'latency_ms': 182}
+
+ts is an epoch timestamp in milliseconds, trigger is one of TRIGGERS and
+outcome one of OUTCOMES. Events are written by a background writer to
+JSONL segments in data/events/ (or the events table with the SQLite
+backend), and the newest event_retention events are kept in memory for
+the statistics.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from functions.config import get_config, get_data_dir, is_sqlite_backend, get_db_path
+from functions.log_segments import SegmentLog
+from functions.log_writer import AsyncLogWriter, batch_per_target
+from functions.timestamps import records_since
+
+EVENT_DIRNAME = 'events'
+
+# Events kept unless configured otherwise (event_retention setting)
+EVENT_RETENTION = 10000
+
+TRIGGERS = ('timer', 'change', 'webhook', 'test')
+OUTCOMES = ('sent', 'failed', 'error', 'skipped')
+
+# Flow trigger_type -> event trigger
+_TRIGGER_TYPES = {'timer': 'timer', 'on_change': 'change', 'webhook': 'webhook'}
+
+_segment_logs = {}
+_segment_logs_lock = threading.Lock()
+
+# storage target -> newest events, oldest first
+_events = {}
+_events_lock = threading.Lock()
+
+def get_event_dir():
+    """Get the directory holding the JSONL event segments"""
+    return os.path.join(get_data_dir(), EVENT_DIRNAME)
+
+def trigger_for(trigger_type):
+    """Map a flow's trigger_type to an event trigger"""
+    return _TRIGGER_TYPES.get(trigger_type, 'test')
+
+def make_event(flow_name, trigger, outcome, http_status=None, latency_ms=None, ts=None):
+    """Build an event record"""
+    return {
+        'ts': int(time.time() * 1000) if ts is None else int(ts),
+        'flow_name': flow_name,
+        'trigger': trigger,
+        'outcome': outcome,
+        'http_status': http_status,
+        'latency_ms': None if latency_ms is None else int(round(latency_ms))
+    }
+
+def _target():
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', get_event_dir())
+
+def _segment_log(directory):
+    with _segment_logs_lock:
+        log = _segment_logs.get(directory)
+        if log is None:
+            log = _segment_logs[directory] = SegmentLog(directory)
+        return log
+
+def _event_retention():
+    try:
+        return int(get_config().get('event_retention', EVENT_RETENTION))
+    except Exception:
+        return EVENT_RETENTION
+
+_event_writer = AsyncLogWriter('events', batch_per_target(
+    'append_events', lambda path, events, retention: _segment_log(path).append_many(events, retention)))
+
+def _read_stored_events(target, limit):
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        return sqlite_store.get_events(path, limit)
+    events = _segment_log(path).read_recent(limit)
+    events.reverse()
+    return events
+
+def _get_events(target=None, retention=None):
+    """Get the in-memory events of a target, loading them from disk on first use"""
+    target = target or _target()
+    retention = retention or _event_retention()
+    with _events_lock:
+        events = _events.get(target)
+        if events is None:
+            # Events still queued for this target have to be on disk before it is read
+            flush_events()
+            events = _events[target] = deque(_read_stored_events(target, retention), maxlen=retention)
+        elif events.maxlen != retention:
+            events = _events[target] = deque(events, maxlen=retention)
+        return events
+
+def record_event(flow_name, trigger, outcome, http_status=None, latency_ms=None, ts=None):
+    """Record a flow event and hand it to the background writer. Returns the event."""
+    event = make_event(flow_name, trigger, outcome, http_status, latency_ms, ts)
+    target = _target()
+    retention = _event_retention()
+    events = _get_events(target, retention)
+    with _events_lock:
+        events.append(event)
+    _event_writer.submit((target, event, retention))
+    return event
+
+def get_events(flow_name=None, since=None):
+    """Get retained events oldest first, optionally of one flow and from epoch ms since on"""
+    events = _get_events()
+    with _events_lock:
+        events = list(events)
+    # Events are recorded in time order, so the window starts at a binary-searched index
+    events = records_since(events, since)
+    if flow_name is not None:
+        events = [event for event in events if event.get('flow_name') == flow_name]
+    return events
+
+def flush_events():
+    """Wait until every queued event is written"""
+    _event_writer.flush()
+
+def clear_event_cache():
+    """Drop the in-memory events (they are reloaded from disk on next use)"""
+    flush_events()
+    with _events_lock:
+        _events.clear()
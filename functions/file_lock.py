@@ -0,0 +1,151 @@
+"""
+Cross-process locks for the shared data files.
+
+Several worker processes may serve the same data directory. Every
+read-modify-write of a shared file runs under an exclusive lock and plain
+reads take a shared one. Locks are fcntl.flock locks on a sidecar
+<file>.lock, because the data files themselves are replaced atomically and
+a lock on the old inode would protect nothing.
+
+Locks are re-entrant per thread, so a writer holding the exclusive lock can
+call the matching reader. Where fcntl is not available (Windows) an
+in-process lock per file is used instead, which still serializes threads
+but not processes.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Seconds to wait for a lock before giving up (TURTIFICATIONS_LOCK_TIMEOUT)
+LOCK_TIMEOUT = float(os.environ.get('TURTIFICATIONS_LOCK_TIMEOUT', 10))
+
+# Polling delays while waiting for a contended lock
+_POLL_MIN = 0.001
+_POLL_MAX = 0.05
+
+class LockTimeout(TimeoutError):
+    """Raised when a file lock could not be acquired within the timeout"""
+
+_held = threading.local()
+
+_fallback_locks = {}
+_fallback_guard = threading.Lock()
+
+_stats_lock = threading.Lock()
+_lock_stats = {'acquired': 0, 'contended': 0, 'timeouts': 0, 'unlocked': 0,
+               'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+def _held_locks():
+    if not hasattr(_held, 'locks'):
+        # lock path -> [fd, exclusive, depth]
+        _held.locks = {}
+    return _held.locks
+
+def _record(key, value=1):
+    with _stats_lock:
+        _lock_stats[key] += value
+
+def _record_wait(waited, contended):
+    with _stats_lock:
+        _lock_stats['acquired'] += 1
+        if contended:
+            _lock_stats['contended'] += 1
+            _lock_stats['wait_seconds'] += waited
+            _lock_stats['max_wait_seconds'] = max(_lock_stats['max_wait_seconds'], waited)
+
+def _flock(fd, lock_path, exclusive, timeout):
+    """Acquire flock on fd, polling until timeout. Returns (waited, contended)."""
+    mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    start = time.monotonic()
+    delay = _POLL_MIN
+    contended = False
+    while True:
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+            return time.monotonic() - start, contended
+        except BlockingIOError:
+            contended = True
+            if time.monotonic() - start >= timeout:
+                _record('timeouts')
+                raise LockTimeout(f"Timed out after {timeout}s waiting for {lock_path}")
+            time.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX)
+
+def _fallback_lock(lock_path):
+    with _fallback_guard:
+        return _fallback_locks.setdefault(lock_path, threading.Lock())
+
+@contextmanager
+def file_lock(path, exclusive=True, timeout=None):
+    """Hold a shared (exclusive=False) or exclusive lock on path.
+
+    Raises LockTimeout if the lock is not granted within timeout seconds
+    (LOCK_TIMEOUT by default). If the lock file can't be created, e.g.
+    because the data directory does not exist yet, the block runs unlocked
+    and the file operation itself reports the problem.
+    """
+    lock_path = os.path.abspath(path) + '.lock'
+    timeout = LOCK_TIMEOUT if timeout is None else timeout
+    held = _held_locks()
+
+    entry = held.get(lock_path)
+    if entry is not None:
+        # Re-entrant use from the same thread
+        if exclusive and not entry[1]:
+            if fcntl is not None:
+                _record_wait(*_flock(entry[0], lock_path, True, timeout))
+            entry[1] = True
+        entry[2] += 1
+        try:
+            yield
+        finally:
+            entry[2] -= 1
+        return
+
+    if fcntl is None:
+        lock = _fallback_lock(lock_path)
+        start = time.monotonic()
+        contended = not lock.acquire(blocking=False)
+        if contended and not lock.acquire(timeout=timeout):
+            _record('timeouts')
+            raise LockTimeout(f"Timed out after {timeout}s waiting for {lock_path}")
+        _record_wait(time.monotonic() - start, contended)
+        held[lock_path] = [None, True, 1]
+        try:
+            yield
+        finally:
+            del held[lock_path]
+            lock.release()
+        return
+
+    try:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        _record('unlocked')
+        yield
+        return
+    try:
+        _record_wait(*_flock(fd, lock_path, exclusive, timeout))
+        held[lock_path] = [fd, exclusive, 1]
+        try:
+            yield
+        finally:
+            del held[lock_path]
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def get_lock_stats():
+    """Get lock acquisition and wait metrics"""
+    with _stats_lock:
+        stats = dict(_lock_stats)
+    stats['backend'] = 'fcntl' if fcntl is not None else 'thread'
+    stats['timeout'] = LOCK_TIMEOUT
+    return stats
@@ -0,0 +1,175 @@
+"""
+Per-flow run statistics, updated as flow events happen.
+
+Each delivery event bumps the flow's run counts (in total, per trigger and
+per outcome) and its first/last run time in memory. The counts are
+persisted through a write-behind buffer to data/flow_stats.json (or the
+flow_aggregates table with the SQLite backend) and loaded on first use, so
+statistics are O(flows) lookups that don't depend on the size of the logs
+and survive log and event retention. On first start they are rebuilt from
+the retained events.
+
+Like functions.counters, each process journals the changes it made since
+its last flush and a flush replays them onto the stored statistics (see
+functions.journal), so several workers add up.
+"""
+
+import json
+import os
+from functions.config import get_config, get_data_dir, is_sqlite_backend, get_db_path
+from functions.write_behind import WriteBehind
+from functions.journal import Journal
+
+FLOW_STATS_FILENAME = 'flow_stats.json'
+
+# Default seconds between flushes (stats_flush_interval setting); <= 0 writes through
+STATS_FLUSH_INTERVAL = 5.0
+
+RUN_COUNTS = ('total_runs', 'timer_runs', 'change_runs', 'webhook_runs', 'test_runs',
+              'successful_runs', 'failed_runs', 'skipped_runs')
+
+# Event trigger / outcome -> counter bumped besides total_runs
+_TRIGGER_COUNTS = {'timer': 'timer_runs', 'change': 'change_runs', 'webhook': 'webhook_runs', 'test': 'test_runs'}
+_OUTCOME_COUNTS = {'sent': 'successful_runs', 'failed': 'failed_runs', 'error': 'failed_runs',
+                   'skipped': 'skipped_runs'}
+
+def get_flow_stats_file():
+    """Get the path of the JSON flow statistics file"""
+    return os.path.join(get_data_dir(), FLOW_STATS_FILENAME)
+
+def _target():
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', get_flow_stats_file())
+
+def empty_run_stats():
+    """Statistics of a flow that hasn't run"""
+    stats = dict.fromkeys(RUN_COUNTS, 0)
+    stats.update(first_ts=None, last_ts=None)
+    return stats
+
+def _merge(into, stats):
+    for key in RUN_COUNTS:
+        into[key] += stats.get(key, 0)
+    firsts = [ts for ts in (into['first_ts'], stats.get('first_ts')) if ts is not None]
+    lasts = [ts for ts in (into['last_ts'], stats.get('last_ts')) if ts is not None]
+    into['first_ts'] = min(firsts) if firsts else None
+    into['last_ts'] = max(lasts) if lasts else None
+
+def _apply(aggregates, op):
+    """Apply one journaled change to a {flow_name: stats} dict"""
+    kind = op[0]
+    if kind == 'event':
+        event = op[1]
+        flow_name = event.get('flow_name')
+        if not flow_name:
+            return
+        stats = aggregates.get(flow_name)
+        if stats is None:
+            stats = aggregates[flow_name] = empty_run_stats()
+        stats['total_runs'] += 1
+        for key in (_TRIGGER_COUNTS.get(event.get('trigger')), _OUTCOME_COUNTS.get(event.get('outcome'))):
+            if key:
+                stats[key] += 1
+        ts = event.get('ts')
+        if ts is not None:
+            stats['first_ts'] = ts if stats['first_ts'] is None else min(stats['first_ts'], ts)
+            stats['last_ts'] = ts if stats['last_ts'] is None else max(stats['last_ts'], ts)
+    elif kind == 'rename':
+        if op[1] in aggregates:
+            stats = aggregates.pop(op[1])
+            if op[2] in aggregates:
+                _merge(aggregates[op[2]], stats)
+            else:
+                aggregates[op[2]] = stats
+    elif kind == 'delete':
+        aggregates.pop(op[1], None)
+
+def _rebuild_from_events():
+    """Statistics of the retained events, for a first start"""
+    from functions.events import get_events
+    aggregates = {}
+    try:
+        events = get_events()
+    except Exception as e:
+        print(f"Failed to read flow events for statistics: {e}")
+        events = []
+    for event in events:
+        _apply(aggregates, ('event', event))
+    return aggregates
+
+def _load_aggregates(target):
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        stored = sqlite_store.get_flow_aggregates(path)
+    else:
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f).get('flows', {})
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            stored = None
+    if stored is None:
+        return _rebuild_from_events()
+    aggregates = {}
+    for flow_name, stats in stored.items():
+        aggregates[flow_name] = empty_run_stats()
+        _merge(aggregates[flow_name], stats)
+    return aggregates
+
+def _store_aggregates(target, aggregates):
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        sqlite_store.save_flow_aggregates(path, aggregates)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'flows': aggregates}, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+# Live statistics per storage target: {flow_name: stats}
+_journal = Journal(_load_aggregates, _store_aggregates, _apply)
+
+def _stats_flush_interval():
+    return get_config().get('stats_flush_interval', STATS_FLUSH_INTERVAL)
+
+_stats_writer = WriteBehind('flow_stats', _journal.replay, _stats_flush_interval)
+
+def _update(target, op):
+    with _journal.lock:
+        _journal.record(target, op)
+    # Outside the lock: in write-through mode this writes right away
+    _stats_writer.mark_dirty(target, True)
+
+def record_flow_run(event):
+    """Count one flow event (see functions.events) in its flow's statistics"""
+    _update(_target(), ('event', event))
+
+def get_flow_run_stats(flow_name=None):
+    """Get a copy of one flow's statistics, or of all flows' as {flow_name: stats}"""
+    with _journal.lock:
+        aggregates = _journal.get(_target())
+        if flow_name is not None:
+            return dict(aggregates.get(flow_name) or empty_run_stats())
+        return {name: dict(stats) for name, stats in aggregates.items()}
+
+def rename_flow_stats(old_name, new_name):
+    """Carry a flow's statistics over to its new name"""
+    if old_name == new_name:
+        return
+    _update(_target(), ('rename', old_name, new_name))
+
+def delete_flow_stats(flow_name):
+    """Forget a deleted flow's statistics"""
+    _update(_target(), ('delete', flow_name))
+
+def flush_flow_stats():
+    """Persist buffered statistics now"""
+    _stats_writer.flush()
+
+def clear_flow_stats_cache():
+    """Flush buffered statistics and drop them so the next read goes to storage"""
+    _stats_writer.flush()
+    _journal.clear()
@@ -0,0 +1,216 @@
+"""
+Compiled flow definitions.
+
+Each entry in notification_flows is compiled once into a FlowSpec holding
+everything consumers used to re-derive from the raw dict on every call:
+trigger type, interval in seconds, parsed field path, request headers,
+condition, template facts (including what the rendered notification
+depends on, see template_deps) and the static parts of the Discord payload.
+The compiled list is rebuilt only when the config snapshot or its
+generation changes, and then incrementally: specs of flows whose
+definition did not change are carried over instead of recompiled.
+
+Alongside the list, flows are indexed by name, by
+(active, trigger_type, category) and, for webhook routing, active webhook
+flows by name; the flows the poller has to look at are kept in their own
+list.
+"""
+
+import json
+import threading
+from functions.config import get_config, get_config_generation
+from functions.utils import template_uses_data, template_dependencies, parse_condition
+from functions.embed_utils import embed_dependencies
+from functions.template_deps import NO_DEPENDENCIES, WHOLE_DATA
+from functions.data_paths import compile_path
+
+# Trigger types handled by the poller; webhook flows are driven by POSTs
+SCHEDULED_TRIGGERS = ('timer', 'on_change')
+# 'on_incoming' is the legacy name of the webhook trigger
+WEBHOOK_TRIGGERS = ('webhook', 'on_incoming')
+
+# Keys that must never leave the server through the API
+PRIVATE_KEYS = ('webhook_url', 'webhook_secret')
+
+def split_field_path(field_path):
+    """Split a field path like result['0']['title'] or result.0.title into keys"""
+    return tuple(name for name, _ in compile_path(field_path))
+
+class FlowSpec:
+    """Read-only compiled view of one flow definition"""
+
+    __slots__ = (
+        'index', 'name', 'active', 'trigger_type', 'category', 'interval_seconds',
+        'endpoint', 'field', 'field_keys', 'request_headers', 'request_body',
+        'message_template', 'uses_data', 'dependencies', 'condition', 'embed_config',
+        'webhook_url', 'webhook_name', 'webhook_avatar', 'webhook_secret', 'raw'
+    )
+
+    def __init__(self, flow, config, index=None):
+        self.raw = flow
+        self.index = index
+        self.name = flow.get('name', '')
+        self.active = bool(flow.get('active', False))
+        self.trigger_type = flow.get('trigger_type', '')
+        self.category = flow.get('category', 'General')
+        try:
+            self.interval_seconds = float(flow.get('interval', 5)) * 60
+        except (TypeError, ValueError):
+            self.interval_seconds = 5 * 60
+
+        self.endpoint = flow.get('endpoint') or None
+        self.field = flow.get('field') or None
+        self.field_keys = split_field_path(self.field) if self.field else ()
+        headers = flow.get('api_headers') or []
+        self.request_headers = {h['key']: h.get('value', '') for h in headers if 'key' in h}
+        self.request_body = flow.get('api_request_body') or None
+
+        self.message_template = flow.get('message_template', '')
+        condition = flow.get('condition', '') if flow.get('condition_enabled', False) else ''
+        self.condition = condition if condition and condition.strip() else None
+        if self.condition:
+            try:
+                # Warm the shared parse cache; errors surface when evaluated
+                parse_condition(self.condition)
+            except SyntaxError:
+                pass
+        embed_config = flow.get('embed_config') or {}
+        self.embed_config = embed_config if embed_config.get('enabled', False) else None
+        # Whether sending without fresh data needs the stored payload
+        self.uses_data = bool(self.condition or self.embed_config
+                              or template_uses_data(self.message_template))
+        # What the message and embed render from; conditions may read anything
+        self.dependencies = template_dependencies(self.message_template).union(
+            embed_dependencies(self.embed_config), WHOLE_DATA if self.condition else NO_DEPENDENCIES)
+
+        # Static parts of the Discord payload
+        self.webhook_url = flow.get('webhook_url', '') or config.get('discord_webhook', '')
+        self.webhook_name = flow.get('webhook_name', '') or config.get('default_webhook_name', 'Notification Bot')
+        self.webhook_avatar = flow.get('webhook_avatar', '') or config.get('default_webhook_avatar', '')
+        self.webhook_secret = flow.get('webhook_secret') or None
+
+    @property
+    def is_scheduled(self):
+        return self.trigger_type in SCHEDULED_TRIGGERS
+
+    @property
+    def is_webhook(self):
+        return self.trigger_type in WEBHOOK_TRIGGERS
+
+    def get(self, key, default=None):
+        """Dict-style access to the underlying definition"""
+        return self.raw.get(key, default)
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def public_dict(self):
+        """Copy of the definition without webhook URL and secret"""
+        return {k: v for k, v in self.raw.items() if k not in PRIVATE_KEYS}
+
+    def _rebound(self, flow, index):
+        """Copy of this spec pointing at an equal definition in a newer snapshot"""
+        spec = object.__new__(FlowSpec)
+        for slot in FlowSpec.__slots__:
+            setattr(spec, slot, getattr(self, slot))
+        spec.raw = flow
+        spec.index = index
+        return spec
+
+    def __repr__(self):
+        return f"FlowSpec({self.name!r}, {self.trigger_type!r})"
+
+# Config settings a compiled spec depends on besides its own definition
+SPEC_DEFAULT_KEYS = ('discord_webhook', 'default_webhook_name', 'default_webhook_avatar')
+
+_spec_lock = threading.Lock()
+_compiled = {'config': None, 'generation': None, 'defaults': None, 'specs': (),
+             'by_name': {}, 'by_attrs': {}, 'webhooks': {}, 'schedulable': (), 'sources': {}}
+_spec_stats = {'builds': 0, 'compiled': 0, 'reused': 0}
+
+def _compile(config):
+    """Rebuild specs and indexes, reusing specs whose definition is unchanged (call with _spec_lock held)"""
+    defaults = tuple(config.get(key) for key in SPEC_DEFAULT_KEYS)
+    previous = _compiled['sources'] if _compiled['defaults'] == defaults else {}
+    specs = []
+    sources = {}
+    for index, flow in enumerate(config.get('notification_flows', [])):
+        # Compared by serialized content: callers edit flow dicts in place before saving
+        source = json.dumps(flow, sort_keys=True, default=str)
+        old_source, old = previous.get(flow.get('name', ''), (None, None))
+        if old is not None and old_source == source:
+            spec = old._rebound(flow, index)
+            _spec_stats['reused'] += 1
+        else:
+            spec = FlowSpec(flow, config, index)
+            _spec_stats['compiled'] += 1
+        specs.append(spec)
+        sources.setdefault(spec.name, (source, spec))
+
+    by_name = {}
+    by_attrs = {}
+    webhooks = {}
+    for spec in specs:
+        # First flow wins, like the linear lookups it replaces
+        by_name.setdefault(spec.name, spec)
+        by_attrs.setdefault((spec.active, spec.trigger_type, spec.category), []).append(spec)
+        # Only 'webhook' flows accept POSTs; legacy 'on_incoming' flows never did
+        if spec.active and spec.trigger_type == 'webhook':
+            webhooks.setdefault(spec.name, spec)
+    _compiled.update(
+        defaults=defaults, sources=sources, specs=tuple(specs), by_name=by_name, webhooks=webhooks,
+        by_attrs={key: tuple(group) for key, group in by_attrs.items()},
+        schedulable=tuple(spec for spec in specs if spec.active and spec.is_scheduled)
+    )
+    _spec_stats['builds'] += 1
+
+def _compiled_for(config):
+    generation = get_config_generation()
+    with _spec_lock:
+        if _compiled['config'] is not config or _compiled['generation'] != generation:
+            _compile(config)
+            _compiled.update(config=config, generation=generation)
+        return dict(_compiled)
+
+def get_flow_specs(config=None):
+    """Get compiled specs for all flows, in config order"""
+    return _compiled_for(get_config() if config is None else config)['specs']
+
+def get_flow_spec(flow_name, config=None):
+    """Get the compiled spec of a flow by name (None if there is none)"""
+    return _compiled_for(get_config() if config is None else config)['by_name'].get(flow_name)
+
+def get_webhook_spec(flow_name, config=None):
+    """Get the first active webhook flow with this name (None if there is none)"""
+    return _compiled_for(get_config() if config is None else config)['webhooks'].get(flow_name)
+
+def get_schedulable_specs(config=None):
+    """Get the active timer/on_change flows the poller has to check, in config order"""
+    return _compiled_for(get_config() if config is None else config)['schedulable']
+
+def find_flows(active=None, trigger_type=None, category=None, config=None):
+    """Get specs matching the given attributes (None matches anything), in config order"""
+    by_attrs = _compiled_for(get_config() if config is None else config)['by_attrs']
+    wanted = (active, trigger_type, category)
+    if None not in wanted:
+        return list(by_attrs.get(wanted, ()))
+    matches = []
+    for key, group in by_attrs.items():
+        if all(want is None or want == have for want, have in zip(wanted, key)):
+            matches.extend(group)
+    matches.sort(key=lambda spec: spec.index)
+    return matches
+
+def as_flow_spec(flow, config=None):
+    """Return flow as a FlowSpec, compiling ad-hoc dicts (test sends) on the fly"""
+    if flow is None or isinstance(flow, FlowSpec):
+        return flow
+    return FlowSpec(flow, get_config() if config is None else config)
+
+def get_flow_spec_stats():
+    """Get how many times the flow specs were (re)built and how many specs were reused"""
+    with _spec_lock:
+        return dict(_spec_stats, flows=len(_compiled['specs']))
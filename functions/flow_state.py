@@ -0,0 +1,296 @@
+"""
+Per-flow runtime state (last_value, last_run, last_data), stored apart from
+the flow definitions in config.json.
+
+last_data payloads go to the content-addressed blob store; the state only
+keeps their hash (last_data_ref) and get_last_data loads a payload on demand.
+
+With the JSON backend every flow gets its own small compact file under
+data/state/, so recording one changed value rewrites only that flow's state.
+With the SQLite backend the state lives in the flow_state table.
+
+Writes go through a write-behind buffer: changes are visible right away
+and each flow's state is persisted at most once per state_flush_interval
+seconds, so a burst of webhooks costs one write. A flush applies only the
+buffered changes to the stored state, under the state's file lock.
+
+Other workers write the same state, so a cached state file is only used
+while its inode/size/mtime are unchanged. SQLite state is read from its row
+each time; a primary-key lookup is about as cheap as the check would be.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from functions.config import get_config, get_data_dir, is_sqlite_backend, get_db_path
+from functions.write_behind import WriteBehind
+from functions.file_lock import file_lock
+from functions.blob_store import put_blob, get_blob, remove_unreferenced_blobs
+
+# Hash of the flow's last payload in the blob store
+LAST_DATA_REF = 'last_data_ref'
+
+# Keys that describe what a flow last saw rather than how it is configured
+STATE_KEYS = ('last_value', 'last_run', 'last_data', LAST_DATA_REF)
+
+STATE_DIRNAME = 'state'
+
+# Default seconds between state flushes (state_flush_interval setting); <= 0 writes through
+STATE_FLUSH_INTERVAL = 2.0
+
+# Default of the project_last_data setting: store only the parts of payloads flows render from
+PROJECT_LAST_DATA = False
+
+_state_lock = threading.Lock()
+# data dir -> {flow_name: (stat key of the state file, state dict)}
+_state_cache = {}
+
+def get_state_dir():
+    """Get the directory holding per-flow state files"""
+    return os.path.join(get_data_dir(), STATE_DIRNAME)
+
+def _state_file(flow_name):
+    """Map a flow name to a filesystem-safe, collision-free file path"""
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', flow_name)[:40]
+    digest = hashlib.sha1(flow_name.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(get_state_dir(), f"{slug}-{digest}.json")
+
+def _cache():
+    return _state_cache.setdefault(get_data_dir(), {})
+
+def _decode_last_data(state):
+    """last_data used to be stored double-encoded as a JSON string"""
+    last_data = state.get('last_data')
+    if isinstance(last_data, str) and last_data:
+        try:
+            state['last_data'] = json.loads(last_data)
+        except json.JSONDecodeError:
+            pass
+    return state
+
+def _store_last_data(state):
+    """Swap an inline last_data payload for its blob hash"""
+    if 'last_data' not in state:
+        return state
+    last_data = state.pop('last_data')
+    # None clears the reference
+    state[LAST_DATA_REF] = None if last_data is None or last_data == '' else put_blob(last_data)
+    return state
+
+def _read_stored(key):
+    """The state as stored at a write-behind key's target, legacy last_data included"""
+    backend, path, flow_name = key
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        return sqlite_store.get_flow_state(path, flow_name)
+    try:
+        with open(path, 'r') as f:
+            stored = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {k: stored[k] for k in STATE_KEYS if k in stored}
+
+def _merge_state(stored, changes):
+    """Apply state changes to a stored state; a None reference clears it"""
+    state = dict(stored, **changes)
+    if LAST_DATA_REF in changes:
+        # The reference supersedes a legacy inline payload
+        state.pop('last_data', None)
+    if LAST_DATA_REF in state and state[LAST_DATA_REF] is None:
+        del state[LAST_DATA_REF]
+    return state
+
+def _read_state(flow_name):
+    key = _state_key(flow_name)
+    state = _read_stored(key)
+    if 'last_data' in state:
+        # Written before the blob store existed; convert it once
+        _store_last_data(_decode_last_data(state))
+        # Changes of ours still pending are newer than the converted reference
+        pending = _state_writer.get_pending(key) or {}
+        _state_writer.mark_dirty(key, dict({LAST_DATA_REF: state[LAST_DATA_REF]}, **pending))
+        if state[LAST_DATA_REF] is None:
+            del state[LAST_DATA_REF]
+    return state
+
+def _state_stat_key(flow_name):
+    """Identity of a flow's state file: inode, size and mtime (None with SQLite)"""
+    if is_sqlite_backend():
+        return None
+    try:
+        st = os.stat(_state_file(flow_name))
+    except FileNotFoundError:
+        return 'missing'
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _load_state(flow_name):
+    """Current state of a flow, re-read if the stored state changed. Call with _state_lock held."""
+    cache = _cache()
+    stat_key = _state_stat_key(flow_name)
+    entry = cache.get(flow_name)
+    if entry is None or stat_key is None or entry[0] != stat_key:
+        entry = cache[flow_name] = (stat_key, _read_state(flow_name))
+    # Buffered changes of ours are newer than anything in storage
+    pending = _state_writer.get_pending(_state_key(flow_name))
+    return _merge_state(entry[1], pending) if pending else entry[1]
+
+def _state_key(flow_name):
+    """Write-behind key carrying the resolved target, so late flushes land in the right place"""
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path(), flow_name)
+    return ('json', _state_file(flow_name), flow_name)
+
+def _write_state(key, changes):
+    """Apply this process's unflushed changes to the stored state.
+
+    The stored state is re-read under an exclusive file lock, so changes
+    other workers flushed meanwhile are kept instead of overwritten.
+    """
+    backend, path, flow_name = key
+    if backend == 'json':
+        # The lock file sits next to the state file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with file_lock(path):
+        state = _merge_state(_read_stored(key), changes)
+        if backend == 'sqlite':
+            from functions import sqlite_store
+            sqlite_store.set_flow_state(path, flow_name, state)
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(state, name=flow_name), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+def _state_flush_interval():
+    return get_config().get('state_flush_interval', STATE_FLUSH_INTERVAL)
+
+_state_writer = WriteBehind('flow_state', _write_state, _state_flush_interval)
+
+def get_flow_state(flow_name):
+    """Get the runtime state of a flow (empty dict if it never ran)"""
+    with _state_lock:
+        return dict(_load_state(flow_name))
+
+def update_flow_state(flow_name, **changes):
+    """Merge changes into a flow's runtime state and persist only that flow.
+
+    A last_data payload is written to the blob store and replaced by its hash.
+    """
+    unknown = set(changes) - set(STATE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown flow state keys: {', '.join(sorted(unknown))}")
+    changes = _store_last_data(changes)
+    with _state_lock:
+        # Only the changes are buffered; the flush applies them to what is stored then
+        key = _state_key(flow_name)
+        _state_writer.mark_dirty(key, dict(_state_writer.get_pending(key) or {}, **changes))
+        return dict(_load_state(flow_name))
+
+def delete_flow_state(flow_name):
+    """Forget a flow's runtime state"""
+    with _state_lock:
+        _cache().pop(flow_name, None)
+        _state_writer.discard(_state_key(flow_name))
+        if is_sqlite_backend():
+            from functions import sqlite_store
+            sqlite_store.delete_flow_state(get_db_path(), flow_name)
+            return
+        try:
+            os.remove(_state_file(flow_name))
+        except FileNotFoundError:
+            pass
+
+def payload_to_store(data, dependencies):
+    """The last_data to store for a payload: all of it, or with project_last_data only
+    what renders with the given TemplateDependencies read"""
+    if not get_config().get('project_last_data', PROJECT_LAST_DATA):
+        return data
+    return dependencies.project(data)
+
+def get_last_data(flow_name):
+    """Load the payload a flow last received (None if there is none)"""
+    ref = get_flow_state(flow_name).get(LAST_DATA_REF)
+    return get_blob(ref) if ref else None
+
+def rename_flow_state(old_name, new_name):
+    """Carry a flow's runtime state over to its new name"""
+    if old_name == new_name:
+        return
+    state = get_flow_state(old_name)
+    if state:
+        update_flow_state(new_name, **state)
+    delete_flow_state(old_name)
+
+def merge_flow_state(flow):
+    """Return a copy of a flow definition with its runtime state merged in"""
+    merged = flow.copy()
+    merged.update(get_flow_state(flow.get('name', '')))
+    return merged
+
+def flush_flow_state():
+    """Persist all buffered state writes now"""
+    _state_writer.flush()
+
+def clear_state_cache():
+    """Flush buffered writes and drop cached state so the next read goes to storage"""
+    _state_writer.flush()
+    with _state_lock:
+        _state_cache.clear()
+
+def migrate_legacy_state(config):
+    """Move tracking keys still embedded in flow definitions into the state store.
+
+    Returns True if the config was modified and needs saving.
+    """
+    changed = False
+    for flow in config.get('notification_flows', []):
+        legacy = {k: flow.pop(k) for k in STATE_KEYS if k in flow}
+        if not legacy:
+            continue
+        changed = True
+        _store_last_data(_decode_last_data(legacy))
+        # State already in the store is newer than what config.json remembers
+        existing = get_flow_state(flow.get('name', ''))
+        update_flow_state(flow.get('name', ''), **dict(legacy, **existing))
+    return changed
+
+def _stored_flow_names():
+    """Names of all flows with persisted state"""
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        return sqlite_store.get_flow_state_names(get_db_path())
+    names = []
+    try:
+        filenames = os.listdir(get_state_dir())
+    except FileNotFoundError:
+        return names
+    for filename in filenames:
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(get_state_dir(), filename), 'r') as f:
+                names.append(json.load(f).get('name', ''))
+        except (OSError, json.JSONDecodeError, AttributeError):
+            continue
+    return names
+
+def collect_blob_garbage():
+    """Delete payload blobs no flow refers to any more. Returns the number removed.
+
+    Other workers may be storing payloads meanwhile; blobs stored within
+    BLOB_GC_GRACE seconds are kept, so a reference still buffered in another
+    worker's write-behind never points at a deleted blob.
+    """
+    flush_flow_state()
+    referenced = set()
+    for flow_name in _stored_flow_names():
+        ref = get_flow_state(flow_name).get(LAST_DATA_REF)
+        if ref:
+            referenced.add(ref)
+    with _state_lock:
+        for _, state in _cache().values():
+            if state.get(LAST_DATA_REF):
+                referenced.add(state[LAST_DATA_REF])
+    return remove_unreferenced_blobs(referenced)
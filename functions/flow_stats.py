@@ -4,135 +4,52 @@ Flow statistics and management features
 
 import json
 import time
-from datetime import datetime, timedelta
-from functions.config import get_logs
+from datetime import datetime
+from functions.events import get_events
+from functions.flow_aggregates import RUN_COUNTS, empty_run_stats, get_flow_run_stats
+from functions.flow_state import STATE_KEYS, get_flow_state
+from functions.counters import get_counter_snapshot
+from functions.timestamps import format_ts
 
 def get_flow_statistics():
     """Get statistics for all flows (including those that have never run)"""
-    logs = get_logs()
-    log_stats = get_flow_usage_from_logs(logs)
+    run_stats = get_flow_run_stats()
 
     from functions.config import get_config
     config = get_config()
     all_flows = {flow['name']: flow for flow in config.get('notification_flows', [])}
+    sent_counts = get_counter_snapshot()['flows']
 
     # Build a complete stats dict for all flows
     all_stats = {}
     for flow_name, flow_config in all_flows.items():
-        # Start with log stats if present, else zero/defaults
-        stats = log_stats.get(flow_name, {
-            'total_runs': 0,
-            'timer_runs': 0,
-            'change_runs': 0,
-            'webhook_runs': 0,
-            'test_runs': 0,
-            'first_run': None,
-            'last_run': None,
-            'successful_runs': 0,
-            'failed_runs': 0
-        })
-        # Always update with config info
+        # Start with the aggregated run stats if present, else zero/defaults
+        stats = display_run_stats(run_stats.get(flow_name) or empty_run_stats())
+        # Always update with config info and runtime state
+        state = get_flow_state(flow_name)
         stats.update({
             'active': flow_config.get('active', False),
             'trigger_type': flow_config.get('trigger_type', 'unknown'),
             'category': flow_config.get('category', 'General'),
-            'last_run': flow_config.get('last_run', stats.get('last_run')),
-            'last_value': flow_config.get('last_value')
+            'last_run': state.get('last_run', flow_config.get('last_run', stats.get('last_run'))),
+            'last_value': state.get('last_value', flow_config.get('last_value')),
+            'notifications_sent': sent_counts.get(flow_name, 0)
         })
         all_stats[flow_name] = stats
     return all_stats
 
-def get_flow_usage_from_logs(logs):
-    """Extract flow usage statistics from logs"""
-    flow_stats = {}
-    
-    for log in logs:
-        message = log.get('message', '')
-        timestamp = log.get('timestamp', '')
-        
-        # Parse different types of log messages
-        if 'Timer trigger: Sending notification for flow' in message:
-            flow_name = extract_flow_name_from_message(message)
-            if flow_name:
-                update_flow_stats(flow_stats, flow_name, 'timer', timestamp)
-                
-        elif 'Change detected: Field' in message and 'in flow' in message:
-            flow_name = extract_flow_name_from_message(message)
-            if flow_name:
-                update_flow_stats(flow_stats, flow_name, 'change', timestamp)
-                
-        elif 'Webhook received: Processing webhook for flow' in message:
-            flow_name = extract_flow_name_from_message(message)
-            if flow_name:
-                update_flow_stats(flow_stats, flow_name, 'webhook', timestamp)
-                
-        elif 'Test notification sent for' in message:
-            flow_name = extract_flow_name_from_message(message)
-            if flow_name:
-                update_flow_stats(flow_stats, flow_name, 'test', timestamp)
-    
-    return flow_stats
-
-def extract_flow_name_from_message(message):
-    """Extract flow name from log message"""
-    import re
-    
-    # Different patterns for extracting flow names
-    patterns = [
-        r"flow '([^']+)'",
-        r"for flow '([^']+)'",
-        r"flow ([^\s]+)",
-        r"sent for ([^\s]+)"
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, message)
-        if match:
-            return match.group(1)
-    
-    return None
-
-def update_flow_stats(flow_stats, flow_name, trigger_type, timestamp):
-    """Update statistics for a flow"""
-    if flow_name not in flow_stats:
-        flow_stats[flow_name] = {
-            'total_runs': 0,
-            'timer_runs': 0,
-            'change_runs': 0,
-            'webhook_runs': 0,
-            'test_runs': 0,
-            'first_run': timestamp,
-            'last_run': timestamp,
-            'successful_runs': 0,
-            'failed_runs': 0
-        }
-    
-    stats = flow_stats[flow_name]
-    stats['total_runs'] += 1
-    stats['last_run'] = timestamp
-    
-    if trigger_type == 'timer':
-        stats['timer_runs'] += 1
-    elif trigger_type == 'change':
-        stats['change_runs'] += 1
-    elif trigger_type == 'webhook':
-        stats['webhook_runs'] += 1
-    elif trigger_type == 'test':
-        stats['test_runs'] += 1
+def display_run_stats(run_stats):
+    """Aggregated run stats with first_run/last_run as display strings"""
+    stats = {key: run_stats.get(key, 0) for key in RUN_COUNTS}
+    stats['first_run'] = format_ts(run_stats['first_ts']) if run_stats.get('first_ts') is not None else None
+    stats['last_run'] = format_ts(run_stats['last_ts']) if run_stats.get('last_ts') is not None else None
+    return stats
 
 def get_flow_success_rate(flow_name):
     """Get success rate for a specific flow"""
-    logs = get_logs()
-    successful = 0
-    failed = 0
-    
-    for log in logs:
-        message = log.get('message', '')
-        if flow_name in message:
-            if '✅ Notification sent successfully' in message:
-                successful += 1
-            elif '❌ Failed to send notification' in message or '❌ Discord send error' in message:
-                failed += 1
+    stats = get_flow_run_stats(flow_name)
+    successful = stats['successful_runs']
+    failed = stats['failed_runs']
     
     total = successful + failed
     if total == 0:
@@ -140,60 +57,51 @@ def get_flow_success_rate(flow_name):
     
     return (successful / total) * 100
 
+def describe_event(event):
+    """Short description of an event for activity lists"""
+    details = [event.get('outcome', 'unknown')]
+    if event.get('http_status') is not None:
+        details.append(f"HTTP {event['http_status']}")
+    if event.get('latency_ms') is not None:
+        details.append(f"{event['latency_ms']} ms")
+    return ', '.join(details)
+
 def get_recent_flow_activity(hours=24):
-    """Get flow activity in the last N hours"""
-    logs = get_logs()
-    cutoff_time = datetime.now() - timedelta(hours=hours)
+    """Get flow activity in the last N hours, newest first per flow"""
+    since = int((time.time() - hours * 3600) * 1000)
     
     recent_activity = {}
-    
-    for log in logs:
-        try:
-            log_time = datetime.strptime(log['timestamp'], '%Y-%m-%d %H:%M:%S')
-            if log_time >= cutoff_time:
-                message = log['message']
-                
-                # Extract flow name and activity type
-                if 'flow' in message:
-                    flow_name = extract_flow_name_from_message(message)
-                    if flow_name:
-                        if flow_name not in recent_activity:
-                            recent_activity[flow_name] = []
-                        
-                        activity_type = 'unknown'
-                        if 'Timer trigger' in message:
-                            activity_type = 'timer'
-                        elif 'Change detected' in message:
-                            activity_type = 'change'
-                        elif 'Webhook received' in message:
-                            activity_type = 'webhook'
-                        elif 'Test notification' in message:
-                            activity_type = 'test'
-                        
-                        recent_activity[flow_name].append({
-                            'type': activity_type,
-                            'timestamp': log['timestamp'],
-                            'message': message
-                        })
-        except (ValueError, KeyError):
+    for event in reversed(get_events(since=since)):
+        flow_name = event.get('flow_name')
+        if not flow_name:
             continue
+        recent_activity.setdefault(flow_name, []).append({
+            'type': event.get('trigger') or 'unknown',
+            'outcome': event.get('outcome'),
+            'http_status': event.get('http_status'),
+            'latency_ms': event.get('latency_ms'),
+            'ts': event['ts'],
+            'timestamp': format_ts(event['ts']),
+            'message': describe_event(event)
+        })
     
     return recent_activity
 
 def export_flow_config(flow_name=None):
     """Export flow configuration(s) to JSON"""
     from functions.config import get_config
+    from functions.flow_spec import get_flow_spec
     config = get_config()
     
     if flow_name:
         # Export specific flow
-        for flow in config.get('notification_flows', []):
-            if flow['name'] == flow_name:
-                return {
-                    'export_date': datetime.now().isoformat(),
-                    'flow': flow
-                }
-        return None
+        flow = get_flow_spec(flow_name, config)
+        if flow is None:
+            return None
+        return {
+            'export_date': datetime.now().isoformat(),
+            'flow': flow.raw
+        }
     else:
         # Export all flows
         return {
@@ -210,12 +118,12 @@ def export_flow_config(flow_name=None):
 
 def import_flow_config(import_data):
     """Import flow configuration from JSON"""
-    from functions.config import get_config, save_config
-    config = get_config()
+    from functions.config import get_config_for_update, save_config
+    config = get_config_for_update()
     
     if 'flow' in import_data:
         # Import single flow
-        new_flow = import_data['flow']
+        new_flow = {k: v for k, v in import_data['flow'].items() if k not in STATE_KEYS}
         new_flow['name'] = f"{new_flow['name']}_imported_{int(time.time())}"
         
         if 'notification_flows' not in config:
@@ -230,7 +138,7 @@ def import_flow_config(import_data):
         imported_flows = []
         
         for flow in import_data['flows']:
-            new_flow = flow.copy()
+            new_flow = {k: v for k, v in flow.items() if k not in STATE_KEYS}
             new_flow['name'] = f"{new_flow['name']}_imported_{int(time.time())}"
             imported_flows.append(new_flow)
         
@@ -253,26 +161,29 @@ def import_flow_config(import_data):
 
 def duplicate_flow(flow_name):
     """Duplicate an existing flow"""
-    from functions.config import get_config, save_config
-    config = get_config()
+    from functions.config import get_config, get_config_for_update, save_config
+    from functions.flow_spec import get_flow_spec
+    shared = get_config()
     
-    for flow in config.get('notification_flows', []):
-        if flow['name'] == flow_name:
-            new_flow = flow.copy()
-            new_flow['name'] = f"{flow['name']}_copy_{int(time.time())}"
-            new_flow['active'] = False  # Start as inactive
+    spec = get_flow_spec(flow_name, shared)
+    if spec is None:
+        return None
+    config = get_config_for_update(shared)
 
-            # Remove tracking data from copy
-            new_flow.pop('last_value', None)
-            new_flow.pop('last_run', None)
-            new_flow.pop('last_data', None)
+    flow = spec.raw
+    new_flow = flow.copy()
+    new_flow['name'] = f"{flow['name']}_copy_{int(time.time())}"
+    new_flow['active'] = False  # Start as inactive
 
-            # Preserve webhook secret if present
-            if 'webhook_secret' in flow:
-                new_flow['webhook_secret'] = flow['webhook_secret']
+    # Remove tracking data from copy
+    new_flow.pop('last_value', None)
+    new_flow.pop('last_run', None)
+    new_flow.pop('last_data', None)
 
-            config['notification_flows'].append(new_flow)
-            save_config(config)
-            return new_flow['name']
-    
-    return None 
\ No newline at end of file
+    # Preserve webhook secret if present
+    if 'webhook_secret' in flow:
+        new_flow['webhook_secret'] = flow['webhook_secret']
+
+    config['notification_flows'].append(new_flow)
+    save_config(config)
+    return new_flow['name'] 
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+In-memory state that several workers update and persist together.
+
+The state of each storage target is loaded once and then changed in memory
+by small operations. Each process journals the operations it applied since
+its last flush, and a flush replays them onto the stored state under an
+exclusive file lock, so workers sharing the data directory add up instead
+of overwriting each other. Used by functions.counters and
+functions.flow_aggregates.
+"""
+
+import threading
+from functions.file_lock import file_lock
+
+class Journal:
+    """Live state per storage target plus the operations not yet persisted"""
+
+    def __init__(self, load, store, apply):
+        """
+        Args:
+            load: Called as load(target) to read the stored state
+            store: Called as store(target, state) to persist a state
+            apply: Called as apply(state, op) to apply one operation in place
+        """
+        self.load = load
+        self.store = store
+        self.apply = apply
+        # Guards the live states and the journal; writes happen off this lock
+        self.lock = threading.Lock()
+        # storage target -> live state
+        self._states = {}
+        # storage target -> operations not yet persisted, in the order they were made
+        self._pending = {}
+
+    def get(self, target):
+        """Get the live state for a target (call with self.lock held)"""
+        state = self._states.get(target)
+        if state is None:
+            state = self._states[target] = self.load(target)
+        return state
+
+    def record(self, target, op):
+        """Apply op to the live state and journal it (call with self.lock held). Returns the state."""
+        state = self.get(target)
+        self.apply(state, op)
+        self._pending.setdefault(target, []).append(op)
+        return state
+
+    def replay(self, target, _=None):
+        """Replay this process's unflushed operations onto the stored state.
+
+        Fits WriteBehind as write_fn(key, value) with the target as key.
+        """
+        with self.lock:
+            ops = self._pending.pop(target, [])
+        if not ops:
+            return
+        try:
+            with file_lock(target[1]):
+                stored = self.load(target)
+                for op in ops:
+                    self.apply(stored, op)
+                self.store(target, stored)
+        except Exception:
+            with self.lock:
+                # Keep the operations for the next flush
+                self._pending[target] = ops + self._pending.get(target, [])
+            raise
+        with self.lock:
+            # Pick up what other workers flushed, plus operations made during the write
+            for op in self._pending.get(target, []):
+                self.apply(stored, op)
+            self._states[target] = stored
+
+    def clear(self):
+        """Drop the live states and the journal (flush first to keep the changes)"""
+        with self.lock:
+            self._states.clear()
+            self._pending.clear()
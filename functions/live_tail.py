@@ -0,0 +1,88 @@
+"""
+In-process feed of new log entries, deliveries and sent notifications.
+
+Writers publish each item as it happens; every item gets the next event
+id and is kept in a short history. Readers (the Server-Sent Events stream
+at /api/logs/stream) wait for items after the last id they have seen, so
+a reconnecting client that sends Last-Event-ID gets what it missed, as
+long as it is still in the history.
+
+Event ids are per process: a Last-Event-ID this process hasn't handed out
+(after a restart, or from another worker) resumes from the current end.
+"""
+
+import threading
+from collections import deque
+
+FEED_KINDS = ('log', 'delivery', 'notification')
+
+# Items kept for clients resuming with Last-Event-ID
+LIVE_TAIL_HISTORY = 1000
+
+# Seconds between keep-alive comments on an idle stream
+LIVE_TAIL_KEEPALIVE = 15.0
+
+class LiveFeed:
+    """Bounded history of published items with blocking reads after an event id"""
+
+    def __init__(self, history=LIVE_TAIL_HISTORY):
+        self._condition = threading.Condition()
+        # (event id, kind, item), oldest first
+        self._items = deque(maxlen=history)
+        self._last_id = 0
+
+    def publish(self, kind, item):
+        """Add an item and wake up the waiting readers. Returns its event id."""
+        with self._condition:
+            self._last_id += 1
+            self._items.append((self._last_id, kind, item))
+            self._condition.notify_all()
+            return self._last_id
+
+    def resume_id(self, last_event_id):
+        """The id to read after for a client's Last-Event-ID (None or unknown ids start at the end)"""
+        with self._condition:
+            if last_event_id is None or not 0 <= last_event_id <= self._last_id:
+                return self._last_id
+            return last_event_id
+
+    def read_after(self, after_id, timeout=None):
+        """Get the [(event id, kind, item)] published after after_id, waiting up to timeout for one"""
+        with self._condition:
+            if self._last_id <= after_id:
+                self._condition.wait_for(lambda: self._last_id > after_id, timeout)
+            # Ids are consecutive, so the first new item's position follows from the oldest id kept
+            if not self._items or self._last_id <= after_id:
+                return []
+            first = max(0, after_id + 1 - self._items[0][0])
+            return [self._items[i] for i in range(first, len(self._items))]
+
+    def get_stats(self):
+        with self._condition:
+            return {'last_event_id': self._last_id, 'history': len(self._items)}
+
+def matches(kind, item, category=None, flow=None):
+    """Check a published item against stream filters.
+
+    category only applies to log entries. Log entries don't name their
+    flow, so for them flow is looked for in the message.
+    """
+    if kind == 'log':
+        if category and item.get('category', 'General') != category:
+            return False
+        return not flow or flow.lower() in str(item.get('message', '')).lower()
+    return not flow or item.get('flow_name') == flow
+
+_feed = LiveFeed()
+
+def publish(kind, item):
+    """Publish a new log entry, delivery event or sent notification to live readers"""
+    return _feed.publish(kind, item)
+
+def get_live_feed():
+    """The feed of this process"""
+    return _feed
+
+def get_live_tail_stats():
+    """Get the last event id and history size of the feed"""
+    return _feed.get_stats()
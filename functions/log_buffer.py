@@ -0,0 +1,234 @@
+"""
+In-memory ring buffer of recent system logs.
+
+The newest log_retention entries stay resident, together with a per-category
+index and per-category counts that are updated as entries come in and fall
+out. Serving the logs page, the logs API and log stats is then O(k) in the
+number of entries returned, without touching the disk; the log files are
+only read once to warm the buffer up.
+
+Both the entries and the per-category indexes are arrays with O(1)
+positional access, and entries come in in time order, so a page of a log
+query starts at a binary-searched position: paging deep into the history
+costs O(log n + page size). Cursors encode the time and position where a
+page stopped rather than a list offset, so they stay valid while new
+entries come in and old ones fall out.
+
+Each buffer also keeps a full-text index of its entries (see
+functions.log_search) that follows the same appends and evictions.
+
+Queries and searches only see the buffered entries. Whatever log_retention
+dropped before them is not looked for on disk; truncated() tells callers
+when a result may be missing such older entries.
+"""
+
+import base64
+import threading
+from functions.timestamps import index_since, record_ts
+from functions.log_search import SearchIndex
+
+DEFAULT_CATEGORY = 'General'
+
+# Default and largest number of entries in one page of a log query
+LOG_PAGE_SIZE = 100
+MAX_LOG_PAGE_SIZE = 1000
+
+def _category(entry):
+    return entry.get('category', DEFAULT_CATEGORY)
+
+def _search_text(entry):
+    return f"{entry.get('message', '')} {_category(entry)}"
+
+class _Window:
+    """A list that drops items from the front in amortized O(1) and keeps O(1) indexing"""
+
+    def __init__(self):
+        self._items = []
+        self._head = 0
+
+    def append(self, item):
+        self._items.append(item)
+
+    def popleft(self):
+        item = self._items[self._head]
+        self._head += 1
+        # Compact once the dropped prefix is as long as what is left
+        if self._head * 2 >= len(self._items):
+            del self._items[:self._head]
+            self._head = 0
+        return item
+
+    def __len__(self):
+        return len(self._items) - self._head
+
+    def __getitem__(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('window index out of range')
+        return self._items[self._head + index]
+
+    def __iter__(self):
+        return (self._items[i] for i in range(self._head, len(self._items)))
+
+    def __reversed__(self):
+        return (self._items[i] for i in range(len(self._items) - 1, self._head - 1, -1))
+
+def encode_cursor(ts, skip):
+    """Opaque cursor for 'entries older than the skip newest entries logged at epoch ms ts'"""
+    return base64.urlsafe_b64encode(f"{ts}.{skip}".encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(ts, skip) of a cursor from encode_cursor; raises ValueError for anything else"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, skip = (int(part) for part in text.split('.'))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid log cursor: {cursor!r}")
+    if skip < 0:
+        raise ValueError(f"Invalid log cursor: {cursor!r}")
+    return ts, skip
+
+class LogRingBuffer:
+    """Bounded, newest-wins buffer of log entries with per-category views"""
+
+    def __init__(self, capacity, entries=()):
+        self.capacity = max(int(capacity), 1)
+        self._lock = threading.Lock()
+        self._entries = _Window()
+        # category -> entries of that category, oldest first
+        self._by_category = {}
+        for entry in list(entries)[-self.capacity:]:
+            self._push(entry)
+        self._index = SearchIndex(self.capacity, _search_text, self._entries)
+
+    def _push(self, entry):
+        """Add one entry, evicting the oldest when full (call with self._lock held)"""
+        if len(self._entries) >= self.capacity:
+            self._evict()
+        self._entries.append(entry)
+        self._by_category.setdefault(_category(entry), _Window()).append(entry)
+
+    def _evict(self):
+        oldest = self._entries.popleft()
+        category = _category(oldest)
+        # The oldest entry overall is also the oldest of its category
+        entries = self._by_category[category]
+        entries.popleft()
+        if not entries:
+            del self._by_category[category]
+
+    def append(self, entry):
+        with self._lock:
+            self._push(entry)
+            self._index.add(entry)
+
+    def resize(self, capacity):
+        """Change the capacity, dropping the oldest entries if it shrinks"""
+        capacity = max(int(capacity), 1)
+        with self._lock:
+            self.capacity = capacity
+            while len(self._entries) > capacity:
+                self._evict()
+            self._index.resize(capacity)
+
+    def replace(self, entries):
+        """Replace the contents (oldest first)"""
+        with self._lock:
+            self._entries = _Window()
+            self._by_category.clear()
+            for entry in list(entries)[-self.capacity:]:
+                self._push(entry)
+            self._index.replace(entries)
+
+    def query(self, limit=LOG_PAGE_SIZE, category=None, since=None, until=None, search=None, cursor=None):
+        """Get one page of entries newest first and the cursor of the next page (None after the last).
+
+        since and until (epoch ms, until exclusive) bound the time range,
+        search is a case-insensitive substring of the message and cursor
+        continues a previous query with the same filters. The starting
+        position is found by binary search; a search scans back from there
+        until the page is full. Raises ValueError for a malformed cursor.
+        """
+        position_ts = decode_cursor(cursor) if cursor else None
+        needle = search.lower() if search else None
+        with self._lock:
+            source = self._by_category.get(category, ()) if category else self._entries
+            end = len(source)
+            if until is not None:
+                end = min(end, index_since(source, until))
+            if position_ts is not None:
+                ts, skip = position_ts
+                end = min(end, max(0, index_since(source, ts + 1) - skip))
+            start = index_since(source, since) if since is not None else 0
+
+            page = []
+            position = end
+            while position > start and (limit is None or len(page) < limit):
+                position -= 1
+                entry = source[position]
+                if needle is None or needle in str(entry.get('message', '')).lower():
+                    page.append(entry)
+
+            next_cursor = None
+            if position > start:
+                ts = record_ts(source[position])
+                next_cursor = encode_cursor(ts, index_since(source, ts + 1) - position)
+        return page, next_cursor
+
+    def search(self, query, limit=LOG_PAGE_SIZE, category=None, flow=None, since=None, until=None):
+        """Get up to limit entries containing every word of query, newest first.
+
+        Optionally only entries of one category, mentioning a flow name or
+        in a time range (epoch ms, until exclusive).
+        """
+        filters = []
+        if category:
+            filters.append(lambda entry: _category(entry) == category)
+        if flow:
+            # Log entries don't name their flow, so this looks for it in the message
+            flow_lower = flow.lower()
+            filters.append(lambda entry: flow_lower in str(entry.get('message', '')).lower())
+        match = (lambda entry: all(check(entry) for check in filters)) if filters else None
+        return self._index.search(query, limit, match, since, until)
+
+    def newest(self, limit=None, category=None, since=None):
+        """Get up to limit entries, newest first, optionally of one category only.
+
+        With since (epoch ms) only entries logged from then on; they are
+        found by binary search on ts, as entries come in in time order.
+        """
+        return self.query(limit, category, since)[0]
+
+    def truncated(self, since=None):
+        """Whether entries older than the buffered ones, and from epoch ms since on, were dropped"""
+        # The index evicts in step with the buffer
+        return self._index.truncated(since)
+
+    def oldest_first(self, limit=None):
+        """Get the newest limit entries (all if None), oldest first"""
+        entries = self.newest(limit)
+        entries.reverse()
+        return entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def categories(self):
+        """Sorted names of the categories currently in the buffer"""
+        with self._lock:
+            return sorted(self._by_category)
+
+    def stats(self, category=None):
+        """Counts and timestamp range, overall or for one category"""
+        with self._lock:
+            source = self._by_category.get(category, ()) if category else self._entries
+            return {
+                'total_logs': len(source),
+                'oldest_log': source[0].get('timestamp') if source else None,
+                'newest_log': source[-1].get('timestamp') if source else None,
+                'category_counts': {name: len(entries) for name, entries in self._by_category.items()},
+                'filtered_category': category
+            }
@@ -0,0 +1,109 @@
+"""
+Log levels and rate limiting of repetitive log messages.
+
+Every log line has a level (debug < info < warn < error) and lines below
+the configured log_level are not stored. Messages that repeat on every
+poller cycle, like "No change detected", carry a key: the first one per
+window is logged and the rest are only counted, then written as a single
+summary line ("No change detected ×720 in last hour for flow 'X'") once
+the window is over. Log I/O then follows what actually happens rather
+than how often the poller runs.
+"""
+
+import threading
+import time
+
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warn': 30, 'error': 40}
+
+# Lowest level stored unless configured otherwise (log_level)
+DEFAULT_LOG_LEVEL = 'info'
+
+# Seconds over which repeats of a keyed message are summarized (log_rate_limit_window)
+LOG_RATE_LIMIT_WINDOW = 3600
+
+_LEVEL_ALIASES = {'warning': 'warn', 'err': 'error'}
+
+_WINDOW_NAMES = {60: 'minute', 3600: 'hour', 86400: 'day'}
+
+def normalize_level(level, default=DEFAULT_LOG_LEVEL):
+    """Get the canonical name of a level, or default if it isn't one"""
+    if isinstance(level, str):
+        level = level.strip().lower()
+        level = _LEVEL_ALIASES.get(level, level)
+        if level in LOG_LEVELS:
+            return level
+    return default
+
+def level_enabled(level, minimum):
+    """Check whether level is at or above the minimum level"""
+    return LOG_LEVELS[normalize_level(level)] >= LOG_LEVELS[normalize_level(minimum)]
+
+def format_window(seconds):
+    """Describe a window length for summaries: 'hour', '5 minutes', ..."""
+    seconds = int(seconds)
+    if seconds in _WINDOW_NAMES:
+        return _WINDOW_NAMES[seconds]
+    for unit, name in ((86400, 'days'), (3600, 'hours'), (60, 'minutes')):
+        if seconds % unit == 0:
+            return f"{seconds // unit} {name}"
+    return f"{seconds} seconds"
+
+def summarize(window):
+    """Build the summary message for a closed window"""
+    message = f"{window['key']} ×{window['count']:,} in last {format_window(window['length'])}"
+    if window['flow']:
+        message += f" for flow '{window['flow']}'"
+    return message
+
+class LogRateLimiter:
+    """Let the first occurrence of each message key through per window and count the rest"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (key, flow) -> open window
+        self._windows = {}
+        self.stats = {'suppressed': 0, 'summaries': 0, 'filtered': 0}
+
+    def hit(self, key, flow, length, category, level, now=None):
+        """Record one occurrence of a keyed message.
+
+        Returns (first, closed): first is True if this occurrence should be
+        logged, closed is the window it ended, if any, for summarizing.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            closed = None
+            window = self._windows.get((key, flow))
+            if window is not None and now - window['start'] < window['length']:
+                window['count'] += 1
+                self.stats['suppressed'] += 1
+                return False, None
+            if window is not None:
+                closed = window
+            self._windows[(key, flow)] = {
+                'key': key, 'flow': flow, 'start': now, 'length': length,
+                'count': 1, 'category': category, 'level': level
+            }
+            return True, closed
+
+    def expired(self, now=None):
+        """Remove and return the windows that are over"""
+        now = time.time() if now is None else now
+        with self._lock:
+            closed = [window for window in self._windows.values()
+                      if now - window['start'] >= window['length']]
+            for window in closed:
+                del self._windows[(window['key'], window['flow'])]
+            return closed
+
+    def record(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, open_windows=len(self._windows))
@@ -0,0 +1,166 @@
+"""
+Inverted-index full-text search over log entries.
+
+A SearchIndex gives every entry an increasing id as it comes in and adds
+the id to the posting list of each token of the entry's text, so posting
+lists stay sorted without any work. A query intersects the posting lists
+of its tokens, walking the shortest one from the newest id down and
+binary searching the others, so it costs about O(k log n) for k
+candidates instead of a scan over every entry.
+
+Like the log buffers, an index holds at most `capacity` entries and
+forgets the oldest first. Forgotten ids are dropped from the posting lists
+in one pass once there are as many of them as live entries. Nothing older
+is searched; truncated() tells whether a query may have missed entries
+that way.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from functions.timestamps import record_ts
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def tokenize(text):
+    """Lowercased word tokens of a text"""
+    return _TOKEN_RE.findall(str(text).lower()) if text else []
+
+def _contains(ids, doc_id):
+    i = bisect_left(ids, doc_id)
+    return i < len(ids) and ids[i] == doc_id
+
+class SearchIndex:
+    """Token -> entry id index over the newest `capacity` entries"""
+
+    def __init__(self, capacity, text_of, entries=()):
+        self.capacity = max(int(capacity), 1)
+        # Searchable text of an entry
+        self._text_of = text_of
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._postings = {}
+        self._next_id = 0
+        self._oldest_id = 0
+        # Forgotten ids still in the posting lists
+        self._stale = 0
+        # Whether older entries than the indexed ones may exist
+        self._dropped = False
+        self._fill(entries)
+
+    def _fill(self, entries):
+        """Index the newest capacity of entries (call with self._lock held or from __init__)"""
+        entries = list(entries)
+        # A full warm-up read may have been cut at the capacity as well
+        self._dropped = len(entries) >= self.capacity
+        for entry in entries[-self.capacity:]:
+            self._add(entry)
+
+    def _add(self, entry):
+        """Index one entry, forgetting the oldest when full (call with self._lock held)"""
+        if len(self._docs) >= self.capacity:
+            self._forget_oldest()
+        doc_id = self._next_id
+        self._next_id += 1
+        self._docs[doc_id] = entry
+        for token in set(tokenize(self._text_of(entry))):
+            self._postings.setdefault(token, []).append(doc_id)
+
+    def _forget_oldest(self):
+        self._dropped = True
+        del self._docs[self._oldest_id]
+        self._oldest_id += 1
+        self._stale += 1
+        if self._stale >= max(len(self._docs), 1024):
+            self._prune()
+
+    def _prune(self):
+        """Drop forgotten ids from the posting lists"""
+        for token in list(self._postings):
+            ids = self._postings[token]
+            del ids[:bisect_left(ids, self._oldest_id)]
+            if not ids:
+                del self._postings[token]
+        self._stale = 0
+
+    def add(self, entry):
+        with self._lock:
+            self._add(entry)
+
+    def resize(self, capacity):
+        """Change the capacity, forgetting the oldest entries if it shrinks"""
+        capacity = max(int(capacity), 1)
+        with self._lock:
+            self.capacity = capacity
+            while len(self._docs) > capacity:
+                self._forget_oldest()
+
+    def replace(self, entries):
+        """Replace the indexed entries (oldest first)"""
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            self._oldest_id = self._next_id
+            self._stale = 0
+            self._fill(entries)
+
+    def search(self, query, limit=50, match=None, since=None, until=None):
+        """Get up to limit entries containing every token of query, newest first.
+
+        match is an optional extra filter on the entry; since and until
+        (epoch ms, until exclusive) bound the time range.
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        with self._lock:
+            postings = [self._postings.get(token) for token in tokens]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            shortest, others = postings[0], postings[1:]
+            results = []
+            for i in range(len(shortest) - 1, bisect_left(shortest, self._oldest_id) - 1, -1):
+                doc_id = shortest[i]
+                if not all(_contains(ids, doc_id) for ids in others):
+                    continue
+                entry = self._docs[doc_id]
+                if since is not None or until is not None:
+                    ts = record_ts(entry)
+                    if since is not None and ts < since:
+                        # Entries come in in time order, so the rest are older still
+                        break
+                    if until is not None and ts >= until:
+                        continue
+                if match is not None and not match(entry):
+                    continue
+                results.append(entry)
+                if limit is not None and len(results) >= limit:
+                    break
+            return results
+
+    def truncated(self, since=None):
+        """Whether entries older than the indexed ones, and from epoch ms since on, may have been dropped"""
+        with self._lock:
+            if not self._dropped:
+                return False
+            if since is None or not self._docs:
+                return True
+            return since < record_ts(self._docs[self._oldest_id])
+
+    def count(self, since=None):
+        """Number of indexed entries, or of those from epoch ms since on"""
+        with self._lock:
+            if since is None:
+                return len(self._docs)
+            total = 0
+            for doc_id in range(self._next_id - 1, self._oldest_id - 1, -1):
+                if record_ts(self._docs[doc_id]) < since:
+                    # Entries come in in time order, so the rest are older still
+                    break
+                total += 1
+            return total
+
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self._docs), 'tokens': len(self._postings)}
@@ -0,0 +1,220 @@
+"""
+Append-only JSONL log segments.
+
+System logs are stored as numbered JSONL files (segment-00000001.jsonl, ...)
+in data/logs/. Logging a line is a single O_APPEND write() to the newest
+segment, which is safe across worker processes without a lock. Once the
+newest segment grows past max_bytes a new one is started, and retention is
+enforced by deleting whole old segments as long as the remaining ones still
+hold at least `retention` entries. Readers walk the segments from the
+newest one backwards and stop as soon as they have what they asked for.
+"""
+
+import json
+import os
+import re
+import threading
+from functions.file_lock import file_lock
+
+# Directory of the segments, inside the data directory
+LOG_SEGMENT_DIRNAME = 'logs'
+
+# A segment is sealed once it grows past this many bytes
+LOG_SEGMENT_MAX_BYTES = 64 * 1024
+
+_SEGMENT_RE = re.compile(r'^segment-(\d{8})\.jsonl$')
+
+def _segment_name(number):
+    return f"segment-{number:08d}.jsonl"
+
+def _parse_lines(data):
+    """Decode the entries of one segment, skipping a torn or corrupt line"""
+    entries = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+class SegmentLog:
+    """A log stored as a directory of append-only JSONL segments"""
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = LOG_SEGMENT_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        # Newest segment path as last seen by this process
+        self._active = None
+        # Sealed segments never change, so their entry counts are cached by name
+        self._sealed_counts = {}
+
+    def _segments(self):
+        """Segment file names, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if _SEGMENT_RE.match(name))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _next_name(self, segments):
+        number = int(_SEGMENT_RE.match(segments[-1]).group(1)) + 1 if segments else 1
+        return _segment_name(number)
+
+    def _lock_path(self):
+        return self.directory
+
+    def _read_segment(self, name):
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                return _parse_lines(f.read())
+        except FileNotFoundError:
+            # Dropped by retention or a clear while we were reading
+            return []
+
+    def _sealed_count(self, name):
+        count = self._sealed_counts.get(name)
+        if count is None:
+            count = self._sealed_counts[name] = len(self._read_segment(name))
+        return count
+
+    def _open_active(self):
+        """Open the newest segment for appending, creating the first one if needed"""
+        if self._active is not None:
+            try:
+                # No O_CREAT: a segment removed by another worker must not come back
+                return os.open(self._active, os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                self._active = None
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self._lock_path()):
+            segments = self._segments()
+            name = segments[-1] if segments else self._next_name(segments)
+            self._active = self._path(name)
+            return os.open(self._active, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def append(self, entry, retention=None):
+        """Append one entry with a single write(), rotating and trimming when the segment is full"""
+        self.append_many([entry], retention)
+
+    def append_many(self, entries, retention=None):
+        """Append a batch of entries with a single write()"""
+        if not entries:
+            return
+        line = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries).encode('utf-8')
+        with self._lock:
+            fd = self._open_active()
+            try:
+                os.write(fd, line)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size >= self.max_bytes:
+                self._rotate(retention)
+
+    def _rotate(self, retention):
+        """Start a new segment and drop old ones beyond retention (call with self._lock held)"""
+        with file_lock(self._lock_path()):
+            segments = self._segments()
+            if segments and self._path(segments[-1]) == self._active:
+                name = self._next_name(segments)
+                os.close(os.open(self._path(name), os.O_WRONLY | os.O_CREAT, 0o644))
+                segments.append(name)
+            # else another worker rotated already
+            self._active = self._path(segments[-1]) if segments else None
+            if retention:
+                self._drop_old_segments(segments, retention)
+
+    def _drop_old_segments(self, segments, retention):
+        sealed = segments[:-1]
+        kept = sum(self._sealed_count(name) for name in sealed)
+        for name in sealed:
+            count = self._sealed_count(name)
+            if kept - count < retention:
+                break
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            self._sealed_counts.pop(name, None)
+            kept -= count
+
+    def read_recent(self, limit=None):
+        """Get up to limit entries, newest first, reading the newest segments only"""
+        entries = []
+        for name in reversed(self._segments()):
+            segment = self._read_segment(name)
+            segment.reverse()
+            entries.extend(segment)
+            if limit is not None and len(entries) >= limit:
+                return entries[:limit]
+        return entries
+
+    def read_all(self):
+        """Get every retained entry, oldest first"""
+        entries = self.read_recent()
+        entries.reverse()
+        return entries
+
+    def count(self):
+        """Number of retained entries"""
+        segments = self._segments()
+        if not segments:
+            return 0
+        return (sum(self._sealed_count(name) for name in segments[:-1])
+                + len(self._read_segment(segments[-1])))
+
+    def replace(self, entries):
+        """Replace the whole log with entries (oldest first)"""
+        with self._lock, file_lock(self._lock_path()):
+            self._replace_locked(entries)
+
+    def _replace_locked(self, entries):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._segments()
+        # Keep numbering upwards so stale writers can't mistake an old name for the newest
+        path = self._path(self._next_name(segments))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, path)
+        for old in segments:
+            try:
+                os.remove(self._path(old))
+            except FileNotFoundError:
+                pass
+        self._sealed_counts.clear()
+        self._active = path
+
+    def import_legacy(self, legacy_file):
+        """Move a legacy JSON-array log file into segments (once). Returns the number of entries."""
+        with self._lock, file_lock(self._lock_path()):
+            if not os.path.exists(legacy_file) or self._segments():
+                return 0
+            try:
+                with open(legacy_file, 'r') as f:
+                    entries = json.load(f)
+            except (ValueError, OSError):
+                entries = []
+            if not isinstance(entries, list):
+                entries = []
+            self._replace_locked(entries)
+            # Kept as a backup, out of the way of the next start
+            os.replace(legacy_file, legacy_file + '.migrated')
+            return len(entries)
+
+    def get_stats(self):
+        segments = self._segments()
+        size = 0
+        for name in segments:
+            try:
+                size += os.path.getsize(self._path(name))
+            except FileNotFoundError:
+                pass
+        return {'segments': len(segments), 'bytes': size, 'max_segment_bytes': self.max_bytes}
@@ -0,0 +1,173 @@
+"""
+Asynchronous, batched log writing.
+
+Logging calls only put the entry on an in-memory queue. A background
+thread drains the queue and hands the entries to the storage layer in
+batches (group commit): a batch is written as soon as it is full or once
+the oldest entry in it has waited max_latency seconds. Readers call
+flush() first so they always see what was logged before them, and
+everything still queued is written on shutdown.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+# Entries written together at most
+LOG_BATCH_SIZE = 256
+# Seconds an entry may wait for its batch to fill up
+LOG_MAX_LATENCY = 0.2
+# Entries held in memory at most; further entries are dropped and counted
+LOG_QUEUE_SIZE = 10000
+# Seconds flush() waits for the writer by default
+LOG_FLUSH_TIMEOUT = 10.0
+
+# All writers, so they can be flushed together on shutdown
+_registry = []
+_registry_lock = threading.Lock()
+
+class AsyncLogWriter:
+    """Queue log entries and persist them in batches from a background thread"""
+
+    def __init__(self, name, write_batch, batch_size=None, max_latency=None, max_queue=None):
+        """
+        Args:
+            name: Label used in stats and the thread name
+            write_batch: Called as write_batch(items) with a list of queued items, in order
+            batch_size, max_latency, max_queue: Override the module defaults
+        """
+        self.name = name
+        self.write_batch = write_batch
+        self.batch_size = batch_size or LOG_BATCH_SIZE
+        self.max_latency = LOG_MAX_LATENCY if max_latency is None else max_latency
+        self.max_queue = max_queue or LOG_QUEUE_SIZE
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._submitted = 0
+        self._done = 0
+        self._flush_waiters = 0
+        self._thread = None
+        self._pid = None
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'max_batch': 0,
+                      'dropped': 0, 'failed': 0, 'errors': 0}
+        with _registry_lock:
+            _registry.append(self)
+
+    def submit(self, item):
+        """Queue an item for writing. Returns False if the queue is full and it was dropped."""
+        with self._cond:
+            self._ensure_thread()
+            if len(self._queue) >= self.max_queue:
+                self.stats['dropped'] += 1
+                return False
+            self._queue.append(item)
+            self._submitted += 1
+            self.stats['queued'] += 1
+            self._cond.notify_all()
+        return True
+
+    def _ensure_thread(self):
+        """Start the writer thread (call with self._cond held); a forked worker needs its own"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        if self._pid is not None and self._pid != os.getpid():
+            # Entries queued before a fork are the parent's to write
+            self._queue.clear()
+            self._done = self._submitted
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+        self._thread.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            # Group commit: give the batch max_latency to fill up unless someone is waiting
+            deadline = time.monotonic() + self.max_latency
+            while len(self._queue) < self.batch_size and not self._flush_waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.write_batch(batch)
+                failed = 0
+            except Exception as e:
+                failed = len(batch)
+                print(f"Log writer {self.name} failed to write {failed} entries: {e}")
+            with self._cond:
+                self._done += len(batch)
+                self.stats['batches'] += 1
+                self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+                if failed:
+                    self.stats['errors'] += 1
+                    self.stats['failed'] += failed
+                else:
+                    self.stats['written'] += len(batch)
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written. Returns False on timeout."""
+        if threading.current_thread() is self._thread:
+            # Called from inside write_batch; the batch is being written right now
+            return True
+        timeout = LOG_FLUSH_TIMEOUT if timeout is None else timeout
+        with self._cond:
+            target = self._submitted
+            if self._done >= target:
+                return True
+            self._ensure_thread()
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self._done >= target, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats, depth=len(self._queue))
+
+def batch_per_target(sqlite_append, file_append):
+    """Build a write_batch for items queued as (target, entry, retention).
+
+    A target is ('sqlite', db_path) or ('json', path), resolved when the item
+    was queued. The entries of each target are written with one call, using
+    the sqlite_store function named sqlite_append or file_append(path,
+    entries, retention), and trimmed to the retention of the last item.
+    """
+    def write_batch(items):
+        batches = {}
+        for target, entry, retention in items:
+            entries, _ = batches.get(target, ([], None))
+            entries.append(entry)
+            batches[target] = (entries, retention)
+        for (backend, path), (entries, retention) in batches.items():
+            if backend == 'sqlite':
+                from functions import sqlite_store
+                getattr(sqlite_store, sqlite_append)(path, entries, retention)
+            else:
+                file_append(path, entries, retention)
+    return write_batch
+
+def flush_all():
+    """Flush every log writer (called on shutdown)"""
+    with _registry_lock:
+        writers = list(_registry)
+    for writer in writers:
+        writer.flush()
+
+def get_log_writer_stats():
+    """Get stats for every log writer, keyed by name"""
+    with _registry_lock:
+        writers = list(_registry)
+    return {writer.name: writer.get_stats() for writer in writers}
+
+atexit.register(flush_all)
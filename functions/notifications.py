@@ -1,35 +1,26 @@
 import requests
 import json
 import time
+import copy
 from datetime import datetime
-from functions.config import get_config, save_config, increment_notification_counter
-from functions.utils import log_notification, format_message_template, evaluate_condition, log_notification_sent
+from functions.config import get_config, increment_notification_counter
+from functions.utils import log_notification, flush_log_summaries, format_message_template, evaluate_condition, log_notification_sent, template_uses_data
 from functions.embed_utils import create_discord_embed
+from functions.flow_state import get_flow_state, update_flow_state, get_last_data
+from functions.flow_spec import as_flow_spec, get_schedulable_specs
+from functions.data_paths import get_path_value
+from functions.events import make_event, record_event, trigger_for
+from functions.flow_aggregates import record_flow_run
+from functions.rollups import record_rollup_event, record_change_detected
+from functions.live_tail import publish
+from functions.template_deps import get_render_memo
 from functions.image_utils import download_image_to_temp, cleanup_temp_files, get_image_filename_from_url, get_mime_type_from_extension
 
 def extract_field_value(data, field_path):
     """Extract field value using bracket notation (e.g., result['0']['web_title'])"""
     try:
-        # Convert bracket notation to dot notation for nested access
-        # e.g., result['0']['web_title'] -> result.0.web_title
-        path = field_path.replace("['", ".").replace("']", "")
-        
-        # Split the path and traverse the data
-        keys = path.split('.')
-        current = data
-        
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            elif isinstance(current, list) and key.isdigit():
-                # Handle array access
-                index = int(key)
-                if 0 <= index < len(current):
-                    current = current[index]
-                else:
-                    return None
-            else:
-                return None
+        # The path is parsed once per distinct path string
+        current = get_path_value(data, field_path)
         
         if current is not None:
             # If the result is a dictionary or list, convert to JSON string for consistent comparison
@@ -43,101 +34,151 @@ def extract_field_value(data, field_path):
         log_notification(f"Field extraction error for '{field_path}': {str(e)}")
         return None
 
-def send_discord_notification(message, flow=None, data=None):
-    """Send a notification to Discord webhook"""
+def _record_delivery(flow_name, trigger, outcome, http_status=None, latency_ms=None):
+    """Record the outcome of a delivery attempt as a flow event, in the flow's statistics and rollups.
+
+    The event is also published to the live tail.
+    """
+    try:
+        event = make_event(flow_name, trigger, outcome, http_status, latency_ms)
+        # Counted first, so statistics rebuilt from the events on first use don't count it twice
+        record_flow_run(event)
+        record_rollup_event(event)
+        record_event(**event)
+        publish('delivery', event)
+    except Exception as e:
+        # Statistics must never break a send
+        print(f"Failed to record flow event: {e}")
+
+def _record_change(flow_name):
+    """Count a detected change in the flow's rollups"""
+    try:
+        record_change_detected(flow_name)
+    except Exception as e:
+        print(f"Failed to record detected change: {e}")
+
+def _render(message, spec, message_data, user_variables):
+    """Render the message (with the image URLs found in it) and the embed of a notification"""
+    image_urls = []
+    if isinstance(message, str):
+        try:
+            # Use the new template formatter with image extraction
+            message, image_urls = format_message_template(message, message_data, user_variables, extract_images=True)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            log_notification(f"Data formatting error: {str(e)}")
+            message, image_urls = format_message_template(message, {}, extract_images=True)
+    embed = None
+    if spec and spec.embed_config:
+        embed = create_discord_embed(spec.embed_config, message_data, user_variables)
+    return message, image_urls, embed
+
+def _render_notification(message, spec, message_data, user_variables):
+    """Render a notification, reusing the render of an earlier send of the flow with the same inputs.
+
+    The inputs are the values the flow's templates depend on (spec.dependencies).
+    Returns (message, image URLs, embed) for the caller to change as it likes.
+    """
+    key = None
+    # Only flows compiled from the config: test sends compile a new spec every time
+    if spec and spec.index is not None and message == spec.message_template:
+        memo_key = spec.dependencies.memo_key(message_data, user_variables)
+        if memo_key is not None:
+            key = (spec.dependencies, memo_key)
+    rendered = get_render_memo().get(key) if key else None
+    if rendered is None:
+        rendered = _render(message, spec, message_data, user_variables)
+        if key:
+            get_render_memo().put(key, copy.deepcopy(rendered))
+        return rendered
+    message, image_urls, embed = copy.deepcopy(rendered)
+    if embed and 'timestamp' in embed:
+        embed['timestamp'] = datetime.now().isoformat()
+    return message, image_urls, embed
+
+def send_discord_notification(message, flow=None, data=None, trigger=None):
+    """Send a notification to Discord webhook.
+
+    flow may be a compiled FlowSpec or a plain flow dict. trigger says what
+    caused the send ('timer', 'change', 'webhook' or 'test') and defaults to
+    the flow's trigger type; the outcome is recorded as a flow event.
+    """
     config = get_config()
-    webhook_url = flow.get('webhook_url', '') if flow else config.get('discord_webhook', '')
+    spec = as_flow_spec(flow, config)
+    webhook_url = spec.webhook_url if spec else config.get('discord_webhook', '')
+    flow_name = (spec.name or None) if spec else None
+    if trigger is None:
+        trigger = trigger_for(spec.trigger_type) if spec else 'test'
     
     if not webhook_url:
+        _record_delivery(flow_name, trigger, 'error')
         return False
     
+    # Stored payload from the flow's last run, used when no data is passed in.
+    # It lives in the blob store and is only loaded and parsed if something reads it.
+    stored = {}
+    def load_last_data():
+        if 'last_data' not in stored:
+            last_data = None
+            if data is None and spec:
+                last_data = spec.get('last_data')
+                if last_data is None and spec.name:
+                    last_data = get_last_data(spec.name)
+            if isinstance(last_data, str):
+                try:
+                    last_data = json.loads(last_data) if last_data else None
+                except json.JSONDecodeError:
+                    log_notification(f"Failed to parse last_data JSON: {last_data}")
+                    last_data = None
+            stored['last_data'] = last_data or {}
+        return stored['last_data']
+    
     # Check conditions if enabled
-    if flow and flow.get('condition_enabled', False):
-        condition = flow.get('condition', '')
-        if condition:
-            # Use provided data, or get from flow's last_data
-            if data is not None:
-                condition_data = data
-            elif flow and flow.get('last_data'):
-                if isinstance(flow['last_data'], str):
-                    try:
-                        condition_data = json.loads(flow['last_data'])
-                    except json.JSONDecodeError:
-                        log_notification(f"Failed to parse last_data JSON for condition: {flow['last_data']}")
-                        condition_data = {}
-                else:
-                    condition_data = flow['last_data']
-            else:
-                condition_data = {}
-            
-            # Evaluate the condition
-            if not evaluate_condition(condition, condition_data):
-                log_notification(f"⏭️ Condition not met for flow '{flow.get('name', 'unnamed')}': {condition}")
-                return True  # Return True to indicate "handled" but not sent
+    if spec and spec.condition:
+        # Use provided data, or get from flow's last_data
+        condition_data = data if data is not None else load_last_data()
+        
+        # Evaluate the condition
+        if not evaluate_condition(spec.condition, condition_data):
+            log_notification(f"⏭️ Condition not met for flow '{spec.get('name', 'unnamed')}': {spec.condition}")
+            _record_delivery(flow_name, trigger, 'skipped')
+            return True  # Return True to indicate "handled" but not sent
     
     try:
         # Handle message formatting with data and extract images
         image_attachments = []
         temp_files = []
         
-        # Use provided data, or get from flow's last_data
+        # Use provided data, or get from flow's last_data if anything reads it
         if data is not None:
             message_data = data
-        elif flow and flow.get('last_data'):
-            if isinstance(flow['last_data'], str):
-                try:
-                    message_data = json.loads(flow['last_data'])
-                except json.JSONDecodeError:
-                    log_notification(f"Failed to parse last_data JSON: {flow['last_data']}")
-                    message_data = {}
-            else:
-                message_data = flow['last_data']
+        elif spec and (spec.embed_config or template_uses_data(message)):
+            message_data = load_last_data()
         else:
             message_data = {}
         
-        if isinstance(message, str):
-            try:
-                # Use the new template formatter with image extraction
-                user_variables = config.get('user_variables', {})
-                message, image_urls = format_message_template(message, message_data, user_variables, extract_images=True)
-                
-                # Log image extraction for debugging
-                if image_urls:
-                    log_notification(f"🖼️ Extracted {len(image_urls)} image URL(s) from message template")
-                
-                # Download images from URLs and prepare for attachment
-                for image_url in image_urls:
-                    temp_file_path = download_image_to_temp(image_url)
-                    if temp_file_path:
-                        temp_files.append(temp_file_path)
-                        filename = get_image_filename_from_url(image_url)
-                        image_attachments.append({
-                            'file_path': temp_file_path,
-                            'filename': filename
-                        })
-                        log_notification(f"🖼️ Downloaded image: {filename} from {image_url}")
-                    else:
-                        log_notification(f"❌ Failed to download image from: {image_url}")
-                
-            except (json.JSONDecodeError, KeyError, TypeError) as e:
-                log_notification(f"Data formatting error: {str(e)}")
-                message, image_urls = format_message_template(message, {}, extract_images=True)
-                # Still try to download images even if data formatting failed
-                for image_url in image_urls:
-                    temp_file_path = download_image_to_temp(image_url)
-                    if temp_file_path:
-                        temp_files.append(temp_file_path)
-                        filename = get_image_filename_from_url(image_url)
-                        image_attachments.append({
-                            'file_path': temp_file_path,
-                            'filename': filename
-                        })
+        user_variables = config.get('user_variables', {})
+        message, image_urls, embed = _render_notification(message, spec, message_data, user_variables)
+        
+        # Log image extraction for debugging
+        if image_urls:
+            log_notification(f"🖼️ Extracted {len(image_urls)} image URL(s) from message template")
+        
+        # Download images from URLs and prepare for attachment
+        for image_url in image_urls:
+            temp_file_path = download_image_to_temp(image_url)
+            if temp_file_path:
+                temp_files.append(temp_file_path)
+                filename = get_image_filename_from_url(image_url)
+                image_attachments.append({
+                    'file_path': temp_file_path,
+                    'filename': filename
+                })
+                log_notification(f"🖼️ Downloaded image: {filename} from {image_url}")
+            else:
+                log_notification(f"❌ Failed to download image from: {image_url}")
         
         # Check if embed is enabled and configured
-        embed = None
-        if flow and flow.get('embed_config', {}).get('enabled', False):
-            embed = create_discord_embed(flow['embed_config'], message_data, user_variables)
-
+        if spec and spec.embed_config:
             # If embed has image/thumbnail URLs, download them and attach as files
             # This makes embeds work even when URLs are not publicly accessible to Discord
             try:
@@ -182,15 +223,12 @@ def send_discord_notification(message, flow=None, data=None):
             except Exception as embed_img_err:
                 log_notification(f"Embed image processing error: {str(embed_img_err)}")
         
-        # Get webhook name and avatar, using defaults if empty
+        # Webhook name and avatar, with defaults resolved when the flow was compiled
         user_variables = config.get('user_variables', {})
-        webhook_name = flow.get('webhook_name', '') if flow else ''
-        webhook_avatar = flow.get('webhook_avatar', '') if flow else ''
-        
-        # Use defaults if flow-specific values are empty
-        if not webhook_name:
+        if spec:
+            webhook_name, webhook_avatar = spec.webhook_name, spec.webhook_avatar
+        else:
             webhook_name = config.get('default_webhook_name', 'Notification Bot')
-        if not webhook_avatar:
             webhook_avatar = config.get('default_webhook_avatar', '')
         
         payload = {
@@ -209,6 +247,7 @@ def send_discord_notification(message, flow=None, data=None):
             payload["avatar_url"] = webhook_avatar
         
         # Send request with or without file attachments
+        started = time.monotonic()
         try:
             if image_attachments:
                 # Prepare multipart form data for file uploads
@@ -230,10 +269,13 @@ def send_discord_notification(message, flow=None, data=None):
                 response = requests.post(webhook_url, json=payload, timeout=10)
             
             success = response.status_code in [200, 204]
+            latency_ms = (time.monotonic() - started) * 1000
         finally:
             # Always cleanup temporary files
             cleanup_temp_files(temp_files)
         
+        _record_delivery(flow_name, trigger, 'sent' if success else 'failed', response.status_code, latency_ms)
+        
         if success:
             # Log what was actually sent
             notification_details = []
@@ -249,11 +291,11 @@ def send_discord_notification(message, flow=None, data=None):
             notification_summary = " | ".join(notification_details) if notification_details else "Empty notification"
             log_notification(f"✅ Notification sent successfully to Discord webhook (Status: {response.status_code}): {notification_summary}")
             
-            # Increment total_notifications_sent
-            increment_notification_counter()
+            # Count the send in memory (global and per flow)
+            increment_notification_counter(spec.get('name') if spec else None)
             
             # Always log to notification-specific log when notification is sent successfully
-            flow_name = flow.get('name', 'Test') if flow else 'Test'
+            flow_name = spec.get('name', 'Test') if spec else 'Test'
             embed_info = None
             if embed:
                 embed_info = {
@@ -272,6 +314,7 @@ def send_discord_notification(message, flow=None, data=None):
         
     except Exception as e:
         log_notification(f"❌ Discord send error: {str(e)}")
+        _record_delivery(flow_name, trigger, 'error')
         # Cleanup temporary files on error
         if 'temp_files' in locals():
             cleanup_temp_files(temp_files)
@@ -280,7 +323,11 @@ def send_discord_notification(message, flow=None, data=None):
 def make_api_request(endpoint, headers=None, request_body=None):
     """Make an API request with optional headers and request body (POST if body, else GET)"""
     try:
-        req_headers = {h['key']: h['value'] for h in headers} if headers else {}
+        # Headers come as a dict (compiled flows) or as a list of key/value pairs
+        if isinstance(headers, dict):
+            req_headers = dict(headers)
+        else:
+            req_headers = {h['key']: h['value'] for h in headers} if headers else {}
         
         if request_body:
             # POST request
@@ -324,102 +371,90 @@ def check_endpoints():
         try:
             config = get_config()
             check_interval = config.get('check_interval', 5)  # Default to 5 seconds
-            config_changed = False  # Track if we need to save
             
-            for flow in config.get('notification_flows', []):
-                if not flow.get('active', False):
-                    continue 
+            # Only active timer and change detection flows are polled; webhook flows wait for POSTs
+            for spec in get_schedulable_specs(config):
                 try:
-                    # Skip webhook-triggered flows
-                    if flow['trigger_type'] == 'on_incoming':
-                        continue
-                    
                     # Get API data if endpoint is configured
                     api_data = None
                     current_value = None
-                    if flow.get('endpoint'):
+                    if spec.endpoint:
                         try:
-                            api_data = make_api_request(
-                                flow['endpoint'],
-                                flow.get('api_headers'),
-                                flow.get('api_request_body')
-                            )
+                            api_data = make_api_request(spec.endpoint, spec.request_headers, spec.request_body)
                             # Extract field value using the same logic as template formatter
-                            if flow.get('field'):
-                                current_value = extract_field_value(api_data, flow['field'])
-                                log_notification(f"🔍 Field extraction for '{flow['name']}': field='{flow['field']}' -> value='{current_value}'")
+                            if spec.field:
+                                current_value = extract_field_value(api_data, spec.field)
+                                log_notification(f"🔍 Field extraction for '{spec.name}': field='{spec.field}' -> value='{current_value}'",
+                                                 level='debug', key='Field extraction', flow=spec.name)
                             else:
                                 current_value = None
                         except Exception as api_error:
-                            log_notification(f"API error in {flow['name']}: {str(api_error)}")
+                            log_notification(f"API error in {spec.name}: {str(api_error)}")
                             continue
                     
+                    # Runtime state lives in its own store, apart from the flow definition
+                    state = get_flow_state(spec.name)
+                    
                     # Handle scheduled monitoring (timer-based flows)
-                    if flow['trigger_type'] == 'timer':
+                    if spec.trigger_type == 'timer':
                         now = time.time()
-                        last_run = flow.get('last_run', 0)
-                        interval = flow.get('interval', 5) * 60
+                        last_run = state.get('last_run', 0)
                         
-                        if now - last_run >= interval:
-                            log_notification(f"⏰ Scheduled monitoring: Running check for flow '{flow['name']}'")
+                        if now - last_run >= spec.interval_seconds:
+                            log_notification(f"⏰ Scheduled monitoring: Running check for flow '{spec.name}'")
                             # Create data object for condition evaluation
                             timer_data = api_data.copy() if api_data else {}
                             timer_data.update({
                                 'value': current_value,
-                                'old_value': flow.get('last_value'),  # Include old_value for template support
+                                'old_value': state.get('last_value'),  # Include old_value for template support
                                 'api_data': api_data
                             })
-                            notification_sent = send_discord_notification(flow['message_template'], flow, timer_data)
+                            notification_sent = send_discord_notification(spec.message_template, spec, timer_data, trigger='timer')
                             if notification_sent:
-                                flow['last_run'] = now
                                 # Store current value as last_value for next run
-                                flow['last_value'] = current_value
-                                config_changed = True
-                                log_notification(f"✅ Updated last_value for timer flow '{flow['name']}' to '{current_value}'")
+                                update_flow_state(spec.name, last_run=now, last_value=current_value)
+                                log_notification(f"✅ Updated last_value for timer flow '{spec.name}' to '{current_value}'")
                             else:
-                                log_notification(f"❌ Failed to send notification for timer flow '{flow['name']}', last_value not updated")
+                                log_notification(f"❌ Failed to send notification for timer flow '{spec.name}', last_value not updated")
                     
                     # Handle change detection flows (immediate on change)
-                    elif flow['trigger_type'] == 'on_change':
-                        if not flow.get('endpoint') or not flow.get('field'):
+                    elif spec.trigger_type == 'on_change':
+                        if not spec.endpoint or not spec.field:
                             continue
                             
                         # Initialize last_value if not present
-                        if 'last_value' not in flow:
-                            flow['last_value'] = current_value
-                            config_changed = True
-                            log_notification(f"🔍 Change detection: Initialized baseline for flow '{flow['name']}' with value '{current_value}'")
+                        if 'last_value' not in state:
+                            update_flow_state(spec.name, last_value=current_value)
+                            log_notification(f"🔍 Change detection: Initialized baseline for flow '{spec.name}' with value '{current_value}'")
                             continue
                         
                         # Only proceed if value actually changed
-                        if current_value != flow['last_value']:
-                            log_notification(f"🔄 Change detected: Field '{flow['field']}' changed from '{flow['last_value']}' to '{current_value}' in flow '{flow['name']}'")
+                        last_value = state['last_value']
+                        if current_value != last_value:
+                            log_notification(f"🔄 Change detected: Field '{spec.field}' changed from '{last_value}' to '{current_value}' in flow '{spec.name}'")
+                            _record_change(spec.name)
                             # Create a data object that includes both API data and change information
                             change_data = api_data.copy() if api_data else {}
                             change_data.update({
                                 'value': current_value,
-                                'old_value': flow['last_value'],
+                                'old_value': last_value,
                                 'api_data': api_data  # Keep original API data as well
                             })
-                            notification_sent = send_discord_notification(flow['message_template'], flow, change_data)
+                            notification_sent = send_discord_notification(spec.message_template, spec, change_data, trigger='change')
                             if notification_sent:
-                                flow['last_value'] = current_value
-                                config_changed = True
-                                log_notification(f"✅ Updated last_value for flow '{flow['name']}' to '{current_value}'")
+                                update_flow_state(spec.name, last_value=current_value)
+                                log_notification(f"✅ Updated last_value for flow '{spec.name}' to '{current_value}'")
                             else:
-                                log_notification(f"❌ Failed to send notification for flow '{flow['name']}', last_value not updated")
+                                log_notification(f"❌ Failed to send notification for flow '{spec.name}', last_value not updated")
                         else:
-                            log_notification(f"🔄 No change detected: Field '{flow['field']}' value '{current_value}' unchanged in flow '{flow['name']}'")
+                            log_notification(f"🔄 No change detected: Field '{spec.field}' value '{current_value}' unchanged in flow '{spec.name}'",
+                                             level='debug', key='No change detected', flow=spec.name)
                                 
                 except Exception as e:
-                    log_notification(f"Error in flow {flow.get('name', 'unnamed')}: {str(e)}")
+                    log_notification(f"Error in flow {spec.name or 'unnamed'}: {str(e)}")
             
-            # Only save if something changed
-            if config_changed:
-                try:
-                    save_config(config)
-                except Exception as save_error:
-                    log_notification(f"Failed to save config: {str(save_error)}")
+            # Summaries of repeated messages whose window is over
+            flush_log_summaries()
             
             # Reset error counter on successful iteration
             consecutive_errors = 0
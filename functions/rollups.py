@@ -0,0 +1,322 @@
+"""
+Time-bucketed per-flow activity rollups.
+
+Every flow keeps three rings of fixed-width buckets: per minute (last two
+hours), per hour (last week) and per day (last 90 days). A bucket holds the
+number of sends, failures, condition skips and detected changes plus a
+histogram of delivery latencies, all in one flat array of integers. Events
+are added to the bucket they fall in as they happen, so a "last N hours"
+query sums a handful of buckets instead of parsing every log entry.
+
+The rollups live in memory and are rebuilt from the retained flow events
+(see functions.events) on first use. Detected changes are not flow events,
+so their per-bucket counts are also persisted through a write-behind buffer
+to data/change_rollups.json (or the change_rollups table with the SQLite
+backend) and added back on rebuild. Like functions.counters, each process
+journals the changes it counted since its last flush (see functions.journal),
+so several workers add up.
+"""
+
+import json
+import os
+import threading
+import time
+from array import array
+from functions.config import get_config, is_sqlite_backend, get_db_path, get_data_dir
+from functions.write_behind import WriteBehind
+from functions.journal import Journal
+
+METRICS = ('sends', 'failures', 'skips', 'changes')
+
+# Upper edges of the latency histogram bins in ms; slower deliveries go in the last bin
+LATENCY_BUCKETS_MS = (25, 50, 100, 200, 400, 800, 1600, 3200, 6400, 12800, 30000)
+
+# Resolution -> (seconds per bucket, buckets kept)
+RESOLUTIONS = {
+    'minute': (60, 120),
+    'hour': (3600, 168),
+    'day': (86400, 90)
+}
+
+PERCENTILES = (50, 95, 99)
+
+CHANGE_ROLLUPS_FILENAME = 'change_rollups.json'
+
+# Default seconds between flushes of the change counts (stats_flush_interval setting); <= 0 writes through
+STATS_FLUSH_INTERVAL = 5.0
+
+# Event outcome -> metric
+_OUTCOME_METRICS = {'sent': 'sends', 'failed': 'failures', 'error': 'failures', 'skipped': 'skips'}
+
+_COLUMNS = {metric: i for i, metric in enumerate(METRICS)}
+_LATENCY_OFFSET = len(METRICS)
+_WIDTH = len(METRICS) + len(LATENCY_BUCKETS_MS)
+
+def _latency_column(latency_ms):
+    for i, edge in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= edge:
+            return _LATENCY_OFFSET + i
+    return _LATENCY_OFFSET + len(LATENCY_BUCKETS_MS) - 1
+
+def latency_percentile(histogram, percentile):
+    """Estimate a latency percentile (upper edge of its bin) from histogram counts"""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = total * percentile / 100.0
+    seen = 0
+    for edge, count in zip(LATENCY_BUCKETS_MS, histogram):
+        seen += count
+        if seen >= rank:
+            return edge
+    return LATENCY_BUCKETS_MS[-1]
+
+class RollupSeries:
+    """A ring of count buckets of one width; each bucket is _WIDTH integers in one array"""
+
+    def __init__(self, seconds, count):
+        self.seconds = seconds
+        self.count = count
+        # Bucket number (epoch seconds // seconds) each slot currently holds, -1 if unused
+        self.numbers = array('q', [-1]) * count
+        self.values = array('q', [0]) * (count * _WIDTH)
+
+    def add(self, ts, column, amount=1):
+        """Add to one column of the bucket ts (epoch seconds) falls in"""
+        number = int(ts // self.seconds)
+        slot = number % self.count
+        held = self.numbers[slot]
+        if held != number:
+            if held > number:
+                # Older than anything the ring still covers
+                return
+            self.numbers[slot] = number
+            start = slot * _WIDTH
+            self.values[start:start + _WIDTH] = array('q', [0]) * _WIDTH
+        self.values[slot * _WIDTH + column] += amount
+
+    def last(self, buckets, now):
+        """Get [(bucket start in epoch seconds, values)] for the last buckets, oldest first"""
+        newest = int(now // self.seconds)
+        result = []
+        for number in range(newest - min(buckets, self.count) + 1, newest + 1):
+            slot = number % self.count
+            if self.numbers[slot] == number:
+                start = slot * _WIDTH
+                values = self.values[start:start + _WIDTH].tolist()
+            else:
+                values = [0] * _WIDTH
+            result.append((number * self.seconds, values))
+        return result
+
+class FlowRollup:
+    """Minute, hour and day rollups of one flow"""
+
+    def __init__(self):
+        self.series = {name: RollupSeries(seconds, count) for name, (seconds, count) in RESOLUTIONS.items()}
+
+    def add(self, ts, column, amount=1):
+        for series in self.series.values():
+            series.add(ts, column, amount)
+
+_rollups_lock = threading.Lock()
+# storage target -> {flow_name: FlowRollup}; None holds all flows together
+_rollups = {}
+
+def _target():
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', get_data_dir())
+
+def get_change_rollups_file():
+    """Get the path of the JSON file holding the detected change counts"""
+    return os.path.join(get_data_dir(), CHANGE_ROLLUPS_FILENAME)
+
+def _changes_target():
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', get_change_rollups_file())
+
+def _load_changes(target):
+    """Stored change counts as {flow_name: {resolution: {bucket number: count}}}"""
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        stored = sqlite_store.get_change_rollups(path)
+    else:
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f).get('flows', {})
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            stored = {}
+    # JSON object keys are strings
+    return {flow_name: {resolution: {int(number): count for number, count in buckets.items()}
+                        for resolution, buckets in series.items() if resolution in RESOLUTIONS}
+            for flow_name, series in stored.items()}
+
+def _store_changes(target, changes):
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        sqlite_store.save_change_rollups(path, changes)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'flows': changes}, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def _apply_change(changes, op):
+    """Count one journaled change (flow_name, ts), dropping buckets the rings no longer cover"""
+    flow_name, ts = op
+    series = changes.setdefault(flow_name, {})
+    for resolution, (seconds, count) in RESOLUTIONS.items():
+        number = int(ts // seconds)
+        buckets = series.setdefault(resolution, {})
+        buckets[number] = buckets.get(number, 0) + 1
+        for old in [n for n in buckets if n <= number - count]:
+            del buckets[old]
+
+# Change counts per storage target, see _load_changes
+_changes_journal = Journal(_load_changes, _store_changes, _apply_change)
+
+def _stats_flush_interval():
+    return get_config().get('stats_flush_interval', STATS_FLUSH_INTERVAL)
+
+_changes_writer = WriteBehind('change_rollups', _changes_journal.replay, _stats_flush_interval)
+
+def _add_changes(rollups, changes):
+    """Add stored change counts to the rollups"""
+    column = _COLUMNS['changes']
+    for flow_name, series in changes.items():
+        for name in (None, flow_name):
+            rollup = rollups.get(name)
+            if rollup is None:
+                rollup = rollups[name] = FlowRollup()
+            for resolution, buckets in series.items():
+                seconds = RESOLUTIONS[resolution][0]
+                for number, count in buckets.items():
+                    rollup.series[resolution].add(number * seconds, column, count)
+
+def _add_event(rollups, event):
+    metric = _OUTCOME_METRICS.get(event.get('outcome'))
+    if metric is None or event.get('ts') is None:
+        return
+    ts = event['ts'] / 1000.0
+    flows = [None, event['flow_name']] if event.get('flow_name') else [None]
+    for flow_name in flows:
+        rollup = rollups.get(flow_name)
+        if rollup is None:
+            rollup = rollups[flow_name] = FlowRollup()
+        rollup.add(ts, _COLUMNS[metric])
+        if event.get('latency_ms') is not None:
+            rollup.add(ts, _latency_column(event['latency_ms']))
+
+def _get_rollups(target):
+    """Get the rollups of a target, rebuilding them from the events and the stored change counts
+    on first use (call with lock held)"""
+    rollups = _rollups.get(target)
+    if rollups is None:
+        from functions.events import get_events
+        rollups = _rollups[target] = {}
+        try:
+            events = get_events()
+        except Exception as e:
+            print(f"Failed to read flow events for rollups: {e}")
+            events = []
+        for event in events:
+            _add_event(rollups, event)
+        try:
+            with _changes_journal.lock:
+                changes = _changes_journal.get(_changes_target())
+                _add_changes(rollups, changes)
+        except Exception as e:
+            print(f"Failed to read detected change counts for rollups: {e}")
+    return rollups
+
+def record_rollup_event(event):
+    """Add a delivery event (see functions.events) to its flow's rollups"""
+    with _rollups_lock:
+        _add_event(_get_rollups(_target()), event)
+
+def record_change_detected(flow_name, ts=None):
+    """Count a detected change for a flow"""
+    ts = time.time() if ts is None else ts
+    with _rollups_lock:
+        rollups = _get_rollups(_target())
+        for name in (None, flow_name):
+            rollup = rollups.get(name)
+            if rollup is None:
+                rollup = rollups[name] = FlowRollup()
+            rollup.add(ts, _COLUMNS['changes'])
+    # Counted first, so rollups rebuilt from the stored counts on first use don't count it twice
+    target = _changes_target()
+    with _changes_journal.lock:
+        _changes_journal.record(target, (flow_name, ts))
+    # Outside the lock: in write-through mode this writes right away
+    _changes_writer.mark_dirty(target, True)
+
+def _summarize(values):
+    summary = {metric: values[_COLUMNS[metric]] for metric in METRICS}
+    histogram = values[_LATENCY_OFFSET:]
+    for percentile in PERCENTILES:
+        summary[f'latency_p{percentile}'] = latency_percentile(histogram, percentile)
+    return summary
+
+def get_timeseries(flow_name=None, resolution='hour', buckets=None, now=None):
+    """Get the last buckets of a flow's rollups (all flows if None), oldest first.
+
+    Each bucket has its start (epoch ms), the METRICS counts and latency
+    percentiles. Raises ValueError for an unknown resolution.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}")
+    seconds, count = RESOLUTIONS[resolution]
+    buckets = count if buckets is None else max(1, min(int(buckets), count))
+    now = time.time() if now is None else now
+    with _rollups_lock:
+        rollup = _get_rollups(_target()).get(flow_name)
+        rows = rollup.series[resolution].last(buckets, now) if rollup else [
+            ((int(now // seconds) - buckets + 1 + i) * seconds, [0] * _WIDTH) for i in range(buckets)]
+    return [dict(_summarize(values), start=start * 1000) for start, values in rows]
+
+def get_window_totals(flow_name=None, hours=24, now=None):
+    """Sum a flow's rollups (all flows if None) over the last hours, using the finest resolution that covers them.
+
+    Only buckets that start inside the window are summed, so the total never
+    reaches further back than the window; since (epoch ms) is where the summed
+    buckets begin.
+    """
+    now = time.time() if now is None else now
+    span = hours * 3600
+    for resolution, (seconds, count) in sorted(RESOLUTIONS.items(), key=lambda item: item[1][0]):
+        if seconds * count >= span or resolution == 'day':
+            break
+    # One more bucket than the window needs, trimmed below to those starting inside it
+    buckets = int(-(-span // seconds)) + 1
+    start = now - span
+    totals = [0] * _WIDTH
+    since = None
+    with _rollups_lock:
+        rollup = _get_rollups(_target()).get(flow_name)
+        rows = rollup.series[resolution].last(buckets, now) if rollup else []
+    for bucket_start, values in rows:
+        if bucket_start < start:
+            continue
+        if since is None:
+            since = bucket_start
+        totals = [a + b for a, b in zip(totals, values)]
+    if since is None:
+        since = -(-start // seconds) * seconds
+    return dict(_summarize(totals), hours=hours, resolution=resolution, since=int(since * 1000))
+
+def flush_change_rollups():
+    """Persist buffered change counts now"""
+    _changes_writer.flush()
+
+def clear_rollup_cache():
+    """Flush the change counts and drop the rollups (they are rebuilt from storage on next use)"""
+    _changes_writer.flush()
+    _changes_journal.clear()
+    with _rollups_lock:
+        _rollups.clear()
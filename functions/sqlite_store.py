@@ -0,0 +1,520 @@
+"""
+SQLite storage engine for flows, runtime state and logs.
+
+Enabled with TURTIFICATIONS_STORAGE=sqlite. Flows, per-flow runtime state,
+system logs, sent-notification records and flow events live in separate
+tables so a single log line or last_value update costs one row write
+instead of a whole-file JSON rewrite. The database runs in WAL mode so readers never
+block the writer.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from functions.timestamps import with_epoch_ts
+
+# Runtime keys stored in flow_state instead of the flow definition
+FLOW_STATE_KEYS = ('last_value', 'last_run', 'last_data', 'last_data_ref')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flows (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    definition TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_flows_name ON flows(name);
+CREATE INDEX IF NOT EXISTS idx_flows_category ON flows(category);
+CREATE TABLE IF NOT EXISTS flow_state (
+    flow_name TEXT PRIMARY KEY,
+    last_value TEXT,
+    last_run REAL,
+    last_data TEXT,
+    last_data_ref TEXT
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    ts INTEGER,
+    category TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_category ON logs(category);
+CREATE TABLE IF NOT EXISTS sent_notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    ts INTEGER,
+    flow_name TEXT,
+    category TEXT,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sent_flow_name ON sent_notifications(flow_name);
+CREATE INDEX IF NOT EXISTS idx_sent_timestamp ON sent_notifications(timestamp);
+CREATE INDEX IF NOT EXISTS idx_sent_category ON sent_notifications(category);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    flow_name TEXT,
+    trigger TEXT,
+    outcome TEXT,
+    http_status INTEGER,
+    latency_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_events_flow_ts ON events(flow_name, ts);
+CREATE TABLE IF NOT EXISTS flow_aggregates (
+    flow_name TEXT PRIMARY KEY,
+    stats TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS change_rollups (
+    flow_name TEXT PRIMARY KEY,
+    buckets TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (scope, name)
+);
+"""
+
+_local = threading.local()
+
+def get_connection(db_path):
+    """Get this thread's connection to the database, creating the schema on first use"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        _upgrade_schema(conn)
+        connections[db_path] = conn
+    return conn
+
+def _upgrade_schema(conn):
+    """Add columns introduced after a database was created"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(flow_state)')}
+    if 'last_data_ref' not in columns:
+        conn.execute('ALTER TABLE flow_state ADD COLUMN last_data_ref TEXT')
+    for table in ('logs', 'sent_notifications'):
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if 'ts' not in columns:
+            _add_epoch_ts_column(conn, table)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(ts)')
+
+def _add_epoch_ts_column(conn, table):
+    """Add the ts column to a log table, filled in from the stored display timestamps"""
+    with _Transaction(conn):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN ts INTEGER')
+        rows = conn.execute(f'SELECT id, entry FROM {table}').fetchall()
+        updates = []
+        for row_id, entry in rows:
+            entry = with_epoch_ts(json.loads(entry))
+            updates.append((entry.get('ts'), json.dumps(entry), row_id))
+        conn.executemany(f'UPDATE {table} SET ts = ?, entry = ? WHERE id = ?', updates)
+
+def close_connections():
+    """Close all connections opened by the current thread"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block of writes"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+def _get_meta(conn, key, default=None):
+    row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else default
+
+def _set_meta(conn, key, value):
+    conn.execute('INSERT INTO meta (key, value) VALUES (?, ?) '
+                 'ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, str(value)))
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True)
+
+# ===== Configuration =====
+
+def has_config(db_path):
+    """Check whether the database holds a configuration yet"""
+    conn = get_connection(db_path)
+    return conn.execute('SELECT 1 FROM settings LIMIT 1').fetchone() is not None
+
+def get_config_generation(db_path):
+    """Get the config generation counter, bumped by every save_config"""
+    conn = get_connection(db_path)
+    return int(_get_meta(conn, 'config_generation', 0))
+
+def load_config(db_path):
+    """Assemble the config dict from the settings and flows tables.
+
+    Runtime state is not merged in; it is read through functions.flow_state.
+    """
+    conn = get_connection(db_path)
+    config = {key: json.loads(value) for key, value in conn.execute('SELECT key, value FROM settings')}
+
+    flows = [json.loads(definition) for (definition,) in
+             conn.execute('SELECT definition FROM flows ORDER BY position')]
+    # The settings table keeps an empty notification_flows marker when the key exists
+    if flows or 'notification_flows' in config:
+        config['notification_flows'] = flows
+    return config
+
+def _split_flow(flow):
+    """Split a flow dict into (definition, runtime state)"""
+    definition = {k: v for k, v in flow.items() if k not in FLOW_STATE_KEYS}
+    state = {k: flow[k] for k in FLOW_STATE_KEYS if k in flow}
+    return definition, state
+
+def _state_row(state):
+    last_value = _dumps(state['last_value']) if 'last_value' in state else None
+    last_run = state.get('last_run')
+    last_data = state.get('last_data')
+    if last_data is not None and not isinstance(last_data, str):
+        try:
+            last_data = json.dumps(last_data)
+        except Exception:
+            last_data = ""
+    return (last_value, last_run, last_data, state.get('last_data_ref'))
+
+def save_config(db_path, config):
+    """Persist a config dict, writing only the rows that changed.
+
+    Tracking keys still embedded in a flow (legacy configs) are written to
+    flow_state; otherwise flow_state is left to functions.flow_state.
+    """
+    conn = get_connection(db_path)
+    flows = config.get('notification_flows', [])
+
+    settings = {k: _dumps(v) for k, v in config.items() if k != 'notification_flows'}
+    if 'notification_flows' in config:
+        # Remember that the key exists even when the list is empty
+        settings['notification_flows'] = _dumps([])
+
+    with _Transaction(conn):
+        stored_settings = dict(conn.execute('SELECT key, value FROM settings'))
+        for key, value in settings.items():
+            if stored_settings.get(key) != value:
+                conn.execute('INSERT INTO settings (key, value) VALUES (?, ?) '
+                             'ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, value))
+        for key in set(stored_settings) - set(settings):
+            conn.execute('DELETE FROM settings WHERE key = ?', (key,))
+
+        stored_flows = {position: (name, definition) for position, name, definition in
+                        conn.execute('SELECT position, name, definition FROM flows')}
+        stored_states = {row[0]: tuple(row[1:]) for row in
+                         conn.execute('SELECT flow_name, last_value, last_run, last_data, last_data_ref '
+                                      'FROM flow_state')}
+
+        for position, flow in enumerate(flows):
+            definition, state = _split_flow(flow)
+            name = flow.get('name', '')
+            encoded = _dumps(definition)
+            if stored_flows.get(position) != (name, encoded):
+                conn.execute('INSERT INTO flows (position, name, category, definition) VALUES (?, ?, ?, ?) '
+                             'ON CONFLICT(position) DO UPDATE SET name = excluded.name, '
+                             'category = excluded.category, definition = excluded.definition',
+                             (position, name, flow.get('category', 'General'), encoded))
+            if state and stored_states.get(name) != _state_row(state):
+                _upsert_state(conn, name, state)
+
+        conn.execute('DELETE FROM flows WHERE position >= ?', (len(flows),))
+
+        _set_meta(conn, 'config_generation', int(_get_meta(conn, 'config_generation', 0)) + 1)
+
+def _upsert_state(conn, flow_name, state):
+    conn.execute('INSERT INTO flow_state (flow_name, last_value, last_run, last_data, last_data_ref) '
+                 'VALUES (?, ?, ?, ?, ?) '
+                 'ON CONFLICT(flow_name) DO UPDATE SET last_value = excluded.last_value, '
+                 'last_run = excluded.last_run, last_data = excluded.last_data, '
+                 'last_data_ref = excluded.last_data_ref',
+                 (flow_name,) + _state_row(state))
+
+# ===== Flow runtime state =====
+
+def get_flow_state(db_path, flow_name):
+    """Get one flow's runtime state as a dict"""
+    conn = get_connection(db_path)
+    row = conn.execute('SELECT last_value, last_run, last_data, last_data_ref FROM flow_state '
+                       'WHERE flow_name = ?', (flow_name,)).fetchone()
+    if row is None:
+        return {}
+    last_value, last_run, last_data, last_data_ref = row
+    state = {}
+    if last_value is not None:
+        state['last_value'] = json.loads(last_value)
+    if last_run is not None:
+        state['last_run'] = last_run
+    if last_data is not None:
+        state['last_data'] = last_data
+    if last_data_ref is not None:
+        state['last_data_ref'] = last_data_ref
+    return state
+
+def get_flow_state_names(db_path):
+    """Get the names of all flows with stored runtime state"""
+    conn = get_connection(db_path)
+    return [name for (name,) in conn.execute('SELECT flow_name FROM flow_state')]
+
+def set_flow_state(db_path, flow_name, state):
+    """Write one flow's runtime state as a single row"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        _upsert_state(conn, flow_name, state)
+
+def delete_flow_state(db_path, flow_name):
+    """Remove one flow's runtime state"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.execute('DELETE FROM flow_state WHERE flow_name = ?', (flow_name,))
+
+# ===== Notification counters =====
+
+def get_counters(db_path):
+    """Get the stored counts as {'total': int, 'flows': {name: int}}, or None if never saved"""
+    conn = get_connection(db_path)
+    rows = conn.execute('SELECT scope, name, value FROM counters').fetchall()
+    if not rows:
+        return None
+    counters = {'total': 0, 'flows': {}}
+    for scope, name, value in rows:
+        if scope == 'total':
+            counters['total'] = value
+        else:
+            counters['flows'][name] = value
+    return counters
+
+def save_counters(db_path, counters):
+    """Replace the stored counts"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.execute('DELETE FROM counters')
+        conn.execute("INSERT INTO counters (scope, name, value) VALUES ('total', '', ?)",
+                     (counters.get('total', 0),))
+        conn.executemany("INSERT INTO counters (scope, name, value) VALUES ('flow', ?, ?)",
+                         list(counters.get('flows', {}).items()))
+
+# ===== Flow run statistics =====
+
+def get_flow_aggregates(db_path):
+    """Get the stored per-flow run statistics as {flow_name: stats}, or None if never saved"""
+    conn = get_connection(db_path)
+    if _get_meta(conn, 'flow_aggregates_saved') is None:
+        return None
+    return {name: json.loads(stats) for name, stats in conn.execute('SELECT flow_name, stats FROM flow_aggregates')}
+
+def save_flow_aggregates(db_path, aggregates):
+    """Replace the stored per-flow run statistics"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.execute('DELETE FROM flow_aggregates')
+        conn.executemany('INSERT INTO flow_aggregates (flow_name, stats) VALUES (?, ?)',
+                         [(name, _dumps(stats)) for name, stats in aggregates.items()])
+        _set_meta(conn, 'flow_aggregates_saved', 1)
+
+# ===== Detected change rollups =====
+
+def get_change_rollups(db_path):
+    """Get the stored detected change counts as {flow_name: {resolution: {bucket: count}}}"""
+    conn = get_connection(db_path)
+    return {name: json.loads(buckets) for name, buckets in conn.execute('SELECT flow_name, buckets FROM change_rollups')}
+
+def save_change_rollups(db_path, changes):
+    """Replace the stored detected change counts"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.execute('DELETE FROM change_rollups')
+        conn.executemany('INSERT INTO change_rollups (flow_name, buckets) VALUES (?, ?)',
+                         [(name, _dumps(series)) for name, series in changes.items()])
+
+# ===== System logs =====
+
+def _log_row(entry):
+    entry = with_epoch_ts(entry)
+    return (entry.get('timestamp', ''), entry.get('ts'), entry.get('category', 'General'), json.dumps(entry))
+
+def get_logs(db_path, limit=None):
+    """Get retained system logs (only the newest limit if given), oldest first"""
+    conn = get_connection(db_path)
+    if limit is None:
+        return [json.loads(entry) for (entry,) in conn.execute('SELECT entry FROM logs ORDER BY id')]
+    rows = conn.execute('SELECT entry FROM logs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+    return [json.loads(entry) for (entry,) in reversed(rows)]
+
+def append_log(db_path, log_entry, retention=None):
+    """Append a single log entry and trim to the retention limit"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        cursor = conn.execute('INSERT INTO logs (timestamp, ts, category, entry) VALUES (?, ?, ?, ?)',
+                              _log_row(log_entry))
+        if retention:
+            conn.execute('DELETE FROM logs WHERE id <= ?', (cursor.lastrowid - retention,))
+
+def append_logs(db_path, log_entries, retention=None):
+    """Append a batch of log entries in one transaction and trim to the retention limit"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.executemany('INSERT INTO logs (timestamp, ts, category, entry) VALUES (?, ?, ?, ?)',
+                         [_log_row(entry) for entry in log_entries])
+        if retention:
+            last_id = conn.execute('SELECT MAX(id) FROM logs').fetchone()[0] or 0
+            conn.execute('DELETE FROM logs WHERE id <= ?', (last_id - retention,))
+
+def replace_logs(db_path, logs):
+    """Replace all system logs"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.execute('DELETE FROM logs')
+        conn.executemany('INSERT INTO logs (timestamp, ts, category, entry) VALUES (?, ?, ?, ?)',
+                         [_log_row(log) for log in logs])
+
+# ===== Sent notifications =====
+
+def get_notification_logs(db_path, since=None):
+    """Get retained sent-notification records oldest first, optionally from epoch ms since on"""
+    conn = get_connection(db_path)
+    if since is None:
+        rows = conn.execute('SELECT entry FROM sent_notifications ORDER BY id')
+    else:
+        rows = conn.execute('SELECT entry FROM sent_notifications WHERE ts >= ? ORDER BY id', (since,))
+    return [json.loads(entry) for (entry,) in rows]
+
+def _notification_row(entry):
+    entry = with_epoch_ts(entry)
+    return (entry.get('timestamp', ''), entry.get('ts'), entry.get('flow_name'),
+            entry.get('category', 'Notifications'), json.dumps(entry))
+
+def append_notification_log(db_path, notification_entry, retention=None):
+    """Append a single sent-notification record and trim to the retention limit"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        cursor = conn.execute('INSERT INTO sent_notifications (timestamp, ts, flow_name, category, entry) '
+                              'VALUES (?, ?, ?, ?, ?)', _notification_row(notification_entry))
+        if retention:
+            conn.execute('DELETE FROM sent_notifications WHERE id <= ?', (cursor.lastrowid - retention,))
+
+def append_notification_logs(db_path, notification_entries, retention=None):
+    """Append a batch of sent-notification records in one transaction and trim to the retention limit"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.executemany('INSERT INTO sent_notifications (timestamp, ts, flow_name, category, entry) '
+                         'VALUES (?, ?, ?, ?, ?)', [_notification_row(entry) for entry in notification_entries])
+        if retention:
+            last_id = conn.execute('SELECT MAX(id) FROM sent_notifications').fetchone()[0] or 0
+            conn.execute('DELETE FROM sent_notifications WHERE id <= ?', (last_id - retention,))
+
+def replace_notification_logs(db_path, logs):
+    """Replace all sent-notification records"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.execute('DELETE FROM sent_notifications')
+        conn.executemany('INSERT INTO sent_notifications (timestamp, ts, flow_name, category, entry) '
+                         'VALUES (?, ?, ?, ?, ?)', [_notification_row(entry) for entry in logs])
+
+# ===== Flow events =====
+
+EVENT_COLUMNS = ('ts', 'flow_name', 'trigger', 'outcome', 'http_status', 'latency_ms')
+
+def get_events(db_path, limit=None):
+    """Get retained flow events (only the newest limit if given), oldest first"""
+    conn = get_connection(db_path)
+    query = f"SELECT {', '.join(EVENT_COLUMNS)} FROM events ORDER BY id DESC"
+    rows = conn.execute(query + ' LIMIT ?', (limit,)).fetchall() if limit else conn.execute(query).fetchall()
+    return [dict(zip(EVENT_COLUMNS, row)) for row in reversed(rows)]
+
+def append_events(db_path, events, retention=None):
+    """Append a batch of flow events in one transaction and trim to the retention limit"""
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        conn.executemany(f"INSERT INTO events ({', '.join(EVENT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                         [tuple(event.get(column) for column in EVENT_COLUMNS) for event in events])
+        if retention:
+            last_id = conn.execute('SELECT MAX(id) FROM events').fetchone()[0] or 0
+            conn.execute('DELETE FROM events WHERE id <= ?', (last_id - retention,))
+
+# ===== Migration =====
+
+def _load_json_file(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def migrate_from_json(db_path, config_file, log_file, notification_log_file, force=False):
+    """One-shot import of the JSON data files into the database.
+
+    Does nothing if the database already holds a configuration, unless
+    force is set. The JSON files are left in place as a backup.
+    Returns a summary dict, or None if nothing was migrated.
+    """
+    if has_config(db_path) and not force:
+        return None
+    if not os.path.exists(config_file):
+        return None
+
+    config = _load_json_file(config_file, {})
+    logs = _load_json_file(log_file, None)
+    if logs is None:
+        # Logs written by the JSON backend live in JSONL segments next to log_file
+        from functions.log_segments import SegmentLog, LOG_SEGMENT_DIRNAME
+        logs = SegmentLog(os.path.join(os.path.dirname(log_file) or '.', LOG_SEGMENT_DIRNAME)).read_all()
+    notification_logs = _load_json_file(notification_log_file, [])
+
+    save_config(db_path, config)
+    replace_logs(db_path, logs)
+    replace_notification_logs(db_path, notification_logs)
+
+    conn = get_connection(db_path)
+    with _Transaction(conn):
+        _set_meta(conn, 'migrated_from_json', datetime.now().isoformat())
+
+    return {
+        'flows': len(config.get('notification_flows', [])),
+        'logs': len(logs),
+        'notification_logs': len(notification_logs)
+    }
+
+if __name__ == '__main__':
+    # Usage: python -m functions.sqlite_store [--force]
+    from functions.config import CONFIG_FILE, LOG_FILE, NOTIFICATION_LOG_FILE, get_db_path
+    summary = migrate_from_json(get_db_path(), CONFIG_FILE, LOG_FILE, NOTIFICATION_LOG_FILE,
+                                force='--force' in sys.argv)
+    if summary:
+        print(f"Migrated {summary['flows']} flows, {summary['logs']} logs and "
+              f"{summary['notification_logs']} sent notifications into {get_db_path()}")
+    else:
+        print("Nothing to migrate (database already populated or no config.json found)")
@@ -0,0 +1,200 @@
+"""
+Static dependencies of message templates and flows, and what they allow.
+
+A compiled template reads a known set of data paths and user variables,
+and may read the clock ({time}). TemplateDependencies records these:
+
+- data_paths: compiled paths (see data_paths.compile_path) read from the data
+- user_variables: names of the user variables read
+- volatile: the output changes with time, whatever the inputs
+- whole_data: the whole payload is read ({data}, conditions, color rules)
+- calc_scope: calculations may look up any top-level value of the data or
+  user variable by name (a value inserted into a calculation can itself be
+  a variable name), so all top-level scalars count as inputs
+
+Two renders with the same values at those inputs give the same output, so
+memo_key(data, user_variables) is a key for memoizing rendered output and
+project(data) keeps only the part of a payload a render can read.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+# Rendered notifications kept by the render memo
+RENDER_MEMO_SIZE = 256
+
+def _scalar_items(values):
+    return [(key, value) for key, value in values.items() if isinstance(value, (int, float, str))]
+
+def _lookup(data, keys):
+    """[value] at compiled keys (walked like data_paths.resolve_path), or [] if there is none"""
+    current = data
+    for name, index in keys:
+        if isinstance(current, dict):
+            if name not in current:
+                return []
+            current = current[name]
+        elif isinstance(current, list) and index is not None and index < len(current):
+            current = current[index]
+        else:
+            return []
+    return [current]
+
+def _project(value, tree):
+    """Copy of value with only the branches of tree; a None branch is kept whole"""
+    if tree is None:
+        return value
+    if isinstance(value, dict):
+        return {name: _project(value[name], branch) for name, (_, branch) in tree.items() if name in value}
+    if isinstance(value, list):
+        needed = {index: branch for index, branch in tree.values() if index is not None and index < len(value)}
+        # Unused items before the last needed one stay as None to keep the indexes
+        projected = [None] * (max(needed) + 1 if needed else 0)
+        for index, branch in needed.items():
+            projected[index] = _project(value[index], branch)
+        return projected
+    return value
+
+class TemplateDependencies:
+    """What the output of a template (or of everything a flow renders) depends on"""
+
+    __slots__ = ('data_paths', 'user_variables', 'volatile', 'whole_data', 'calc_scope',
+                 '_key_paths', '_key_variables', '_tree')
+
+    def __init__(self, data_paths=(), user_variables=(), volatile=False, whole_data=False, calc_scope=False):
+        self.data_paths = frozenset(data_paths)
+        self.user_variables = frozenset(user_variables)
+        self.volatile = volatile
+        self.whole_data = whole_data
+        self.calc_scope = calc_scope
+        # Inputs of memo keys, in a fixed order
+        self._key_paths = tuple(sorted(self.data_paths))
+        self._key_variables = tuple(sorted(self.user_variables))
+        self._tree = None
+
+    def union(self, *others):
+        """Dependencies of rendering this and all of others"""
+        every = (self,) + others
+        return TemplateDependencies(
+            self.data_paths.union(*(other.data_paths for other in others)),
+            self.user_variables.union(*(other.user_variables for other in others)),
+            any(deps.volatile for deps in every), any(deps.whole_data for deps in every),
+            any(deps.calc_scope for deps in every)
+        )
+
+    @property
+    def memoizable(self):
+        return not (self.volatile or self.whole_data)
+
+    def memo_key(self, data, user_variables=None):
+        """A string equal for all data and user variables that render the same, or None if renders can't be reused"""
+        if not self.memoizable or not isinstance(data, dict):
+            return None
+        user_variables = user_variables or {}
+        inputs = [
+            [_lookup(data, keys) for keys in self._key_paths],
+            [[user_variables[name]] if name in user_variables else [] for name in self._key_variables],
+        ]
+        if self.calc_scope:
+            inputs.append(_scalar_items(data))
+            inputs.append(_scalar_items(user_variables))
+        try:
+            return json.dumps(inputs, default=str)
+        except (TypeError, ValueError):
+            return None
+
+    def _path_tree(self):
+        """The data paths as a tree: name -> (index, subtree), None where the value is read whole"""
+        if self._tree is None:
+            tree = {}
+            # Shorter paths first, so a path read whole ends the branches below it
+            for keys in sorted(self.data_paths, key=len):
+                node = tree
+                for depth, (name, index) in enumerate(keys):
+                    last = depth == len(keys) - 1
+                    if name not in node:
+                        node[name] = (index, None if last else {})
+                    elif last:
+                        node[name] = (index, None)
+                    branch = node[name][1]
+                    if branch is None:
+                        break
+                    node = branch
+            self._tree = tree
+        return self._tree
+
+    def project(self, data):
+        """The part of data that renders read, or data itself when they may read all of it"""
+        if self.whole_data or not isinstance(data, dict):
+            return data
+        projected = _project(data, self._path_tree())
+        if self.calc_scope:
+            for key, value in _scalar_items(data):
+                projected.setdefault(key, value)
+        return projected
+
+    def as_dict(self):
+        return {
+            'data_paths': sorted({'.'.join(name for name, _ in keys) for keys in self.data_paths}),
+            'user_variables': sorted(self.user_variables),
+            'volatile': self.volatile,
+            'whole_data': self.whole_data,
+            'calc_scope': self.calc_scope,
+        }
+
+    def __repr__(self):
+        return f"TemplateDependencies({self.as_dict()!r})"
+
+# Renders that read nothing, and renders that may read anything in the data
+NO_DEPENDENCIES = TemplateDependencies()
+WHOLE_DATA = TemplateDependencies(whole_data=True)
+
+class RenderMemo:
+    """Bounded least-recently-used map of memo keys to rendered output"""
+
+    def __init__(self, size=RENDER_MEMO_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = size
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        """The output remembered for key, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return self._entries[key]
+
+    def put(self, key, output):
+        with self._lock:
+            self._entries[key] = output
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+_render_memo = RenderMemo()
+
+def get_render_memo():
+    """The render memo of this process"""
+    return _render_memo
+
+def get_render_memo_stats():
+    """Get the size and hit counts of the render memo"""
+    return _render_memo.get_stats()
+
+def clear_render_memo():
+    """Forget all memoized renders"""
+    _render_memo.clear()
@@ -0,0 +1,172 @@
+"""
+Tokenizer for the message template language.
+
+A template is text with {placeholders} and [calculations]:
+
+- {...} is a placeholder. Its content may contain nested braces, as in
+  {img:{url}} or {calc:{price} * 2}.
+- [...] in the text is a calculation and may contain placeholders. A
+  Markdown link or image ([text](url), ![alt](url)), a reference link
+  ([text][ref]) and a span of nothing but blanks and images ([ ]) stay
+  text.
+- A backslash before \\, {, }, [ or ] makes that character plain text.
+  Other backslashes are kept as they are.
+- A { or [ that is never closed, and a } or ] that closes nothing, are
+  plain text and reported as errors with their position.
+
+tokenize_template makes a single pass over the special characters and
+never goes back over the template: a brace that turns out to be closed
+replaces the tokens emitted since it opened. Placeholders only record
+where their content starts and ends until the pass is over, so only the
+outermost ones are ever sliced out and the work is linear in the template
+length however deeply nested or unbalanced the template is.
+"""
+
+import re
+
+# Token kinds
+TEXT = 'text'
+PLACEHOLDER = 'placeholder'
+CALC_START = 'calc_start'
+CALC_END = 'calc_end'
+
+ESCAPABLE = '\\{}[]'
+
+_SPECIAL_RE = re.compile(r'[\\{}\[\]]')
+
+def _is_blank(kind, value):
+    """Whether a token leaves a [span] without anything to calculate"""
+    if kind == TEXT:
+        return not value.strip()
+    return kind == PLACEHOLDER and value.startswith('img:')
+
+def _merge_text(tokens, template):
+    """Join runs of text tokens (with one join per run, to stay linear)
+    and slice the content of placeholders out of the template"""
+    merged = []
+    run = []
+    for token in tokens + [(None, None, None)]:
+        if token[0] == TEXT:
+            run.append(token)
+            continue
+        if run:
+            merged.append((TEXT, ''.join(value for _, value, _ in run), run[0][2]))
+            run = []
+        if token[0] == PLACEHOLDER:
+            start, end = token[1]
+            merged.append((PLACEHOLDER, template[start:end], token[2]))
+        elif token[0] is not None:
+            merged.append(token)
+    return merged
+
+def tokenize_template(template):
+    """Split a message template into tokens and find its syntax errors.
+
+    Returns (tokens, errors). Tokens are (kind, value, position) tuples
+    in template order: value is the text of TEXT tokens, the content
+    between the braces of PLACEHOLDER tokens and None for CALC_START and
+    CALC_END, which enclose the tokens of a calculation. Errors are
+    (position, message) tuples, sorted by position.
+    """
+    tokens = []
+    errors = []
+    # Open braces: (position, index of their provisional '{' token, calc span state, error count)
+    braces = []
+    # Index of the provisional '[' token of the open span, or None
+    span = None
+    # Whether the open span has anything to calculate
+    span_content = False
+    # The next span is the [ref] of a reference link
+    reference = False
+    text_start = 0
+    escaped = -1
+
+    for match in _SPECIAL_RE.finditer(template):
+        i = match.start()
+        if i == escaped:
+            continue
+        char = template[i]
+        if char == '\\':
+            following = template[i + 1:i + 2]
+            if not following or following not in ESCAPABLE:
+                # Not an escape, the backslash stays in the text
+                continue
+        if i > text_start:
+            tokens.append((TEXT, template[text_start:i], text_start))
+            if span is not None and not span_content:
+                span_content = not _is_blank(TEXT, template[text_start:i])
+        text_start = i + 1
+
+        if char == '\\':
+            tokens.append((TEXT, template[i + 1], i))
+            span_content = span_content or span is not None
+            escaped = i + 1
+            text_start = i + 2
+        elif char == '{':
+            braces.append((i, len(tokens), (span, span_content, reference), len(errors)))
+            tokens.append((TEXT, '{', i))
+            span_content = span_content or span is not None
+        elif char == '}':
+            if not braces:
+                errors.append((i, "Unmatched '}'"))
+                tokens.append((TEXT, '}', i))
+                span_content = span_content or span is not None
+                continue
+            start, index, (span, span_content, reference), error_count = braces.pop()
+            # Undo what the characters inside did to the span around the braces
+            if span is not None:
+                tokens[span] = (TEXT, '[', tokens[span][2])
+            del tokens[index:]
+            del errors[error_count:]
+            # The bounds of the content for now: an enclosing pair of braces
+            # may still swallow this placeholder
+            tokens.append((PLACEHOLDER, (start + 1, i), start))
+            if span is not None and not span_content:
+                span_content = not _is_blank(PLACEHOLDER, template[start + 1:min(start + 5, i)])
+        elif char == '[':
+            if span is None:
+                span = len(tokens)
+                span_content = False
+            else:
+                span_content = True
+            tokens.append((TEXT, '[', i))
+        else:
+            if span is None:
+                errors.append((i, "Unmatched ']'"))
+                tokens.append((TEXT, ']', i))
+                continue
+            following = template[i + 1:i + 2]
+            if reference or following in ('(', '[') or not span_content:
+                # Markdown link, reference link or nothing to calculate
+                tokens.append((TEXT, ']', i))
+                reference = following == '['
+            else:
+                tokens[span] = (CALC_START, None, tokens[span][2])
+                tokens.append((CALC_END, None, i))
+                reference = False
+            span = None
+
+    if text_start < len(template):
+        tokens.append((TEXT, template[text_start:], text_start))
+    for start, _, _, _ in braces:
+        errors.append((start, "Unclosed '{'"))
+    if span is not None:
+        errors.append((tokens[span][2], "Unclosed '['"))
+    errors.sort()
+    return _merge_text(tokens, template), errors
+
+def check_template(template):
+    """Describe the syntax errors of a template, e.g. ["Unclosed '{' at line 2, column 7"]"""
+    if not isinstance(template, str):
+        return []
+    messages = []
+    line, line_start, scanned = 1, 0, 0
+    for position, message in tokenize_template(template)[1]:
+        # Errors are sorted, so lines are counted in one forward walk
+        newline = template.find('\n', scanned, position)
+        while newline >= 0:
+            line, line_start = line + 1, newline + 1
+            newline = template.find('\n', line_start, position)
+        scanned = position
+        messages.append(f"{message} at line {line}, column {position - line_start + 1}")
+    return messages
@@ -0,0 +1,86 @@
+"""
+Epoch timestamps for persisted records.
+
+System logs and sent-notification records carry `ts`, an integer epoch
+timestamp in milliseconds, next to the `timestamp` display string (local
+time, DISPLAY_FORMAT). Records are appended in time order, so time-window
+queries binary search on ts instead of parsing every display string, and
+comparisons don't depend on the timezone the string was written in.
+
+Records written before ts existed get it from their display string, see
+add_epoch_ts.
+"""
+
+import time
+from datetime import datetime
+
+DISPLAY_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def now_ms():
+    """Current epoch time in milliseconds"""
+    return int(time.time() * 1000)
+
+def format_ts(ts):
+    """Display string (local time) for an epoch-ms timestamp"""
+    return datetime.fromtimestamp(ts / 1000).strftime(DISPLAY_FORMAT)
+
+def parse_display_time(timestamp):
+    """Epoch ms of a display string (or ISO timestamp) written in local time, None if unparsable"""
+    if not isinstance(timestamp, str) or not timestamp:
+        return None
+    try:
+        parsed = datetime.strptime(timestamp, DISPLAY_FORMAT)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    return int(parsed.timestamp() * 1000)
+
+def record_times(ts=None):
+    """The {'timestamp', 'ts'} fields of a record written now (or at epoch ms ts)"""
+    ts = now_ms() if ts is None else int(ts)
+    return {'timestamp': format_ts(ts), 'ts': ts}
+
+def record_ts(record):
+    """Epoch ms of a record, from its ts or else its display string; 0 if it has neither"""
+    ts = record.get('ts')
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        return int(ts)
+    return parse_display_time(record.get('timestamp')) or 0
+
+def add_epoch_ts(records):
+    """Give records without ts one, parsed from their display string. Returns how many changed."""
+    changed = 0
+    for record in records:
+        if isinstance(record, dict) and 'ts' not in record:
+            ts = parse_display_time(record.get('timestamp'))
+            if ts is not None:
+                record['ts'] = ts
+                changed += 1
+    return changed
+
+def with_epoch_ts(record):
+    """A record with ts added from its display string if it lacks one (the record itself otherwise)"""
+    if 'ts' in record:
+        return record
+    ts = parse_display_time(record.get('timestamp'))
+    return record if ts is None else dict(record, ts=ts)
+
+def index_since(records, since):
+    """Index of the first record at or after epoch ms since, in records sorted oldest first"""
+    # bisect only takes key= from Python 3.10 on
+    lo, hi = 0, len(records)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if record_ts(records[mid]) < since:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def records_since(records, since):
+    """The records of a list sorted oldest first that are at or after epoch ms since"""
+    if since is None:
+        return records
+    return records[index_since(records, since):]
@@ -1,50 +1,179 @@
 import json
+import os
 import re
+import threading
 import ast
 import operator
 from datetime import datetime
-from functions.config import get_logs, save_logs, get_config, save_config
+from functools import lru_cache
+from functions.config import (
+    get_logs, save_logs, append_log, queue_log, get_config, save_config,
+    is_sqlite_backend, get_db_path, NOTIFICATION_LOG_FILE
+)
+from functions.file_lock import file_lock
+from functions.timestamps import record_times, records_since, add_epoch_ts
+from functions.log_writer import AsyncLogWriter, batch_per_target
+from functions.log_search import SearchIndex
+from functions.live_tail import publish
+from functions.template_tokenizer import tokenize_template, TEXT, PLACEHOLDER, CALC_START
+from functions.data_paths import compile_path, resolve_path, get_path_value
+from functions.calculations import compile_calculation, parse_number, REF_PREFIX
+from functions.template_deps import TemplateDependencies, WHOLE_DATA
+from functions.log_levels import (
+    LogRateLimiter, normalize_level, level_enabled, summarize,
+    DEFAULT_LOG_LEVEL, LOG_RATE_LIMIT_WINDOW
+)
 
 def get_nested_value(data_dict, path):
     """Get a nested value from a dictionary using dot notation"""
     if not data_dict or not path:
         return None
-    
-    try:
-        keys = path.split('.')
-        current = data_dict
-        
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            elif isinstance(current, list) and key.isdigit():
-                index = int(key)
-                if 0 <= index < len(current):
-                    current = current[index]
-                else:
-                    return None
-            else:
-                return None
-        
-        return current
-    except Exception:
-        return None
+    return get_path_value(data_dict, path)
 
-def get_notification_logs():
-    """Get notification-specific logs"""
+def _read_notification_log_file(path):
     try:
-        with open('data/sent_notifications.json', 'r') as f:
-            return json.load(f)
+        with file_lock(path, exclusive=False):
+            with open(path, 'r') as f:
+                return json.load(f)
     except FileNotFoundError:
         return []
 
+def _write_notification_log_file(path, logs):
+    # Ensure data directory exists
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with file_lock(path):
+        with open(path, 'w') as f:
+            json.dump(logs, f, indent=2)
+
+def _append_notification_log_file(path, entries, retention):
+    # Held across the read and the write so concurrent workers don't drop entries
+    with file_lock(path):
+        logs = _read_notification_log_file(path)
+        logs.extend(entries)
+        if len(logs) > retention:
+            logs = logs[-retention:]
+        _write_notification_log_file(path, logs)
+
+_notification_log_writer = AsyncLogWriter(
+    'sent_notifications', batch_per_target('append_notification_logs', _append_notification_log_file))
+
+# Full-text index of the retained sent-notification records, per storage target
+_notification_indexes = {}
+_notification_indexes_lock = threading.Lock()
+
+def flush_notification_logs():
+    """Wait until every queued sent-notification record is written"""
+    _notification_log_writer.flush()
+
+def _notification_target():
+    """Where sent-notification records go, resolved when they are queued"""
+    if is_sqlite_backend():
+        return ('sqlite', get_db_path())
+    return ('json', NOTIFICATION_LOG_FILE)
+
+def _read_notification_logs(target, since=None):
+    backend, path = target
+    if backend == 'sqlite':
+        from functions import sqlite_store
+        return sqlite_store.get_notification_logs(path, since)
+    return records_since(_read_notification_log_file(path), since)
+
+def get_notification_logs(since=None):
+    """Get notification-specific logs oldest first, optionally from epoch ms since on"""
+    flush_notification_logs()
+    return _read_notification_logs(_notification_target(), since)
+
+def _notification_text(entry):
+    embed_info = entry.get('embed_info') or {}
+    parts = (entry.get('flow_name'), entry.get('message_content'), embed_info.get('title'),
+             embed_info.get('description'), entry.get('webhook_name'))
+    return ' '.join(str(part) for part in parts if part)
+
+def _notification_retention():
+    try:
+        return int(get_config().get('notification_log_retention', 500))
+    except Exception:
+        return 500
+
+def _get_notification_index(target=None, retention=None):
+    """Get the search index of the sent-notification records, building it from storage on first use"""
+    target = target or _notification_target()
+    retention = retention or _notification_retention()
+    with _notification_indexes_lock:
+        index = _notification_indexes.get(target)
+        if index is None:
+            # Records still queued for this target have to be on disk before it is read
+            flush_notification_logs()
+            index = _notification_indexes[target] = SearchIndex(
+                retention, _notification_text, _read_notification_logs(target))
+    if index.capacity != retention:
+        index.resize(retention)
+    return index
+
+def search_notification_logs(query, limit=50, flow=None, category=None, since=None, until=None):
+    """Get up to limit sent-notification records containing every word of query, newest first.
+
+    Optionally only records of one flow or category, or in a time range
+    (epoch ms, until exclusive).
+    """
+    def match(entry):
+        return ((not flow or entry.get('flow_name') == flow)
+                and (not category or entry.get('category') == category))
+    return _get_notification_index().search(query, limit, match if flow or category else None, since, until)
+
+def count_notification_logs(since=None):
+    """Count the retained sent-notification records, or those from epoch ms since on"""
+    return _get_notification_index().count(since)
+
+def notification_logs_truncated(since=None):
+    """Whether notification_log_retention dropped records older than the retained ones (from epoch ms since on)"""
+    return _get_notification_index().truncated(since)
+
+def migrate_notification_log_timestamps():
+    """Give JSON sent-notification records written before epoch timestamps a ts.
+
+    Returns how many changed. SQLite rows get theirs when the schema is upgraded.
+    """
+    if is_sqlite_backend() or not os.path.exists(NOTIFICATION_LOG_FILE):
+        return 0
+    with file_lock(NOTIFICATION_LOG_FILE):
+        logs = _read_notification_log_file(NOTIFICATION_LOG_FILE)
+        changed = add_epoch_ts(logs) if isinstance(logs, list) else 0
+        if changed:
+            _write_notification_log_file(NOTIFICATION_LOG_FILE, logs)
+    return changed
+
 def save_notification_logs(logs):
     """Save notification-specific logs"""
-    import os
-    # Ensure data directory exists
-    os.makedirs('data', exist_ok=True)
-    with open('data/sent_notifications.json', 'w') as f:
-        json.dump(logs, f, indent=2)
+    flush_notification_logs()
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        sqlite_store.replace_notification_logs(get_db_path(), logs)
+    else:
+        _write_notification_log_file(NOTIFICATION_LOG_FILE, logs)
+    index = _notification_indexes.get(_notification_target())
+    if index is not None:
+        index.replace(logs)
+
+def append_notification_log(notification_entry, retention):
+    """Append a single sent-notification record, keeping only the last `retention`"""
+    # Built before the write so the record isn't read back from storage as well
+    index = _get_notification_index(retention=retention)
+    if is_sqlite_backend():
+        from functions import sqlite_store
+        sqlite_store.append_notification_log(get_db_path(), notification_entry, retention)
+    else:
+        _append_notification_log_file(NOTIFICATION_LOG_FILE, [notification_entry], retention)
+    index.add(notification_entry)
+    publish('notification', notification_entry)
+
+def queue_notification_log(notification_entry, retention):
+    """Hand a sent-notification record to the background writer without waiting for disk"""
+    target = _notification_target()
+    # Searchable right away, before it reaches the disk
+    _get_notification_index(target, retention).add(notification_entry)
+    publish('notification', notification_entry)
+    _notification_log_writer.submit((target, notification_entry, retention))
 
 def detect_log_category(message):
     """Auto-detect log category based on message content"""
@@ -107,9 +236,8 @@ def log_notification_sent(flow_name, message_content, embed_info=None, webhook_n
     if not has_message and not has_embed:
         return
         
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     notification_entry = {
-        'timestamp': timestamp,
+        **record_times(),
         'flow_name': flow_name,
         'message_content': str(message_content).strip() if has_message else '',
         'embed_info': embed_info if has_embed else None,
@@ -118,57 +246,442 @@ def log_notification_sent(flow_name, message_content, embed_info=None, webhook_n
         'category': 'Notifications'
     }
     
-    # Get existing notification logs
-    logs = get_notification_logs()
-    
-    # Add new notification entry
-    logs.append(notification_entry)
-    
     # Get configurable log retention limit
     config = get_config()
     notification_log_retention = config.get('notification_log_retention', 500)  # Default to 500
     
-    # Keep only the last N notification logs
-    if len(logs) > notification_log_retention:
-        logs = logs[-notification_log_retention:]
-    
-    # Save notification logs
-    save_notification_logs(logs)
+    # Written in the background, keeping only the last N notification logs
+    queue_notification_log(notification_entry, notification_log_retention)
 
-def log_notification(message, category=None):
-    """Log a notification message with timestamp and category"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Auto-detect category based on message content if not provided
-    if category is None:
-        category = detect_log_category(message)
-    
+def detect_log_level(message, category=None):
+    """Auto-detect log level based on message content and category"""
+    message_lower = message.lower()
+    if category == 'Errors' or '❌' in message:
+        return 'error'
+    if '⚠️' in message or 'warning' in message_lower:
+        return 'warn'
+    return 'info'
+
+# Repeats of keyed messages, summarized once per log_rate_limit_window
+_log_rate_limiter = LogRateLimiter()
+
+def _store_log(message, category, level, config):
     log_entry = {
-        'timestamp': timestamp,
+        **record_times(),
         'message': message,
-        'category': category
+        'category': category,
+        'level': level
     }
     
-    # Get existing logs
-    logs = get_logs()
-    
-    # Add new log entry
-    logs.append(log_entry)
-    
     # Get configurable log retention limit
-    config = get_config()
     log_retention = config.get('log_retention', 1000)  # Default to 1000
     
-    # Keep only the last N logs to prevent file from growing too large
-    if len(logs) > log_retention:
-        logs = logs[-log_retention:]
+    # Written in the background, keeping only the last N logs to prevent storage from growing too large
+    queue_log(log_entry, log_retention)
+
+def _log_summary(window, config):
+    """Store the summary of a closed rate-limit window, if it hid anything"""
+    minimum = config.get('log_level', DEFAULT_LOG_LEVEL)
+    # A lone occurrence was already logged unless its level is filtered out
+    if window['count'] == 1 and level_enabled(window['level'], minimum):
+        return
+    # Summaries of debug messages are still worth keeping at info
+    level = window['level'] if level_enabled(window['level'], 'info') else 'info'
+    if not level_enabled(level, minimum):
+        return
+    _log_rate_limiter.record('summaries')
+    _store_log(summarize(window), window['category'], level, config)
+
+def log_notification(message, category=None, level=None, key=None, flow=None):
+    """Log a notification message with timestamp, category and level
+
+    Messages below the configured log_level are dropped. Messages with a key
+    are rate limited per (key, flow): the first one per log_rate_limit_window
+    is logged and the repeats are summarized when the window is over.
+    """
+    # Auto-detect category and level based on message content if not provided
+    if category is None:
+        category = detect_log_category(message)
+    level = normalize_level(level) if level else detect_log_level(message, category)
     
-    # Save logs
-    save_logs(logs)
+    config = get_config()
+    if key is not None:
+        window = config.get('log_rate_limit_window', LOG_RATE_LIMIT_WINDOW)
+        if window and window > 0:
+            first, closed = _log_rate_limiter.hit(key, flow, window, category, level)
+            if closed is not None:
+                _log_summary(closed, config)
+            if not first:
+                return
+    
+    if not level_enabled(level, config.get('log_level', DEFAULT_LOG_LEVEL)):
+        _log_rate_limiter.record('filtered')
+        return
+    _store_log(message, category, level, config)
+
+def flush_log_summaries(now=None):
+    """Log the summaries of rate-limit windows that are over (called every poller cycle)"""
+    closed = _log_rate_limiter.expired(now)
+    if closed:
+        config = get_config()
+        for window in closed:
+            _log_summary(window, config)
+
+def get_log_filter_stats():
+    """Get counts of log lines dropped by level, suppressed as repeats and summarized"""
+    return _log_rate_limiter.get_stats()
+
+def template_uses_data(template):
+    """Check whether a message template may read from the data payload.
+
+    Errs on the side of True; only {time} and user variables are known not
+    to need the data.
+    """
+    if not isinstance(template, str):
+        return True
+    for kind, arg in compile_message_template(template, True):
+        if kind == _USER_VAR:
+            if any(char in arg[1] for char in '{}[]'):
+                return True
+        elif kind not in (_LITERAL, _TIME):
+            return True
+    return False
+
+def _calc_ref_dependencies(var_name, paths, variables, flags):
+    """What a {variable} reference inside {calc:...} reads (see _TemplateRender._calc_ref_text)"""
+    if var_name == 'time':
+        flags['volatile'] = True
+    elif var_name.startswith("data['") and var_name.endswith("']"):
+        paths.add(compile_path(var_name[6:-3].replace("']['", ".")))
+    else:
+        paths.add(((var_name, None),))
+        variables.add(var_name[4:] if var_name.startswith('var:') else var_name)
+
+def _collect_dependencies(ops, paths, variables, flags):
+    for kind, arg in ops:
+        if kind in _KEY_FIRST_OPS and arg[0] is not None:
+            paths.add(((arg[0], None),))
+        if kind == _TIME:
+            flags['volatile'] = True
+        elif kind == _DATA:
+            flags['whole_data'] = True
+        elif kind == _PATH:
+            paths.add(arg)
+        elif kind == _GIGABYTES:
+            paths.add(arg[0])
+        elif kind == _USER_VAR:
+            variables.add(arg[1])
+        elif kind == _FIELD:
+            paths.add(arg[1])
+        elif kind == _CALC:
+            # Names in the expression, and values inserted into it, are looked up at render time
+            flags['calc_scope'] = True
+            _collect_dependencies(arg[1], paths, variables, flags)
+            for ref in arg[3]:
+                if isinstance(ref, str):
+                    _calc_ref_dependencies(ref, paths, variables, flags)
+        elif kind == _IMAGE:
+            _collect_dependencies(arg, paths, variables, flags)
+
+@lru_cache(maxsize=512)
+def _template_dependencies(template):
+    paths, variables, flags = set(), set(), {}
+    _collect_dependencies(compile_message_template(template, True), paths, variables, flags)
+    return TemplateDependencies(paths, variables, **flags)
+
+def template_dependencies(template):
+    """The data paths, user variables and clock reads a message template's output depends on.
+
+    Image URLs count, as for rendering with extract_images. Anything that is
+    not a template string may read the whole data.
+    """
+    if not isinstance(template, str):
+        return WHOLE_DATA
+    return _template_dependencies(template)
+
+# {variable} references inside a calculation
+_CALC_VAR_RE = re.compile(r'\{([^}]+)\}')
+
+# Ops of a compiled message template
+(_LITERAL, _TIME, _DATA, _PATH, _GIGABYTES, _USER_VAR, _CALC, _FIELD, _IMAGE) = range(9)
+
+# Ops that are looked up as a plain data key first if the data has one by that name
+_KEY_FIRST_OPS = (_USER_VAR, _CALC, _FIELD)
+
+_MISSING = object()
+
+def _time_text():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _field_text(value):
+    # Dictionaries are shown as JSON
+    return json.dumps(value, indent=2) if isinstance(value, dict) else str(value)
+
+def _calc_number(value):
+    """A numeric string as int or float for calculations, anything else unchanged"""
+    if isinstance(value, str) and value.replace('.', '').replace('-', '').isdigit():
+        try:
+            return float(value) if '.' in value else int(value)
+        except ValueError:
+            return value
+    return value
+
+def _compile_placeholder(var_expr, raw, extract_images):
+    """The op for the content of one {placeholder}"""
+    if var_expr.startswith('img:'):
+        if extract_images:
+            # The URL goes through the same variable substitution
+            return (_IMAGE, compile_message_template(var_expr[4:]))
+        # Left unchanged when not extracting images
+        return (_LITERAL, raw)
+    if var_expr == 'time':
+        return (_TIME, None)
+    if var_expr == 'data':
+        return (_DATA, None)
+    # {data['key']['subkey']}
+    if var_expr.startswith("data['") and var_expr.endswith("']"):
+        return (_PATH, compile_path(var_expr[6:-3].replace("']['", ".")))
+    # {key['subkey']} or {key['0']}
+    if var_expr.endswith("']") and "['" in var_expr:
+        return (_PATH, compile_path(var_expr))
+    # {data['key']/1024/1024/1024:.2f} for file sizes
+    if var_expr.startswith("data['") and "/1024/1024/1024" in var_expr:
+        parts = var_expr.split("/1024/1024/1024")
+        if len(parts) == 2:
+            return (_GIGABYTES, (compile_path(parts[0][6:-3].replace("']['", ".")), ":.2f" in parts[1]))
+    # {$variable} or {var:variable}
+    if var_expr.startswith('$') or var_expr.startswith('var:'):
+        return (_USER_VAR, (var_expr, var_expr[1:] if var_expr.startswith('$') else var_expr[4:]))
+    # {calc:expression}, up to the first ]
+    if var_expr.startswith('calc:'):
+        return _compile_calc_expression(var_expr, var_expr[5:].split(']', 1)[0])
+    # {key} or {key.subkey}
+    return (_FIELD, (var_expr, compile_path(var_expr)))
+
+def _calc_op(key, parts, source, refs, two_decimals):
+    """The op of a calculation: its parts, compiled expression (None to always go the text way) and references"""
+    compiled = None
+    if parts and REF_PREFIX not in ''.join(arg for kind, arg in parts if kind == _LITERAL):
+        compiled = compile_calculation(source)
+    return (_CALC, (key, parts, compiled, refs, two_decimals))
+
+def _compile_calc_expression(key, calc_expr):
+    """The op of {calc:expression}; its {variable} references become compiled names"""
+    refs = []
+    def reference(match):
+        refs.append(match.group(1))
+        return f" {REF_PREFIX}{len(refs) - 1} "
+    source = _CALC_VAR_RE.sub(reference, calc_expr)
+    parts = ((_LITERAL, calc_expr),) if calc_expr else ()
+    # Prices are shown with 2 decimals when multiplied
+    two_decimals = '*' in source and ('price' in calc_expr or 'cost' in calc_expr)
+    if '{' in source or '}' in source:
+        source = ''
+    return _calc_op(key, parts, source, tuple(refs), two_decimals)
+
+def _compile_calc_span(parts):
+    """The op of a [calculation] span; the values of its placeholders become compiled names"""
+    source = []
+    refs = []
+    for index, (kind, arg) in enumerate(parts):
+        if kind == _LITERAL:
+            source.append(arg)
+        else:
+            source.append(f" {REF_PREFIX}{len(refs)} ")
+            refs.append(index)
+    text = ''.join(arg for kind, arg in parts if kind == _LITERAL)
+    two_decimals = '*' in text and ('price' in text or 'cost' in text)
+    return _calc_op(None, parts, '' if '{' in text else ''.join(source), tuple(refs), two_decimals)
+
+def _format_calc_result(result, two_decimals):
+    if isinstance(result, float):
+        # Always show 2 decimal places for multiplication results involving prices
+        if two_decimals:
+            return f"{result:.2f}"
+        elif result == int(result):
+            return str(int(result))
+        else:
+            return f"{result:.2f}"
+    return str(result)
+
+def _merge_literals(ops):
+    merged = []
+    for op in ops:
+        if op[0] == _LITERAL and merged and merged[-1][0] == _LITERAL:
+            merged[-1] = (_LITERAL, merged[-1][1] + op[1])
+        elif op[0] != _LITERAL or op[1]:
+            merged.append(op)
+    return tuple(merged)
+
+@lru_cache(maxsize=512)
+def compile_message_template(template, extract_images=False):
+    """Parse a message template once into a tuple of render ops; the ops are shared, so never modify them
+
+    See functions.template_tokenizer for the syntax; unbalanced braces and
+    brackets are rendered as text.
+    """
+    ops = []
+    calculation = None  # ops of the [calculation] being read
+    for kind, value, _ in tokenize_template(template)[0]:
+        target = ops if calculation is None else calculation
+        if kind == TEXT:
+            target.append((_LITERAL, value))
+        elif kind == PLACEHOLDER:
+            target.append(_compile_placeholder(value, '{' + value + '}', extract_images))
+        elif kind == CALC_START:
+            calculation = []
+        else:
+            ops.append(_compile_calc_span(_merge_literals(calculation)))
+            calculation = None
+    return _merge_literals(ops)
+
+class _TemplateRender:
+    """One render of compiled template ops against a data payload and user variables"""
+
+    def __init__(self, data, user_variables):
+        self.data = data
+        self.user_variables = user_variables
+        self.image_urls = []
+        # Calculation variables looked up so far
+        self._calc_values = {}
+
+    def render(self, ops):
+        return ''.join(self._render_parts(ops))
+
+    def _render_parts(self, ops):
+        parts = []
+        for kind, arg in ops:
+            if kind == _LITERAL:
+                parts.append(arg)
+                continue
+            try:
+                parts.append(self._render_op(kind, arg))
+            except Exception as e:
+                log_notification(f"Template formatting error: {str(e)}")
+                parts.append("ERROR")
+        return parts
+
+    def _render_op(self, kind, arg):
+        data = self.data
+        if kind in _KEY_FIRST_OPS and arg[0] in data:
+            return _field_text(data[arg[0]])
+        if kind == _FIELD:
+            value = resolve_path(data, arg[1])
+            return str(value) if value is not None else "N/A"
+        if kind == _PATH:
+            value = resolve_path(data, arg)
+            return str(value) if value is not None else "N/A"
+        if kind == _USER_VAR:
+            if arg[1] in self.user_variables:
+                return str(self.user_variables[arg[1]])
+            return "N/A"
+        if kind == _CALC:
+            _, parts, compiled, refs, two_decimals = arg
+            texts = self._render_parts(parts)
+            if compiled is not None:
+                result = self._calculate_compiled(compiled, refs, texts, two_decimals)
+                if result is not None:
+                    return result
+            return self.calculate(''.join(texts))
+        if kind == _TIME:
+            return _time_text()
+        if kind == _DATA:
+            return json.dumps(data, indent=2)
+        if kind == _GIGABYTES:
+            keys, two_decimals = arg
+            value = resolve_path(data, keys)
+            if value is None or not isinstance(value, (int, float)):
+                return "N/A"
+            result = value / 1024 / 1024 / 1024
+            return f"{result:.2f}" if two_decimals else str(result)
+        if kind == _IMAGE:
+            url = self.render(arg)
+            if url and url != "N/A" and url != "ERROR":
+                self.image_urls.append(url)
+            return ''
+        raise ValueError(f"Unknown template op: {kind}")
+
+    def _calc_variable(self, name):
+        """A data value or user variable for calculations, numeric strings as numbers; _MISSING if none"""
+        value = self._calc_values.get(name, _MISSING)
+        if value is _MISSING and name not in self._calc_values:
+            # User variables win over data values of the same name
+            for source in (self.user_variables, self.data):
+                candidate = source.get(name, _MISSING)
+                if isinstance(candidate, (int, float, str)):
+                    value = _calc_number(candidate)
+                    break
+            self._calc_values[name] = value
+        return value
+
+    def _calc_lookup(self, name):
+        value = self._calc_variable(name)
+        if value is _MISSING:
+            raise ValueError(f"Unknown variable: {name}")
+        return value
+
+    def _calc_ref_text(self, var_name):
+        """Text of a {variable} reference inside a calculation"""
+        data = self.data
+        
+        if var_name == 'time':
+            return _time_text()
+        
+        # data['key']['subkey']
+        if var_name.startswith("data['") and var_name.endswith("']"):
+            value = get_nested_value(data, var_name[6:-3].replace("']['", "."))
+            if value is not None and isinstance(value, (int, float)):
+                return str(value)
+            return "0"  # Default for calculations
+        
+        if var_name in data and isinstance(data[var_name], (int, float)):
+            return str(data[var_name])
+        
+        # {var:name}; non-numeric values count as 0
+        if var_name.startswith('var:') and var_name[4:] in self.user_variables:
+            value = _calc_number(self.user_variables[var_name[4:]])
+            return str(value) if isinstance(value, (int, float)) else '0'
+        
+        value = self._calc_variable(var_name)
+        if value is not _MISSING:
+            return str(value)
+        
+        # A placeholder that will cause an error in AST evaluation
+        return f"UNKNOWN_VAR_{var_name}"
+
+    def _calculate_compiled(self, compiled, refs, texts, two_decimals):
+        """Evaluate a compiled calculation, or None when only the text way gives the right result"""
+        def lookup(name):
+            if name.startswith(REF_PREFIX):
+                ref = refs[int(name[len(REF_PREFIX):])]
+                return parse_number(texts[ref] if isinstance(ref, int) else self._calc_ref_text(ref))
+            return self._calc_lookup(name)
+        try:
+            return _format_calc_result(compiled(lookup), two_decimals)
+        except Exception:
+            # Errors and values that aren't plain numbers go the text way, which also reports errors
+            return None
+
+    def calculate(self, calc_expr):
+        """Compute a calculation expression from its text and format the result"""
+        try:
+            if not calc_expr:
+                raise ValueError("Empty calculation")
+            calc_expr_processed = (_CALC_VAR_RE.sub(lambda match: self._calc_ref_text(match.group(1)), calc_expr)
+                                   if '{' in calc_expr else calc_expr)
+            result = _evaluate_calculation(calc_expr_processed, self._calc_lookup)
+            two_decimals = '*' in calc_expr_processed and ('price' in calc_expr or 'cost' in calc_expr)
+            return _format_calc_result(result, two_decimals)
+        except Exception as e:
+            log_notification(f"Calculation replacement error: {str(e)}")
+            return "CALC_ERROR"
 
 def format_message_template(template, data, user_variables=None, extract_images=False):
     """Simple and reliable message template formatter with user variable support and calculations
     
+    The template is compiled once (see compile_message_template) and then
+    rendered op by op.
+    
     Args:
         template: The template string to process
         data: Data dictionary for variable substitution
@@ -179,300 +692,39 @@ def format_message_template(template, data, user_variables=None, extract_images=
         If extract_images=False: formatted text string
         If extract_images=True: (formatted_text, list_of_image_urls) tuple
     """
-    user_variables = user_variables or {}
-    
-    # Extract and collect image URLs from {img:url} patterns
-    image_urls = []
-    if extract_images:
-        # More sophisticated pattern to handle nested braces
-        img_pattern = r'\{img:([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}'
-        img_matches = re.findall(img_pattern, template)
-        
-        for img_url in img_matches:
-            # Process the URL through the same variable substitution system
-            processed_url = format_message_template(img_url, data, user_variables, extract_images=False)
-            if processed_url and processed_url != "N/A" and processed_url != "ERROR":
-                image_urls.append(processed_url)
-        
-        # Remove image patterns from template for text processing
-        template = re.sub(img_pattern, '', template)
-    
-    def replace_template_var(match):
-        """Replace template variables with actual values"""
-        try:
-            var_expr = match.group(1)  # Get the content inside {}
-            
-            # Handle {img:url} patterns - leave them unchanged when not extracting images
-            if var_expr.startswith('img:') and not extract_images:
-                return match.group(0)  # Return the whole match unchanged
-            
-            # Handle {time} variable
-            if var_expr == 'time':
-                return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Handle {data} variable (full data object)
-            if var_expr == 'data':
-                return json.dumps(data, indent=2)
-            
-            # Handle {data['key']['subkey']} pattern
-            if var_expr.startswith("data['") and var_expr.endswith("']"):
-                # Extract the path: data['result']['downloaded_issues'] -> result.downloaded_issues
-                path = var_expr[6:-3]  # Remove data[' and ']
-                path = path.replace("']['", ".")  # Convert to dot notation
-                
-                value = get_nested_value(data, path)
-                if value is not None:
-                    return str(value)
-                else:
-                    return "N/A"
-            
-            # Handle {key['subkey']} or {key['0']} pattern (for direct access to nested data or arrays)
-            if var_expr.endswith("']") and "['" in var_expr:
-                # Convert e.g. result['0'] or result['downloaded_issues'] to result.0 or result.downloaded_issues
-                path = var_expr.replace("['", ".").replace("']", "")
-                value = get_nested_value(data, path)
-                if value is not None:
-                    return str(value)
-                else:
-                    return "N/A"
-            
-            # Handle {data['key']['subkey']/1024/1024/1024:.2f} pattern (for file sizes)
-            if var_expr.startswith("data['") and "/1024/1024/1024" in var_expr:
-                # Extract the path and formatting
-                parts = var_expr.split("/1024/1024/1024")
-                if len(parts) == 2:
-                    path_part = parts[0]
-                    format_part = parts[1]
-                    
-                    # Extract path
-                    path = path_part[6:-3]  # Remove data[' and ']
-                    path = path.replace("']['", ".")
-                    
-                    value = get_nested_value(data, path)
-                    if value is not None and isinstance(value, (int, float)):
-                        # Apply the division and formatting
-                        result = value / 1024 / 1024 / 1024
-                        if ":.2f" in format_part:
-                            return f"{result:.2f}"
-                        return str(result)
-                    else:
-                        return "N/A"
-            
-            # Handle simple {variable} patterns
-            if var_expr in data:
-                # If it's a dictionary, convert to JSON string for display
-                if isinstance(data[var_expr], dict):
-                    return json.dumps(data[var_expr], indent=2)
-                return str(data[var_expr])
-            
-            # Handle user variables: {$variable} or {var:variable} formats
-            if var_expr.startswith('$') or var_expr.startswith('var:'):
-                var_name = var_expr[1:] if var_expr.startswith('$') else var_expr[4:]
-                if var_name in user_variables:
-                    return str(user_variables[var_name])
-                return 'N/A'
-            
-            # Handle calculations: {calc:expression} format
-            if var_expr.startswith('calc:'):
-                calc_expr = var_expr[5:]
-                # Use the existing calculation logic
-                return replace_calculation(re.match(r'\[([^\]]+)\]', f"[{calc_expr}]"))
-            
-            # Handle bracket notation: {key['subkey']} format
-            if var_expr.endswith("']") and "['" in var_expr:
-                # Convert bracket notation to dot notation
-                path = var_expr.replace("['", ".").replace("']", "")
-                value = get_nested_value(data, path)
-                if value is not None:
-                    return str(value)
-                return "N/A"
-            
-            # Try to get nested value using dot notation
-            value = get_nested_value(data, var_expr)
-            if value is not None:
-                return str(value)
-            
-            # Try direct access in data
-            if var_expr in data:
-                return str(data[var_expr])
-            
-            return "N/A"
-            
-        except Exception as e:
-            log_notification(f"Template formatting error: {str(e)}")
-            return "ERROR"
-    
-    def replace_calculation(match):
-        """Replace calculation expressions with computed values"""
-        try:
-            calc_expr = match.group(1)  # Get the content inside {{}}
-            
-            # Build variables dictionary for calculation
-            calc_variables = {}
-            
-            # Add simple data variables
-            for key, value in data.items():
-                if isinstance(value, (int, float, str)):
-                    # Try to convert strings to numbers if possible
-                    if isinstance(value, str) and value.replace('.', '').replace('-', '').isdigit():
-                        try:
-                            calc_variables[key] = float(value) if '.' in value else int(value)
-                        except ValueError:
-                            calc_variables[key] = value
-                    else:
-                        calc_variables[key] = value
-            
-            # Add user variables
-            for key, value in user_variables.items():
-                if isinstance(value, (int, float, str)):
-                    if isinstance(value, str) and value.replace('.', '').replace('-', '').isdigit():
-                        try:
-                            calc_variables[key] = float(value) if '.' in value else int(value)
-                        except ValueError:
-                            calc_variables[key] = value
-                    else:
-                        calc_variables[key] = value
-            
-            # Handle nested data access in calculations by replacing {var} patterns
-            # Replace {variable} references with actual values before calculation
-            def replace_var_in_calc(var_match):
-                var_name = var_match.group(1)
-                
-                # Handle time variable
-                if var_name == 'time':
-                    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Handle data['key']['subkey'] pattern
-                if var_name.startswith("data['") and var_name.endswith("']"):
-                    path = var_name[6:-3]  # Remove data[' and ']
-                    path = path.replace("']['", ".")  # Convert to dot notation
-                    value = get_nested_value(data, path)
-                    if value is not None and isinstance(value, (int, float)):
-                        return str(value)
-                    return "0"  # Default for calculations
-                
-                # Handle simple variables
-                if var_name in data and isinstance(data[var_name], (int, float)):
-                    return str(data[var_name])
-                
-                # Handle user variables: {var:name} inside calculations
-                if var_name.startswith('var:'):
-                    user_var = var_name[4:]
-                    if user_var in user_variables:
-                        val = user_variables[user_var]
-                        # Convert numeric strings to numbers
-                        if isinstance(val, (int, float)):
-                            return str(val)
-                        if isinstance(val, str) and val.replace('.', '').replace('-', '').isdigit():
-                            try:
-                                return str(float(val) if '.' in val else int(val))
-                            except ValueError:
-                                return '0'
-                        # Non-numeric value defaults to 0 for calculations
-                        return '0'
-                
-                # Try direct lookup in calc_variables
-                if var_name in calc_variables:
-                    return str(calc_variables[var_name])
-                
-                # Return a placeholder that will cause an error in AST evaluation
-                return f"UNKNOWN_VAR_{var_name}"
-            
-            # Replace {variable} patterns in the calculation expression
-            calc_expr_processed = re.sub(r'\{([^}]+)\}', replace_var_in_calc, calc_expr)
-            
-            # Evaluate the processed expression
-            result = safe_eval_calculation(calc_expr_processed, calc_variables)
-            
-            # Format the result nicely
-            if isinstance(result, float):
-                # Always show 2 decimal places for multiplication results involving prices
-                if calc_expr_processed.count('*') > 0 and any(var in calc_expr for var in ['price', 'cost']):
-                    return f"{result:.2f}"
-                # Round to 2 decimal places if it's a float
-                elif result == int(result):
-                    return str(int(result))
-                else:
-                    return f"{result:.2f}"
-            else:
-                return str(result)
-                
-        except Exception as e:
-            log_notification(f"Calculation replacement error: {str(e)}")
-            return f"CALC_ERROR"
-    
-    # First replace all {variable} patterns with proper nested brace handling
-    # This pattern matches braces that can contain other braces (like {img:{nested}})
-    pattern = r'\{([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}'
-    result = re.sub(pattern, replace_template_var, template)
-    
-    # Then replace all standalone [calculation] patterns (not inside variables)
-    calc_pattern = r'\[([^\]]+)\]'
-    result = re.sub(calc_pattern, replace_calculation, result)
+    render = _TemplateRender(data, user_variables or {})
+    result = render.render(compile_message_template(template, extract_images))
     
     # Return appropriate format based on extract_images flag
     if extract_images:
-        return result, image_urls
+        return result, render.image_urls
     else:
         return result
 
-def safe_eval_calculation(expression, variables):
-    """Safely evaluate mathematical expressions using AST"""
+def _evaluate_calculation(expression, lookup):
+    """Evaluate an expression with compiled variable lookups; errors give CALC_ERROR(expression)"""
     try:
-        # Supported operations
-        ops = {
-            ast.Add: operator.add,
-            ast.Sub: operator.sub,
-            ast.Mult: operator.mul,
-            ast.Div: operator.truediv,
-            ast.FloorDiv: operator.floordiv,
-            ast.Mod: operator.mod,
-            ast.Pow: operator.pow,
-            ast.USub: operator.neg,
-            ast.UAdd: operator.pos,
-        }
-        
-        def eval_node(node):
-            if isinstance(node, ast.Constant):  # Python 3.8+
-                return node.value
-            elif isinstance(node, ast.Num):  # For older Python versions
-                return node.n
-            elif isinstance(node, ast.Str):  # For older Python versions
-                return node.s
-            elif isinstance(node, ast.Name):
-                # Variable lookup
-                var_name = node.id
-                if var_name in variables:
-                    return variables[var_name]
-                else:
-                    raise ValueError(f"Unknown variable: {var_name}")
-            elif isinstance(node, ast.BinOp):
-                left = eval_node(node.left)
-                right = eval_node(node.right)
-                op = ops.get(type(node.op))
-                if op:
-                    return op(left, right)
-                else:
-                    raise ValueError(f"Unsupported operation: {type(node.op)}")
-            elif isinstance(node, ast.UnaryOp):
-                operand = eval_node(node.operand)
-                op = ops.get(type(node.op))
-                if op:
-                    return op(operand)
-                else:
-                    raise ValueError(f"Unsupported unary operation: {type(node.op)}")
-            else:
-                raise ValueError(f"Unsupported node type: {type(node)}")
-        
-        # Parse the expression
-        tree = ast.parse(expression, mode='eval')
-        result = eval_node(tree.body)
-        return result
-        
+        compiled = compile_calculation(expression)
+        if compiled is None:
+            raise ValueError("Invalid or unsupported expression")
+        return compiled(lookup)
     except Exception as e:
         log_notification(f"Calculation error in '{expression}': {str(e)}")
         return f"CALC_ERROR({expression})"
 
+def safe_eval_calculation(expression, variables):
+    """Safely evaluate mathematical expressions using AST"""
+    def lookup(name):
+        if name in variables:
+            return variables[name]
+        raise ValueError(f"Unknown variable: {name}")
+    return _evaluate_calculation(expression, lookup)
+
+@lru_cache(maxsize=256)
+def parse_condition(condition):
+    """Parse a condition expression once; the AST is shared, so never modify it"""
+    return ast.parse(condition, mode='eval')
+
 def evaluate_condition(condition, data):
     """Safely evaluate a condition expression using AST instead of eval()"""
     if not condition or not condition.strip():
@@ -627,11 +879,12 @@ def evaluate_condition(condition, data):
         
         # Parse and evaluate the condition safely
         try:
-            parsed = ast.parse(condition_processed, mode='eval')
+            parsed = parse_condition(condition_processed)
             result = safe_eval_node(parsed.body)
             
             # Log the evaluation result
-            log_notification(f"Condition evaluation: '{condition}' -> {result}")
+            log_notification(f"Condition evaluation: '{condition}' -> {result}",
+                             level='debug', key=f"Condition evaluation: '{condition}' -> {result}")
             
             return bool(result)
         except SyntaxError as e:
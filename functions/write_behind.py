@@ -0,0 +1,131 @@
+"""
+Write-behind buffering for data files.
+
+Instead of writing on every change, callers mark a key dirty with its latest
+value. A background timer flushes dirty keys one interval after the first
+change, so a burst of updates to the same key costs a single write.
+A value whose write fails stays pending and is retried on the next flush.
+Everything still pending is flushed on shutdown.
+"""
+
+import atexit
+import threading
+
+# All buffers, so they can be flushed together on shutdown
+_registry = []
+_registry_lock = threading.Lock()
+
+class WriteBehind:
+    """Coalesce repeated writes of the same key into one write per interval"""
+
+    def __init__(self, name, write_fn, interval_fn):
+        """
+        Args:
+            name: Label used in stats
+            write_fn: Called as write_fn(key, value) to persist one key
+            interval_fn: Returns the flush interval in seconds; <= 0 writes through
+        """
+        self.name = name
+        self.write_fn = write_fn
+        self.interval_fn = interval_fn
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._timer = None
+        self.stats = {'marked': 0, 'writes': 0, 'coalesced': 0, 'flushes': 0, 'errors': 0}
+        with _registry_lock:
+            _registry.append(self)
+
+    def mark_dirty(self, key, value):
+        """Record the latest value for key; it is written on the next flush"""
+        try:
+            interval = float(self.interval_fn())
+        except Exception:
+            interval = 0
+        with self._lock:
+            self.stats['marked'] += 1
+            if interval <= 0:
+                # Write-through mode
+                self._pending.pop(key, None)
+                self._write(key, value)
+                return
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[key] = value
+            # Flush one interval after the first change of a burst
+            self._schedule(interval)
+
+    def _schedule(self, interval):
+        """Start the flush timer unless one is running (call with self._lock held)"""
+        if self._timer is None and interval > 0:
+            self._timer = threading.Timer(interval, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def get_pending(self, key, default=None):
+        """Get the not-yet-written value for key"""
+        with self._lock:
+            return self._pending.get(key, default)
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def discard(self, key):
+        """Drop a pending write without persisting it"""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def flush(self, key=None):
+        """Write pending values now (all keys, or just one)"""
+        with self._lock:
+            if key is not None:
+                if key in self._pending:
+                    self._write(key, self._pending.pop(key))
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+            for pending_key, value in pending.items():
+                self._write(pending_key, value)
+            self.stats['flushes'] += 1
+            if self._pending:
+                # Retry failed writes one interval later
+                try:
+                    self._schedule(float(self.interval_fn()))
+                except Exception:
+                    pass
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def _write(self, key, value):
+        try:
+            self.write_fn(key, value)
+            self.stats['writes'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Write-behind flush of {self.name} '{key}' failed: {e}")
+            # Keep the value for the next flush unless a newer one was marked meanwhile
+            self._pending.setdefault(key, value)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, pending=len(self._pending))
+
+def flush_all():
+    """Flush every write-behind buffer (called on shutdown)"""
+    with _registry_lock:
+        buffers = list(_registry)
+    for buffer in buffers:
+        buffer.flush()
+
+def get_write_behind_stats():
+    """Get stats for every write-behind buffer, keyed by name"""
+    with _registry_lock:
+        buffers = list(_registry)
+    return {buffer.name: buffer.get_stats() for buffer in buffers}
+
+atexit.register(flush_all)
@@ -63,7 +63,29 @@ class ComprehensiveTestRunner:
             'test_notifications',
             'test_embed_utils',
             'test_flow_stats',
-            'test_flow_templates'
+            'test_flow_templates',
+            'test_sqlite_store',
+            'test_flow_state',
+            'test_write_behind',
+            'test_counters',
+            'test_journal',
+            'test_blob_store',
+            'test_flow_spec',
+            'test_file_lock',
+            'test_log_segments',
+            'test_log_writer',
+            'test_log_buffer',
+            'test_log_levels',
+            'test_events',
+            'test_flow_aggregates',
+            'test_rollups',
+            'test_timestamps',
+            'test_log_search',
+            'test_live_tail',
+            'test_template_tokenizer',
+            'test_data_paths',
+            'test_calculations',
+            'test_template_deps'
         ]
         self.results = {}
         self.total_start_time = None
@@ -0,0 +1,99 @@
+"""
+Comprehensive tests for functions/blob_store.py module.
+Tests the content-addressed payload store.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+import time
+import zlib
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.blob_store import put_blob, get_blob, remove_unreferenced_blobs, get_blob_dir, BLOB_GC_GRACE
+from test_data import SONARR_WEBHOOK_DATA
+
+class TestBlobStore(unittest.TestCase):
+    """Test suite for blob_store.py functions"""
+
+    def setUp(self):
+        """Point the data dir at a temp dir"""
+        self.test_dir = tempfile.mkdtemp()
+        patcher = patch('functions.config.CONFIG_FILE', os.path.join(self.test_dir, 'config.json'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        """Test that a stored payload loads back unchanged"""
+        digest = put_blob(SONARR_WEBHOOK_DATA)
+
+        self.assertEqual(get_blob(digest), SONARR_WEBHOOK_DATA)
+
+    def test_blobs_are_compressed(self):
+        """Test that blob files hold zlib-compressed JSON"""
+        digest = put_blob({'message': 'x' * 1000})
+
+        with open(os.path.join(get_blob_dir(), digest), 'rb') as f:
+            raw = f.read()
+        self.assertLess(len(raw), 1000)
+        self.assertIn(b'"message"', zlib.decompress(raw))
+
+    def test_same_content_same_hash(self):
+        """Test that key order does not change the hash"""
+        self.assertEqual(put_blob({'a': 1, 'b': 2}), put_blob({'b': 2, 'a': 1}))
+        self.assertNotEqual(put_blob({'a': 1}), put_blob({'a': 2}))
+        self.assertEqual(len(os.listdir(get_blob_dir())), 3)
+
+    def test_get_blob_returns_a_copy(self):
+        """Test that modifying a loaded payload doesn't affect later loads"""
+        digest = put_blob({'a': {'b': 1}})
+        get_blob(digest)['a']['b'] = 2
+
+        self.assertEqual(get_blob(digest), {'a': {'b': 1}})
+
+    def test_missing_or_invalid_hash(self):
+        """Test that unknown and malformed hashes load as None"""
+        self.assertIsNone(get_blob('0' * 64))
+        self.assertIsNone(get_blob('../config.json'))
+        self.assertIsNone(get_blob(None))
+
+    def _age_blobs(self, seconds):
+        """Make all stored blobs look that many seconds old"""
+        stamp = time.time() - seconds
+        for name in os.listdir(get_blob_dir()):
+            os.utime(os.path.join(get_blob_dir(), name), (stamp, stamp))
+
+    def test_remove_unreferenced_blobs(self):
+        """Test garbage collection keeps referenced blobs"""
+        keep = put_blob({'keep': True})
+        drop = put_blob({'keep': False})
+        self._age_blobs(BLOB_GC_GRACE + 60)
+
+        self.assertEqual(remove_unreferenced_blobs({keep}), 1)
+        self.assertEqual(get_blob(keep), {'keep': True})
+        self.assertIsNone(get_blob(drop))
+
+    def test_recent_blobs_are_kept(self):
+        """Test that blobs stored within the grace period survive garbage collection"""
+        old = put_blob({'blob': 'old'})
+        stored_again = put_blob({'blob': 'stored again'})
+        self._age_blobs(BLOB_GC_GRACE + 60)
+        put_blob({'blob': 'stored again'})
+        put_blob({'blob': 'new'})
+
+        self.assertEqual(remove_unreferenced_blobs(set()), 1)
+        self.assertIsNone(get_blob(old))
+        self.assertEqual(get_blob(stored_again), {'blob': 'stored again'})
+        self.assertEqual(remove_unreferenced_blobs(set(), grace=0), 2)
+
+if __name__ == '__main__':
+    unittest.main()
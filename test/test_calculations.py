@@ -0,0 +1,74 @@
+"""
+Comprehensive tests for functions/calculations.py module.
+Tests compiling calculation expressions and evaluating them with name lookups.
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.calculations import compile_calculation, parse_number, REF_PREFIX
+from functions.utils import format_message_template, safe_eval_calculation
+
+class TestCalculations(unittest.TestCase):
+    """Test suite for calculations.py functions"""
+
+    def test_compile_is_cached(self):
+        """Test that an expression is compiled once"""
+        self.assertIs(compile_calculation("price * 2"), compile_calculation("price * 2"))
+        self.assertEqual(compile_calculation("(1 + 2) * 3 - 4 // 3 % 2")(None), 8)
+
+    def test_only_used_names_are_looked_up(self):
+        """Test that names are looked up when evaluation reaches them"""
+        looked_up = []
+        def lookup(name):
+            looked_up.append(name)
+            return {'a': 4, 'b': 2}[name]
+
+        self.assertEqual(compile_calculation("a / b + a")(lookup), 6.0)
+        self.assertEqual(looked_up, ['a', 'b', 'a'])
+        with self.assertRaises(KeyError):
+            compile_calculation("a + missing")(lookup)
+
+    def test_invalid_expressions(self):
+        """Test that syntax errors and unsupported operations do not compile"""
+        for expression in ["1 +", "a.b", "f(1)", "1 << 2", "'a' if a else b", "not a"]:
+            with self.subTest(expression=expression):
+                self.assertIsNone(compile_calculation(expression))
+
+    def test_reference_power(self):
+        """Test that a negative reference as the bare base of ** binds like its text"""
+        ref = f"{REF_PREFIX}0"
+        lookup = {ref: -2}.get
+        self.assertEqual(compile_calculation(f"{ref} ** 2")(lookup), -4)
+        self.assertEqual(compile_calculation(f"({ref}) ** 2")(lookup), 4)
+        self.assertEqual(format_message_template("{calc:{neg} ** 2} [({neg}) ** 2]", {'neg': -2}), "-4 4")
+
+    def test_parse_number(self):
+        """Test the numbers values stand for and the texts that are not numbers"""
+        self.assertEqual(parse_number("-12"), -12)
+        self.assertEqual(parse_number("2.50"), 2.5)
+        self.assertEqual(parse_number("1e3"), 1000.0)
+        for text in ["", "abc", "007", "1_000", " 1", "nan", "True"]:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_number(text)
+
+    @patch('functions.utils.log_notification')
+    def test_templates(self, mock_log):
+        """Test that template calculations give the same results as evaluating their text"""
+        data = {'price': '19.99', 'qty': 3, 'flag': True, 'name': 'x', 'nested': {'size': 2}}
+        self.assertEqual(format_message_template(
+            "{calc:{price} * {qty}} [{qty} / 2] {calc:qty * price} [{nested.size} + 1]", data),
+            "59.97 1.50 59.97 3")
+        self.assertEqual(format_message_template("[{flag} + 1] {calc:{name} + 1}", data), "2 CALC_ERROR(x + 1)")
+        self.assertEqual(safe_eval_calculation("a * 2", {'a': 3}), 6)
+        self.assertEqual(safe_eval_calculation("a * 2", {}), "CALC_ERROR(a * 2)")
+        mock_log.assert_called_with("Calculation error in 'a * 2': Unknown variable: a")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,7 +16,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from functions.config import (
     initialize_files, get_config, save_config, get_logs, 
-    save_logs, clear_logs, get_log_stats, CONFIG_FILE, LOG_FILE
+    save_logs, clear_logs, get_log_stats, get_config_cache_stats,
+    invalidate_config_cache, get_config_for_update, increment_notification_counter,
+    append_log, get_log_count, get_log_dir, CONFIG_FILE, LOG_FILE
 )
 from test_data import SAMPLE_CONFIG, SAMPLE_LOGS
 
@@ -80,20 +82,14 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config["log_retention"], 1000)
         self.assertEqual(config["user_variables"], {})
 
-    def test_initialize_files_creates_empty_log_file(self):
-        """Test that initialize_files creates empty log file"""
-        log_file = os.path.join(self.test_dir, 'notification_logs.json')
-        
+    def test_initialize_files_creates_empty_log_dir(self):
+        """Test that initialize_files creates an empty log segment directory"""
         initialize_files()
         
-        # Check that log file exists
-        self.assertTrue(os.path.exists(log_file))
-        
-        # Check that it contains empty array
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
+        # Check that the segment directory exists
+        self.assertTrue(os.path.isdir(os.path.join(self.test_dir, 'logs')))
         
-        self.assertEqual(logs, [])
+        self.assertEqual(get_logs(), [])
 
     def test_initialize_files_preserves_existing_files(self):
         """Test that initialize_files doesn't overwrite existing files"""
@@ -112,14 +108,14 @@ class TestConfig(unittest.TestCase):
         
         initialize_files()
         
-        # Check that files weren't overwritten
+        # Check that the config wasn't overwritten and the old logs were imported
         with open(config_file, 'r') as f:
             config = json.load(f)
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
         
         self.assertEqual(config, test_config)
-        self.assertEqual(logs, test_logs)
+        self.assertEqual(get_logs(), test_logs)
+        self.assertFalse(os.path.exists(log_file))
+        self.assertTrue(os.path.exists(log_file + '.migrated'))
 
     def test_get_config_returns_valid_config(self):
         """Test that get_config returns valid configuration"""
@@ -234,12 +230,11 @@ class TestConfig(unittest.TestCase):
         
         save_logs(test_logs)
         
-        # Check that file was written
-        self.assertTrue(os.path.exists(log_file))
-        
-        # Check content
-        with open(log_file, 'r') as f:
-            saved_logs = json.load(f)
+        # Check that a segment was written, one JSON entry per line
+        segments = os.listdir(get_log_dir())
+        self.assertEqual(len(segments), 1)
+        with open(os.path.join(get_log_dir(), segments[0]), 'r') as f:
+            saved_logs = [json.loads(line) for line in f]
         
         self.assertEqual(len(saved_logs), len(test_logs))
         self.assertEqual(saved_logs[0]['message'], test_logs[0]['message'])
@@ -256,11 +251,42 @@ class TestConfig(unittest.TestCase):
         
         clear_logs()
         
-        # Check that file is empty
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
+        # Check that the old logs are gone too
+        self.assertEqual(get_logs(), [])
+
+    def test_append_log_is_a_single_append(self):
+        """Test that appending a log line doesn't rewrite earlier entries"""
+        save_logs(SAMPLE_LOGS.copy())
+        segment = os.path.join(get_log_dir(), os.listdir(get_log_dir())[0])
+        size = os.path.getsize(segment)
+        
+        append_log({'timestamp': '2024-01-15 11:00:00', 'message': 'new', 'category': 'General'}, 1000)
+        
+        with open(segment, 'r') as f:
+            f.seek(size)
+            self.assertEqual(json.loads(f.read())['message'], 'new')
+        self.assertEqual(get_logs()[-1]['message'], 'new')
+        self.assertEqual(get_log_count(), len(SAMPLE_LOGS) + 1)
+
+    def test_get_logs_limit_returns_newest(self):
+        """Test that a limited read returns the newest entries, oldest first"""
+        for i in range(5):
+            append_log({'timestamp': '2024-01-15 11:00:00', 'message': f'log {i}', 'category': 'General'}, 1000)
+        
+        self.assertEqual([log['message'] for log in get_logs(limit=2)], ['log 3', 'log 4'])
+
+    def test_append_log_drops_whole_old_segments(self):
+        """Test rotation and segment-based retention"""
+        with patch('functions.log_segments.LOG_SEGMENT_MAX_BYTES', 200):
+            for i in range(60):
+                append_log({'timestamp': '2024-01-15 11:00:00', 'message': f'log {i}', 'category': 'General'}, 10)
         
-        self.assertEqual(logs, [])
+        logs = get_logs()
+        # At least the retention limit is kept, but never much more than a segment's worth
+        self.assertGreaterEqual(len(logs), 10)
+        self.assertLess(len(logs), 20)
+        self.assertEqual(logs[-1]['message'], 'log 59')
+        self.assertGreater(len(os.listdir(get_log_dir())), 1)
 
     def test_get_log_stats_all_categories(self):
         """Test that get_log_stats returns stats for all categories"""
@@ -356,5 +382,98 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(len(loaded_config["notification_flows"]), 100)
         self.assertEqual(loaded_config["notification_flows"][50]["name"], "flow_50")
 
+    def test_get_config_cache_returns_shared_snapshot(self):
+        """Test that repeated get_config calls hit the cache"""
+        initialize_files()
+        
+        with patch('functions.config.CONFIG_CACHE_RACY_WINDOW', -60):
+            first = get_config()
+            hits_before = get_config_cache_stats()['hits']
+            second = get_config()
+        
+        self.assertIs(first, second)
+        self.assertEqual(get_config_cache_stats()['hits'], hits_before + 1)
+
+    def test_get_config_cache_detects_external_write(self):
+        """Test that the cache re-reads the file when it changes on disk"""
+        config_file = os.path.join(self.test_dir, 'config.json')
+        initialize_files()
+        
+        with patch('functions.config.CONFIG_CACHE_RACY_WINDOW', -60):
+            get_config()
+            with open(config_file, 'w') as f:
+                json.dump({"discord_webhook": "changed", "check_interval": 30}, f)
+            misses_before = get_config_cache_stats()['misses']
+            config = get_config()
+        
+        self.assertEqual(config['discord_webhook'], 'changed')
+        self.assertEqual(get_config_cache_stats()['misses'], misses_before + 1)
+
+    def test_save_config_bumps_cache_generation(self):
+        """Test that save_config invalidates the cached snapshot"""
+        initialize_files()
+        
+        with patch('functions.config.CONFIG_CACHE_RACY_WINDOW', -60):
+            config = get_config()
+            generation = get_config_cache_stats()['generation']
+            config['check_interval'] = 42
+            save_config(config)
+            reloaded = get_config()
+        
+        self.assertGreater(get_config_cache_stats()['generation'], generation)
+        self.assertEqual(reloaded['check_interval'], 42)
+
+    def test_save_config_does_not_mutate_caller_flows(self):
+        """Test that serializing last_data leaves the caller's flow dicts untouched"""
+        test_config = {"notification_flows": [{"name": "f", "last_data": {"a": 1}}]}
+        
+        save_config(test_config)
+        
+        self.assertEqual(test_config['notification_flows'][0]['last_data'], {"a": 1})
+
+    def test_failed_save_leaves_shared_config_unchanged(self):
+        """Test that edits to a config for update only show up once saved"""
+        initialize_files()
+        config = get_config_for_update()
+        config['check_interval'] = 17
+        config['user_variables']['team'] = 'Ops'
+        
+        self.assertEqual(get_config()['check_interval'], 5)
+        with patch('functions.config._write_config', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                save_config(config)
+        
+        self.assertEqual(get_config()['check_interval'], 5)
+        self.assertEqual(get_config()['user_variables'], {})
+        save_config(config)
+        self.assertEqual(get_config()['check_interval'], 17)
+
+    def test_invalidate_config_cache_forces_reload(self):
+        """Test that invalidate_config_cache forces a re-read"""
+        initialize_files()
+        
+        with patch('functions.config.CONFIG_CACHE_RACY_WINDOW', -60):
+            first = get_config()
+            invalidate_config_cache()
+            second = get_config()
+        
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+
+    def test_notification_counter_does_not_rewrite_config(self):
+        """Test that counting a sent notification leaves config.json alone"""
+        initialize_files()
+        config_file = os.path.join(self.test_dir, 'config.json')
+        mtime = os.stat(config_file).st_mtime_ns
+        
+        from functions.counters import get_total_sent, clear_counter_cache
+        self.addCleanup(clear_counter_cache)
+        for _ in range(5):
+            increment_notification_counter('Flow')
+        
+        self.assertEqual(get_total_sent(), 5)
+        self.assertEqual(os.stat(config_file).st_mtime_ns, mtime)
+        clear_counter_cache()
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
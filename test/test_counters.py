@@ -0,0 +1,94 @@
+"""
+Comprehensive tests for functions/counters.py module.
+Tests the in-memory notification counters and their persistence.
+"""
+
+import unittest
+import os
+import json
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.counters import (
+    record_notification_sent, get_total_sent, get_flow_sent, get_counter_snapshot,
+    rename_flow_counter, delete_flow_counter, flush_counters, clear_counter_cache,
+    get_counters_file
+)
+from test_data import DataDirTestCase
+
+class TestCounters(DataDirTestCase):
+    """Test suite for counters.py functions"""
+
+    data_config = {'total_notifications_sent': 10, 'notification_flows': []}
+
+    def setUp(self):
+        """Start every test from the stored counts"""
+        super().setUp()
+        clear_counter_cache()
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        # Flush buffered counts while the temp dir still exists
+        clear_counter_cache()
+        super().tearDown()
+
+    def test_seeded_from_legacy_config_total(self):
+        """Test that the first load carries over total_notifications_sent"""
+        self.assertEqual(get_total_sent(), 10)
+
+    def test_record_counts_globally_and_per_flow(self):
+        """Test that a send bumps the total and its flow"""
+        record_notification_sent('Sonarr')
+        record_notification_sent('Sonarr')
+        record_notification_sent()
+
+        self.assertEqual(get_total_sent(), 13)
+        self.assertEqual(get_flow_sent('Sonarr'), 2)
+        self.assertEqual(get_flow_sent('Other'), 0)
+
+    def test_counts_persist_without_touching_config(self):
+        """Test that counts are flushed to their own file"""
+        mtime = os.stat(self.config_file).st_mtime_ns
+        record_notification_sent('Sonarr')
+        flush_counters()
+
+        with open(get_counters_file(), 'r') as f:
+            self.assertEqual(json.load(f), {'total': 11, 'flows': {'Sonarr': 1}})
+        self.assertEqual(os.stat(self.config_file).st_mtime_ns, mtime)
+
+        clear_counter_cache()
+        self.assertEqual(get_counter_snapshot(), {'total': 11, 'flows': {'Sonarr': 1}})
+
+    def test_burst_is_one_write(self):
+        """Test that a burst of sends is buffered, not written per send"""
+        for _ in range(20):
+            record_notification_sent('Busy')
+
+        self.assertFalse(os.path.exists(get_counters_file()))
+        flush_counters()
+        with open(get_counters_file(), 'r') as f:
+            self.assertEqual(json.load(f)['flows'], {'Busy': 20})
+
+    def test_rename_and_delete_flow_counter(self):
+        """Test carrying a count across a rename and dropping it on delete"""
+        record_notification_sent('Old')
+        rename_flow_counter('Old', 'New')
+
+        self.assertEqual(get_flow_sent('Old'), 0)
+        self.assertEqual(get_flow_sent('New'), 1)
+
+        delete_flow_counter('New')
+        self.assertEqual(get_flow_sent('New'), 0)
+        self.assertEqual(get_total_sent(), 11)
+
+    def test_snapshot_is_a_copy(self):
+        """Test that callers can't modify the live counts"""
+        snapshot = get_counter_snapshot()
+        snapshot['flows']['X'] = 99
+
+        self.assertEqual(get_flow_sent('X'), 0)
+
+if __name__ == '__main__':
+    unittest.main()
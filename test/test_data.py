@@ -4,7 +4,16 @@ Contains realistic sample data for various services and scenarios.
 """
 
 import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
 from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 # Sample configuration data
 SAMPLE_CONFIG = {
@@ -399,4 +408,44 @@ PERFORMANCE_TEST_DATA = {
         },
         "template": "Found {level1['level2']['level3']['items'][0]['name']}"
     }
-}
\ No newline at end of file
+}
+
+class DataDirTestCase(unittest.TestCase):
+    """Base for tests that read and write the data files, kept in a temp dir"""
+
+    # Storage backend the tests run against
+    backend = 'json'
+    # Written to config.json before each test unless None
+    data_config = None
+
+    def setUp(self):
+        """Point the data files at a temp dir"""
+        self.test_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.test_dir, 'config.json')
+        self.notification_log_file = os.path.join(self.test_dir, 'sent_notifications.json')
+        
+        # Patch the file paths and the storage backend
+        patchers = [
+            patch('functions.config.CONFIG_FILE', self.config_file),
+            patch('functions.config.LOG_FILE', os.path.join(self.test_dir, 'notification_logs.json')),
+            patch('functions.config.NOTIFICATION_LOG_FILE', self.notification_log_file),
+            patch('functions.utils.NOTIFICATION_LOG_FILE', self.notification_log_file),
+            patch('functions.config.STORAGE_BACKEND', self.backend),
+        ]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+            patcher.start()
+        
+        from functions import sqlite_store
+        self.addCleanup(sqlite_store.close_connections)
+        if self.data_config is not None:
+            self.write_config(self.data_config)
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write_config(self, config):
+        """Replace config.json with config"""
+        with open(self.config_file, 'w') as f:
+            json.dump(config, f)
@@ -0,0 +1,48 @@
+"""
+Comprehensive tests for functions/data_paths.py module.
+Tests compiling field paths and looking values up with them.
+"""
+
+import unittest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.data_paths import compile_path, resolve_path, get_path_value
+from test_data import SONARR_WEBHOOK_DATA
+
+class TestDataPaths(unittest.TestCase):
+    """Test suite for data_paths.py functions"""
+
+    def test_compile_path(self):
+        """Test that dot, bracket and mixed notation compile to the same typed keys, once"""
+        keys = (('result', None), ('0', 0), ('title', None))
+
+        self.assertEqual(compile_path("result['0']['title']"), keys)
+        self.assertEqual(compile_path('result.0.title'), keys)
+        self.assertEqual(compile_path("result.0['title']"), keys)
+        self.assertIs(compile_path('result.0.title'), compile_path('result.0.title'))
+
+    def test_resolve_path(self):
+        """Test dict keys, list indexes and misses"""
+        data = {'items': [{'name': 'a'}, {'name': 'b'}], '5': 'five', 'nothing': None}
+
+        self.assertEqual(resolve_path(data, compile_path('items.1.name')), 'b')
+        self.assertEqual(resolve_path(data, (('5', 5),)), 'five')
+        self.assertEqual(get_path_value(data, '5'), 'five')
+        self.assertIsNone(get_path_value(data, 'items.2.name'))
+        self.assertIsNone(get_path_value(data, 'items.name'))
+        self.assertIsNone(get_path_value(data, 'nothing.deeper'))
+        self.assertIsNone(get_path_value(data, 'items..name'))
+        self.assertIsNone(get_path_value(data, None))
+
+    def test_webhook_data(self):
+        """Test with real Sonarr data"""
+        self.assertEqual(get_path_value(SONARR_WEBHOOK_DATA, "series['images']['0']['remoteUrl']"),
+                         get_path_value(SONARR_WEBHOOK_DATA, 'series.images.0.remoteUrl'))
+        self.assertEqual(get_path_value(SONARR_WEBHOOK_DATA, 'series.title'), 'Breaking Bad')
+
+if __name__ == '__main__':
+    unittest.main()
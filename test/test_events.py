@@ -0,0 +1,107 @@
+"""
+Comprehensive tests for functions/events.py module.
+Tests the typed flow event store and the events recorded for deliveries.
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch, Mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import sqlite_store
+from functions.events import (
+    make_event, record_event, get_events, flush_events, clear_event_cache, get_event_dir, trigger_for
+)
+from functions.notifications import send_discord_notification
+from functions.config import flush_logs
+from functions.utils import flush_notification_logs
+from functions.counters import clear_counter_cache
+from functions.flow_aggregates import clear_flow_stats_cache
+from functions.rollups import clear_rollup_cache
+from test_data import DataDirTestCase
+
+class TestEvents(DataDirTestCase):
+    """Test suite for events.py functions"""
+
+    data_config = {'event_retention': 3, 'discord_webhook': 'https://discord.test/webhook'}
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        clear_event_cache()
+        flush_logs()
+        flush_notification_logs()
+        clear_counter_cache()
+        clear_flow_stats_cache()
+        clear_rollup_cache()
+        super().tearDown()
+
+    def test_make_event(self):
+        """Test the event fields"""
+        event = make_event('Price Watch', 'change', 'sent', 204, 181.6, ts=1705329000000)
+
+        self.assertEqual(event, {'ts': 1705329000000, 'flow_name': 'Price Watch', 'trigger': 'change',
+                                 'outcome': 'sent', 'http_status': 204, 'latency_ms': 182})
+        self.assertIsInstance(make_event('A', 'timer', 'error')['ts'], int)
+
+    def test_trigger_for(self):
+        """Test mapping flow trigger types to event triggers"""
+        self.assertEqual(trigger_for('on_change'), 'change')
+        self.assertEqual(trigger_for('webhook'), 'webhook')
+        self.assertEqual(trigger_for(None), 'test')
+
+    def test_filters_by_flow_and_time(self):
+        """Test get_events filters"""
+        record_event('A b', 'timer', 'sent', ts=1000)
+        record_event('A', 'timer', 'failed', ts=2000)
+        record_event('A b', 'webhook', 'sent', ts=3000)
+
+        self.assertEqual([e['ts'] for e in get_events('A b')], [1000, 3000])
+        self.assertEqual([e['ts'] for e in get_events(since=2000)], [2000, 3000])
+
+    def test_events_are_persisted_and_retained(self):
+        """Test that events survive a reload and only event_retention are kept"""
+        for i in range(5):
+            record_event('Flow', 'timer', 'sent', ts=i)
+        clear_event_cache()
+
+        self.assertTrue(os.path.isdir(get_event_dir()))
+        self.assertEqual([e['ts'] for e in get_events()], [2, 3, 4])
+
+    def test_sqlite_backend(self):
+        """Test that events go to the events table with the SQLite backend"""
+        with patch('functions.config.STORAGE_BACKEND', 'sqlite'):
+            record_event('Flow', 'webhook', 'failed', 429, 35, ts=5)
+            flush_events()
+            self.assertEqual(sqlite_store.get_events(os.path.join(self.test_dir, 'turtifications.db')),
+                             [make_event('Flow', 'webhook', 'failed', 429, 35, ts=5)])
+            clear_event_cache()
+            self.assertEqual(get_events()[0]['http_status'], 429)
+
+    @patch('functions.notifications.requests.post')
+    def test_delivery_outcomes_are_recorded(self, mock_post):
+        """Test that send_discord_notification records sent and failed deliveries"""
+        flow = {'name': 'Radarr Grabs', 'webhook_url': 'https://discord.test/webhook',
+                'message_template': 'Grabbed', 'trigger_type': 'webhook'}
+        mock_post.return_value = Mock(status_code=204, text='')
+        self.assertTrue(send_discord_notification('Grabbed', flow, {}))
+        mock_post.return_value = Mock(status_code=429, text='rate limited')
+        self.assertFalse(send_discord_notification('Grabbed', flow, {}, trigger='test'))
+
+        events = get_events('Radarr Grabs')
+        self.assertEqual([(e['trigger'], e['outcome'], e['http_status']) for e in events],
+                         [('webhook', 'sent', 204), ('test', 'failed', 429)])
+        self.assertIsInstance(events[0]['latency_ms'], int)
+
+    @patch('functions.notifications.requests.post', side_effect=ConnectionError('down'))
+    def test_delivery_errors_are_recorded(self, mock_post):
+        """Test that a send that raises is recorded as an error"""
+        flow = {'name': 'Radarr Grabs', 'webhook_url': 'https://discord.test/webhook', 'message_template': 'x'}
+        self.assertFalse(send_discord_notification('x', flow, {}, trigger='timer'))
+
+        self.assertEqual(get_events('Radarr Grabs')[0]['outcome'], 'error')
+
+if __name__ == '__main__':
+    unittest.main()
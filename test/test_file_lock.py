@@ -0,0 +1,124 @@
+"""
+Comprehensive tests for functions/file_lock.py module.
+Tests shared/exclusive locking and lost-update protection across workers.
+"""
+
+import unittest
+import os
+import json
+import sys
+import threading
+import multiprocessing
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import file_lock as file_lock_module
+from functions.file_lock import file_lock, LockTimeout, get_lock_stats
+from functions.config import append_log, get_logs
+from functions.counters import record_notification_sent, flush_counters, clear_counter_cache, get_counters_file
+from test_data import DataDirTestCase
+
+def _in_thread(target):
+    """Run target in another thread and return what it returned or raised"""
+    result = {}
+    def run():
+        try:
+            result['value'] = target()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result
+
+def _append_logs(worker, count):
+    for i in range(count):
+        append_log({'timestamp': '2024-01-15 10:00:00', 'message': f'{worker}-{i}', 'category': 'General'}, 1000)
+
+def _record_sends(count):
+    clear_counter_cache()
+    for _ in range(count):
+        record_notification_sent('Shared')
+    flush_counters()
+
+@unittest.skipIf(file_lock_module.fcntl is None, "fcntl is not available")
+class TestFileLock(DataDirTestCase):
+    """Test suite for file_lock.py functions"""
+
+    data_config = {'notification_flows': [], 'counter_flush_interval': 60}
+
+    def setUp(self):
+        """Start every test from the stored counts"""
+        super().setUp()
+        self.path = os.path.join(self.test_dir, 'data.json')
+        clear_counter_cache()
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        clear_counter_cache()
+        super().tearDown()
+
+    def test_exclusive_lock_blocks_other_holders(self):
+        """Test that a second exclusive or shared lock times out"""
+        def try_lock(exclusive):
+            with file_lock(self.path, exclusive=exclusive, timeout=0.05):
+                return True
+
+        timeouts = get_lock_stats()['timeouts']
+        with file_lock(self.path):
+            self.assertIsInstance(_in_thread(lambda: try_lock(True)).get('error'), LockTimeout)
+            self.assertIsInstance(_in_thread(lambda: try_lock(False)).get('error'), LockTimeout)
+
+        self.assertEqual(get_lock_stats()['timeouts'] - timeouts, 2)
+        self.assertTrue(_in_thread(lambda: try_lock(True))['value'])
+
+    def test_shared_locks_coexist(self):
+        """Test that readers don't block each other"""
+        def read():
+            with file_lock(self.path, exclusive=False, timeout=0.05):
+                return True
+
+        with file_lock(self.path, exclusive=False):
+            self.assertTrue(_in_thread(read)['value'])
+
+    def test_lock_is_reentrant(self):
+        """Test that a writer can call a reader of the same file"""
+        with file_lock(self.path, timeout=0.05):
+            with file_lock(self.path, exclusive=False, timeout=0.05):
+                with file_lock(self.path, timeout=0.05):
+                    pass
+
+    def test_missing_directory_runs_unlocked(self):
+        """Test that a lock on a path in a missing directory doesn't raise"""
+        unlocked = get_lock_stats()['unlocked']
+        with file_lock(os.path.join(self.test_dir, 'missing', 'data.json')):
+            pass
+
+        self.assertEqual(get_lock_stats()['unlocked'] - unlocked, 1)
+
+    def test_concurrent_log_appends_keep_every_entry(self):
+        """Test that worker processes appending logs don't lose each other's entries"""
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_append_logs, args=(worker, 20)) for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(get_logs()), 80)
+
+    def test_concurrent_counter_flushes_add_up(self):
+        """Test that counters flushed by several workers are merged, not overwritten"""
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_record_sends, args=(5,)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        with open(get_counters_file(), 'r') as f:
+            self.assertEqual(json.load(f), {'total': 15, 'flows': {'Shared': 15}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Comprehensive tests for functions/flow_aggregates.py module.
+Tests per-flow run statistics updated at event time, persisted and reloaded.
+"""
+
+import unittest
+import os
+import json
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import sqlite_store
+from functions.events import make_event, record_event, clear_event_cache
+from functions.flow_aggregates import (
+    record_flow_run, get_flow_run_stats, rename_flow_stats, delete_flow_stats,
+    flush_flow_stats, clear_flow_stats_cache, get_flow_stats_file
+)
+from test_data import DataDirTestCase
+
+class TestFlowAggregates(DataDirTestCase):
+    """Test suite for flow_aggregates.py functions"""
+
+    data_config = {'stats_flush_interval': 60}
+
+    def setUp(self):
+        """Start every test from the stored statistics"""
+        super().setUp()
+        clear_flow_stats_cache()
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        clear_flow_stats_cache()
+        clear_event_cache()
+        super().tearDown()
+
+    def test_counts_triggers_and_outcomes(self):
+        """Test that each event bumps the run, trigger and outcome counts"""
+        for trigger, outcome in [('timer', 'sent'), ('webhook', 'failed'), ('change', 'error'),
+                                 ('test', 'skipped'), ('unknown', 'sent')]:
+            record_flow_run(make_event('Test Flow', trigger, outcome, ts=1000))
+
+        stats = get_flow_run_stats('Test Flow')
+        self.assertEqual(stats['total_runs'], 5)
+        self.assertEqual((stats['timer_runs'], stats['webhook_runs'], stats['change_runs'], stats['test_runs']),
+                         (1, 1, 1, 1))
+        self.assertEqual((stats['successful_runs'], stats['failed_runs'], stats['skipped_runs']), (2, 2, 1))
+
+    def test_first_and_last_run(self):
+        """Test that first/last run follow the event times, whatever the order"""
+        for ts in (5000, 1000, 9000):
+            record_flow_run(make_event('Flow', 'timer', 'sent', ts=ts))
+
+        stats = get_flow_run_stats('Flow')
+        self.assertEqual((stats['first_ts'], stats['last_ts']), (1000, 9000))
+        self.assertEqual(get_flow_run_stats('Never Ran')['total_runs'], 0)
+
+    def test_events_without_flow_are_ignored(self):
+        """Test that test sends without a flow are not counted"""
+        record_flow_run(make_event(None, 'test', 'sent'))
+
+        self.assertEqual(get_flow_run_stats(), {})
+
+    def test_persisted_and_reloaded(self):
+        """Test that statistics are flushed to disk and loaded on the next start"""
+        for i in range(3):
+            record_flow_run(make_event('Flow with spaces', 'webhook', 'sent', ts=i))
+        self.assertFalse(os.path.exists(get_flow_stats_file()))
+        flush_flow_stats()
+        clear_flow_stats_cache()
+
+        self.assertEqual(get_flow_run_stats('Flow with spaces')['webhook_runs'], 3)
+
+    def test_rename_and_delete(self):
+        """Test carrying statistics over to a new flow name and forgetting deleted flows"""
+        record_flow_run(make_event('Old', 'timer', 'sent', ts=1))
+        record_flow_run(make_event('New', 'timer', 'failed', ts=2))
+        rename_flow_stats('Old', 'New')
+        record_flow_run(make_event('Gone', 'timer', 'sent'))
+        delete_flow_stats('Gone')
+        clear_flow_stats_cache()
+
+        stats = get_flow_run_stats()
+        self.assertEqual(list(stats), ['New'])
+        self.assertEqual((stats['New']['total_runs'], stats['New']['first_ts']), (2, 1))
+
+    def test_first_start_rebuilds_from_events(self):
+        """Test that statistics start from the retained events when nothing is stored"""
+        record_event('Flow', 'change', 'sent', ts=10)
+        record_event('Flow', 'change', 'failed', ts=20)
+
+        stats = get_flow_run_stats('Flow')
+        self.assertEqual((stats['change_runs'], stats['failed_runs']), (2, 1))
+
+    def test_independent_of_event_retention(self):
+        """Test that counts survive events falling out of retention"""
+        with open(os.path.join(self.test_dir, 'config.json'), 'w') as f:
+            json.dump({'stats_flush_interval': 60, 'event_retention': 10}, f)
+        for i in range(1000):
+            event = make_event(f'Flow {i % 10}', 'timer', 'sent', ts=i)
+            record_flow_run(event)
+            record_event(**event)
+
+        stats = get_flow_run_stats()
+        self.assertEqual(len(stats), 10)
+        self.assertTrue(all(flow['total_runs'] == 100 for flow in stats.values()))
+
+    def test_sqlite_backend(self):
+        """Test that statistics go to the flow_aggregates table with the SQLite backend"""
+        with patch('functions.config.STORAGE_BACKEND', 'sqlite'):
+            record_flow_run(make_event('Flow', 'webhook', 'sent', ts=7))
+            clear_flow_stats_cache()
+            stored = sqlite_store.get_flow_aggregates(os.path.join(self.test_dir, 'turtifications.db'))
+            self.assertEqual(stored['Flow']['last_ts'], 7)
+            self.assertEqual(get_flow_run_stats('Flow')['successful_runs'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
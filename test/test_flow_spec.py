@@ -0,0 +1,208 @@
+"""
+Comprehensive tests for functions/flow_spec.py module.
+Tests compiling flow definitions and the per-generation spec cache.
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.config import initialize_files, get_config, save_config
+from functions.flow_spec import (
+    FlowSpec, get_flow_specs, get_flow_spec, as_flow_spec, get_flow_spec_stats, split_field_path,
+    find_flows, get_schedulable_specs, get_webhook_spec
+)
+from test_data import DataDirTestCase
+
+def _sample_config():
+    """A fresh config with three flows; shared fixtures may have been changed by other modules"""
+    return {
+        'discord_webhook': 'https://discord.com/api/webhooks/123456789/test-webhook-url',
+        'user_variables': {},
+        'notification_flows': [
+            {'name': 'Sonarr Downloads', 'active': True, 'trigger_type': 'webhook', 'category': 'Media',
+             'webhook_url': 'https://discord.com/api/webhooks/123/sonarr', 'webhook_name': 'Sonarr',
+             'message_template': "**{series['title']}** - {episode['title']}"},
+            {'name': 'Server Monitoring', 'active': True, 'trigger_type': 'timer', 'category': 'System',
+             'interval': 300, 'message_template': 'Server Status: {status}'},
+            {'name': 'GitHub Releases', 'active': False, 'trigger_type': 'api', 'category': 'Development',
+             'message_template': 'New release: {name}'},
+        ]
+    }
+
+class TestFlowSpec(DataDirTestCase):
+    """Test suite for flow_spec.py functions"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        super().setUp()
+        # Files written moments ago are always re-read; keep snapshots stable
+        patcher = patch('functions.config.CONFIG_CACHE_RACY_WINDOW', -60)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def test_compiles_derived_fields(self):
+        """Test that a spec pre-computes what consumers used to derive per call"""
+        flow = {
+            'name': 'Server', 'active': True, 'trigger_type': 'timer', 'interval': 2,
+            'endpoint': 'https://api.example.com', 'field': "result['0']['status']",
+            'api_headers': [{'key': 'Authorization', 'value': 'Bearer x'}],
+            'message_template': 'Status {value}',
+            'condition_enabled': True, 'condition': "value == 'up'",
+            'embed_config': {'enabled': False}
+        }
+
+        spec = FlowSpec(flow, {'discord_webhook': 'https://discord/default',
+                               'default_webhook_name': 'Bot'})
+
+        self.assertEqual(spec.interval_seconds, 120)
+        self.assertEqual(spec.field_keys, ('result', '0', 'status'))
+        self.assertEqual(spec.request_headers, {'Authorization': 'Bearer x'})
+        self.assertEqual(spec.condition, "value == 'up'")
+        self.assertIsNone(spec.embed_config)
+        self.assertEqual(spec.webhook_url, 'https://discord/default')
+        self.assertEqual(spec.webhook_name, 'Bot')
+        self.assertTrue(spec.is_scheduled)
+        self.assertTrue(spec.uses_data)
+
+    def test_disabled_condition_and_static_template(self):
+        """Test that a flow without condition or placeholders needs no stored data"""
+        spec = FlowSpec({'name': 'Plain', 'message_template': 'Backup done at {time}',
+                         'condition_enabled': False, 'condition': 'x > 1'}, {})
+
+        self.assertIsNone(spec.condition)
+        self.assertFalse(spec.uses_data)
+
+    def test_uses_slots(self):
+        """Test that specs don't carry a per-instance __dict__"""
+        spec = FlowSpec({'name': 'A'}, {})
+
+        self.assertFalse(hasattr(spec, '__dict__'))
+
+    def test_dict_style_access_and_public_dict(self):
+        """Test that specs can stand in for the raw flow dict"""
+        flow = {'name': 'Hook', 'webhook_url': 'secret-url', 'webhook_secret': 's', 'category': 'Media'}
+        spec = FlowSpec(flow, {})
+
+        self.assertEqual(spec['name'], 'Hook')
+        self.assertEqual(spec.get('missing', 1), 1)
+        self.assertIn('category', spec)
+        self.assertEqual(spec.public_dict(), {'name': 'Hook', 'category': 'Media'})
+
+    def test_specs_cached_per_generation(self):
+        """Test that specs are only rebuilt when the config changes"""
+        initialize_files()
+        config = _sample_config()
+        save_config(config)
+
+        first = get_flow_specs()
+        builds = get_flow_spec_stats()['builds']
+        self.assertIs(get_flow_specs(), first)
+        self.assertEqual(get_flow_spec_stats()['builds'], builds)
+
+        config['notification_flows'][0]['active'] = False
+        save_config(config)
+        rebuilt = get_flow_specs()
+
+        self.assertIsNot(rebuilt, first)
+        self.assertFalse(rebuilt[0].active)
+
+    def test_get_flow_spec_by_name(self):
+        """Test the by-name lookup"""
+        initialize_files()
+        save_config(_sample_config())
+
+        spec = get_flow_spec('Sonarr Downloads')
+
+        self.assertEqual(spec.name, 'Sonarr Downloads')
+        self.assertEqual(spec.index, 0)
+        self.assertIsNone(get_flow_spec('Nope'))
+
+    def test_find_flows_by_attributes(self):
+        """Test the (active, trigger_type, category) index"""
+        initialize_files()
+        save_config(_sample_config())
+
+        self.assertEqual([f.name for f in find_flows(active=True)],
+                         ['Sonarr Downloads', 'Server Monitoring'])
+        self.assertEqual([f.name for f in find_flows(category='Development')], ['GitHub Releases'])
+        self.assertEqual([f.name for f in find_flows(active=True, trigger_type='timer', category='System')],
+                         ['Server Monitoring'])
+        self.assertEqual(find_flows(active=False, trigger_type='webhook'), [])
+        self.assertEqual(len(find_flows()), 3)
+
+    def test_webhook_specs(self):
+        """Test that webhooks route to the first active flow with trigger_type 'webhook'"""
+        initialize_files()
+        config = _sample_config()
+        flows = config['notification_flows']
+        flows.insert(0, {'name': 'Sonarr Downloads', 'active': False, 'trigger_type': 'webhook'})
+        flows.append({'name': 'Sonarr Downloads', 'active': True, 'trigger_type': 'webhook', 'category': 'Later'})
+        flows.append({'name': 'Legacy', 'active': True, 'trigger_type': 'on_incoming'})
+        save_config(config)
+
+        self.assertEqual(get_webhook_spec('Sonarr Downloads').category, 'Media')
+        self.assertIsNone(get_webhook_spec('Server Monitoring'))
+        self.assertIsNone(get_webhook_spec('Legacy'))
+        self.assertIsNone(get_webhook_spec('Missing'))
+
+    def test_schedulable_specs(self):
+        """Test that only active timer/on_change flows reach the poller"""
+        initialize_files()
+        config = _sample_config()
+        config['notification_flows'].append({'name': 'Paused', 'active': False, 'trigger_type': 'on_change'})
+        save_config(config)
+
+        self.assertEqual([f.name for f in get_schedulable_specs()], ['Server Monitoring'])
+
+    def test_rebuild_reuses_unchanged_specs(self):
+        """Test that a config change only recompiles the flows that changed"""
+        initialize_files()
+        config = _sample_config()
+        save_config(config)
+        get_flow_specs()
+        before = get_flow_spec_stats()
+
+        config['notification_flows'][2]['active'] = True
+        save_config(config)
+        specs = get_flow_specs()
+        after = get_flow_spec_stats()
+
+        self.assertEqual(after['compiled'] - before['compiled'], 1)
+        self.assertEqual(after['reused'] - before['reused'], 2)
+        self.assertTrue(specs[2].active)
+        self.assertIs(specs[0].raw, get_config()['notification_flows'][0])
+        self.assertEqual([f.name for f in find_flows(active=True)],
+                         ['Sonarr Downloads', 'Server Monitoring', 'GitHub Releases'])
+
+    def test_default_webhook_change_recompiles_all(self):
+        """Test that specs depending on global defaults are not reused stale"""
+        initialize_files()
+        config = _sample_config()
+        save_config(config)
+        get_flow_specs()
+
+        config['default_webhook_name'] = 'Renamed Bot'
+        save_config(config)
+
+        self.assertEqual(get_flow_spec('Server Monitoring').webhook_name, 'Renamed Bot')
+
+    def test_as_flow_spec(self):
+        """Test wrapping ad-hoc dicts and passing specs through"""
+        spec = as_flow_spec({'name': 'Test', 'webhook_url': 'https://x'}, {})
+
+        self.assertIsInstance(spec, FlowSpec)
+        self.assertIs(as_flow_spec(spec, {}), spec)
+        self.assertIsNone(as_flow_spec(None, {}))
+
+    def test_split_field_path(self):
+        """Test bracket and dot notation give the same keys"""
+        self.assertEqual(split_field_path("a['b']['0']"), ('a', 'b', '0'))
+        self.assertEqual(split_field_path('a.b.0'), ('a', 'b', '0'))
+
+if __name__ == '__main__':
+    unittest.main()
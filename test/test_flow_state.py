@@ -0,0 +1,268 @@
+"""
+Comprehensive tests for functions/flow_state.py module.
+Tests the per-flow runtime state store for both storage backends.
+"""
+
+import unittest
+import os
+import json
+import sys
+import copy
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import sqlite_store
+from functions.config import initialize_files, get_config
+from functions.flow_state import (
+    get_flow_state, update_flow_state, delete_flow_state, rename_flow_state,
+    merge_flow_state, migrate_legacy_state, clear_state_cache, get_state_dir,
+    flush_flow_state, get_last_data, collect_blob_garbage, LAST_DATA_REF
+)
+from functions.blob_store import get_blob_dir, BLOB_GC_GRACE
+from test_data import SAMPLE_CONFIG, SONARR_WEBHOOK_DATA, DataDirTestCase
+
+class TestFlowState(DataDirTestCase):
+    """Test suite for flow_state.py functions (JSON backend)"""
+
+    backend = 'json'
+
+    def setUp(self):
+        """Start every test with an empty state cache"""
+        super().setUp()
+        self.addCleanup(clear_state_cache)
+        clear_state_cache()
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        # Flush buffered state writes while the temp dir still exists
+        clear_state_cache()
+        super().tearDown()
+
+    def _state_file_path(self):
+        """Path of the only state file written so far"""
+        names = [name for name in os.listdir(get_state_dir()) if name.endswith('.json')]
+        return os.path.join(get_state_dir(), names[0])
+
+    def test_get_flow_state_empty_for_new_flow(self):
+        """Test that a flow that never ran has no state"""
+        self.assertEqual(get_flow_state('Never Ran'), {})
+
+    def test_update_flow_state_persists(self):
+        """Test that updates survive a cache reset"""
+        update_flow_state('Sonarr Downloads', last_value='Pilot', last_data=SONARR_WEBHOOK_DATA)
+        clear_state_cache()
+
+        state = get_flow_state('Sonarr Downloads')
+
+        self.assertEqual(state['last_value'], 'Pilot')
+        self.assertEqual(get_last_data('Sonarr Downloads'), SONARR_WEBHOOK_DATA)
+
+    def test_update_flow_state_merges(self):
+        """Test that partial updates keep the other keys"""
+        update_flow_state('Timer', last_run=100.0, last_value='a')
+        update_flow_state('Timer', last_value='b')
+
+        self.assertEqual(get_flow_state('Timer'), {'last_run': 100.0, 'last_value': 'b'})
+
+    def test_update_flow_state_rejects_unknown_keys(self):
+        """Test that only tracking keys can be stored"""
+        with self.assertRaises(ValueError):
+            update_flow_state('Timer', message_template='nope')
+
+    def test_update_does_not_touch_config(self):
+        """Test that recording state leaves config.json alone"""
+        initialize_files()
+        if self.backend == 'sqlite':
+            db_path = os.path.join(self.test_dir, 'turtifications.db')
+            generation = sqlite_store.get_config_generation(db_path)
+            update_flow_state('Timer', last_value='x')
+            self.assertEqual(sqlite_store.get_config_generation(db_path), generation)
+            return
+        config_file = os.path.join(self.test_dir, 'config.json')
+        mtime = os.stat(config_file).st_mtime_ns
+
+        update_flow_state('Timer', last_value='x')
+
+        self.assertEqual(os.stat(config_file).st_mtime_ns, mtime)
+
+    def test_delete_and_rename_flow_state(self):
+        """Test deleting and renaming state"""
+        update_flow_state('Old Name', last_value='v')
+        rename_flow_state('Old Name', 'New Name')
+
+        self.assertEqual(get_flow_state('Old Name'), {})
+        self.assertEqual(get_flow_state('New Name'), {'last_value': 'v'})
+
+        delete_flow_state('New Name')
+        clear_state_cache()
+        self.assertEqual(get_flow_state('New Name'), {})
+
+    def test_merge_flow_state(self):
+        """Test merging state into a copy of the definition"""
+        flow = {'name': 'Merge', 'trigger_type': 'timer'}
+        update_flow_state('Merge', last_run=5.0)
+
+        merged = merge_flow_state(flow)
+
+        self.assertEqual(merged['last_run'], 5.0)
+        self.assertNotIn('last_run', flow)
+
+    def test_migrate_legacy_state(self):
+        """Test moving embedded tracking keys out of the flow definitions"""
+        config = copy.deepcopy(SAMPLE_CONFIG)
+        config['notification_flows'][0]['last_data'] = json.dumps({'series': {'title': 'X'}})
+
+        changed = migrate_legacy_state(config)
+
+        self.assertTrue(changed)
+        for flow in config['notification_flows']:
+            self.assertNotIn('last_value', flow)
+        state = get_flow_state('Sonarr Downloads')
+        self.assertEqual(state['last_value'], 'Breaking Bad - Pilot')
+        self.assertEqual(get_last_data('Sonarr Downloads'), {'series': {'title': 'X'}})
+        self.assertFalse(migrate_legacy_state(config))
+
+    def test_initialize_files_migrates_config(self):
+        """Test that startup strips tracking keys from config.json"""
+        with open(os.path.join(self.test_dir, 'config.json'), 'w') as f:
+            json.dump(SAMPLE_CONFIG, f)
+
+        initialize_files()
+
+        config = get_config()
+        self.assertNotIn('last_value', config['notification_flows'][0])
+        self.assertEqual(get_flow_state('Sonarr Downloads')['last_value'], 'Breaking Bad - Pilot')
+
+    def test_state_files_are_per_flow(self):
+        """Test that each flow gets its own compact state file"""
+        if self.backend != 'json':
+            self.skipTest('JSON backend only')
+        update_flow_state('Flow A', last_value=1)
+        update_flow_state('Flow/B', last_value=2)
+
+        flush_flow_state()
+
+        state_files = [name for name in os.listdir(get_state_dir()) if name.endswith('.json')]
+        self.assertEqual(len(state_files), 2)
+
+    def test_last_data_stored_as_blob_hash(self):
+        """Test that state keeps only the payload hash"""
+        update_flow_state('Webhook', last_data=SONARR_WEBHOOK_DATA)
+        clear_state_cache()
+
+        state = get_flow_state('Webhook')
+
+        self.assertNotIn('last_data', state)
+        self.assertEqual(len(state[LAST_DATA_REF]), 64)
+
+    def test_identical_payloads_share_a_blob(self):
+        """Test that two flows with the same payload store it once"""
+        update_flow_state('Flow A', last_data=SONARR_WEBHOOK_DATA)
+        update_flow_state('Flow B', last_data=copy.deepcopy(SONARR_WEBHOOK_DATA))
+
+        self.assertEqual(get_flow_state('Flow A')[LAST_DATA_REF], get_flow_state('Flow B')[LAST_DATA_REF])
+        self.assertEqual(len(os.listdir(get_blob_dir())), 1)
+
+    def test_clearing_last_data(self):
+        """Test that last_data=None drops the reference"""
+        update_flow_state('Webhook', last_data={'a': 1})
+        update_flow_state('Webhook', last_data=None)
+
+        self.assertIsNone(get_last_data('Webhook'))
+        self.assertNotIn(LAST_DATA_REF, get_flow_state('Webhook'))
+
+    def test_legacy_inline_last_data_is_converted(self):
+        """Test that state written before the blob store is converted on read"""
+        if self.backend == 'sqlite':
+            db_path = os.path.join(self.test_dir, 'turtifications.db')
+            sqlite_store.set_flow_state(db_path, 'Old', {'last_data': json.dumps({'a': 1})})
+        else:
+            update_flow_state('Old', last_value=1)
+            clear_state_cache()
+            state_file = self._state_file_path()
+            with open(state_file, 'w') as f:
+                json.dump({'name': 'Old', 'last_data': json.dumps({'a': 1})}, f)
+
+        self.assertEqual(get_last_data('Old'), {'a': 1})
+        self.assertNotIn('last_data', get_flow_state('Old'))
+
+    def test_state_stored_by_other_workers_is_seen(self):
+        """Test that state another worker stored replaces the cached state"""
+        update_flow_state('Shared', last_value='a', last_run=1.0)
+        flush_flow_state()
+        self.assertEqual(get_flow_state('Shared'), {'last_value': 'a', 'last_run': 1.0})
+        if self.backend == 'sqlite':
+            db_path = os.path.join(self.test_dir, 'turtifications.db')
+            sqlite_store.set_flow_state(db_path, 'Shared', {'last_value': 'b', 'last_run': 20.0})
+        else:
+            state_file = self._state_file_path()
+            with open(state_file, 'w') as f:
+                json.dump({'name': 'Shared', 'last_value': 'b', 'last_run': 20.0}, f)
+
+        self.assertEqual(get_flow_state('Shared'), {'last_value': 'b', 'last_run': 20.0})
+        update_flow_state('Shared', last_value='c')
+        self.assertEqual(get_flow_state('Shared'), {'last_value': 'c', 'last_run': 20.0})
+
+    def test_flush_keeps_what_other_workers_stored(self):
+        """Test that a flush applies only this process's changes to the stored state"""
+        initialize_files()
+        update_flow_state('Shared', last_value='a', last_run=1.0)
+        flush_flow_state()
+        update_flow_state('Shared', last_value='b')
+        # Another worker records a run before our buffered change is flushed
+        if self.backend == 'sqlite':
+            db_path = os.path.join(self.test_dir, 'turtifications.db')
+            sqlite_store.set_flow_state(db_path, 'Shared', {'last_value': 'a', 'last_run': 20.0})
+        else:
+            state_file = self._state_file_path()
+            with open(state_file, 'w') as f:
+                json.dump({'name': 'Shared', 'last_value': 'a', 'last_run': 20.0}, f)
+
+        flush_flow_state()
+        clear_state_cache()
+
+        self.assertEqual(get_flow_state('Shared'), {'last_value': 'b', 'last_run': 20.0})
+
+    def test_collect_blob_garbage(self):
+        """Test that payloads no flow refers to are removed"""
+        update_flow_state('Webhook', last_data={'n': 1})
+        update_flow_state('Webhook', last_data={'n': 2})
+        # Only blobs past the grace period are collected
+        self.assertEqual(collect_blob_garbage(), 0)
+        stamp = time.time() - BLOB_GC_GRACE - 60
+        for name in os.listdir(get_blob_dir()):
+            os.utime(os.path.join(get_blob_dir(), name), (stamp, stamp))
+
+        self.assertEqual(collect_blob_garbage(), 1)
+        self.assertEqual(get_last_data('Webhook'), {'n': 2})
+
+    def test_state_writes_are_buffered(self):
+        """Test that a burst of updates is written once, on flush"""
+        initialize_files()
+        update_flow_state('Busy', last_value=0)
+        flush_flow_state()
+        for i in range(1, 6):
+            update_flow_state('Busy', last_value=i)
+
+        self.assertEqual(get_flow_state('Busy'), {'last_value': 5})
+        clear_state_cache()
+        self.assertEqual(get_flow_state('Busy'), {'last_value': 5})
+
+    def test_delete_discards_buffered_write(self):
+        """Test that deleting a flow drops its pending state write"""
+        initialize_files()
+        update_flow_state('Gone', last_value='x')
+        delete_flow_state('Gone')
+        clear_state_cache()
+
+        self.assertEqual(get_flow_state('Gone'), {})
+
+class TestFlowStateSqlite(TestFlowState):
+    """Run the same tests against the SQLite backend"""
+
+    backend = 'sqlite'
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ import unittest
 import json
 import sys
 import os
+import time
 from unittest.mock import patch, Mock
 from datetime import datetime, timedelta
 
@@ -14,11 +15,32 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from functions.flow_stats import (
-    get_flow_statistics, get_flow_usage_from_logs, extract_flow_name_from_message,
-    update_flow_stats, get_flow_success_rate, get_recent_flow_activity,
+    get_flow_statistics, display_run_stats,
+    get_flow_success_rate, get_recent_flow_activity,
     export_flow_config, import_flow_config, duplicate_flow
 )
-from test_data import SAMPLE_CONFIG, SAMPLE_LOGS
+from functions.events import make_event
+from functions.timestamps import format_ts
+from functions.flow_aggregates import _apply, empty_run_stats
+from test_data import SAMPLE_CONFIG
+
+def _event(flow_name, trigger, outcome, http_status=None, latency_ms=None, ts=None):
+    return make_event(flow_name, trigger, outcome, http_status, latency_ms, ts)
+
+def _aggregate(events):
+    """Run stats of a list of events, as the aggregator would hold them"""
+    aggregates = {}
+    for event in events:
+        _apply(aggregates, ('event', event))
+    return aggregates
+
+def _events_of(events):
+    """Stand-in for get_events over a fixed list"""
+    def get_events(flow_name=None, since=None):
+        return [event for event in events
+                if (flow_name is None or event['flow_name'] == flow_name)
+                and (since is None or event['ts'] >= since)]
+    return get_events
 
 class TestFlowStats(unittest.TestCase):
     """Test suite for flow_stats.py functions"""
@@ -26,14 +48,16 @@ class TestFlowStats(unittest.TestCase):
     def setUp(self):
         """Set up test environment before each test"""
         self.sample_flows = SAMPLE_CONFIG["notification_flows"]
-        self.sample_logs = SAMPLE_LOGS.copy()
 
     @patch('functions.config.get_config')
-    @patch('functions.flow_stats.get_logs')
-    def test_get_flow_statistics_with_existing_flows(self, mock_get_logs, mock_get_config):
-        """Test get_flow_statistics with existing flows and logs"""
+    @patch('functions.flow_stats.get_flow_run_stats')
+    def test_get_flow_statistics_with_existing_flows(self, mock_run_stats, mock_get_config):
+        """Test get_flow_statistics with existing flows and run stats"""
         mock_get_config.return_value = SAMPLE_CONFIG
-        mock_get_logs.return_value = self.sample_logs
+        mock_run_stats.return_value = _aggregate([
+            _event("Sonarr Downloads", "webhook", "sent", ts=1000),
+            _event("Sonarr Downloads", "webhook", "failed", http_status=429, ts=2000)
+        ])
         
         stats = get_flow_statistics()
         
@@ -47,13 +71,16 @@ class TestFlowStats(unittest.TestCase):
         self.assertEqual(sonarr_stats.get("active"), True)
         self.assertEqual(sonarr_stats.get("trigger_type"), "webhook")
         self.assertEqual(sonarr_stats.get("category"), "Media")
+        self.assertEqual(sonarr_stats.get("webhook_runs"), 2)
+        self.assertEqual(sonarr_stats.get("failed_runs"), 1)
+        self.assertEqual(sonarr_stats.get("first_run"), format_ts(1000))
 
     @patch('functions.config.get_config')
-    @patch('functions.flow_stats.get_logs')
-    def test_get_flow_statistics_no_logs(self, mock_get_logs, mock_get_config):
-        """Test get_flow_statistics with no logs (new flows)"""
+    @patch('functions.flow_stats.get_flow_run_stats')
+    def test_get_flow_statistics_no_runs(self, mock_run_stats, mock_get_config):
+        """Test get_flow_statistics with no runs (new flows)"""
         mock_get_config.return_value = SAMPLE_CONFIG
-        mock_get_logs.return_value = []
+        mock_run_stats.return_value = {}
         
         stats = get_flow_statistics()
         
@@ -64,249 +91,93 @@ class TestFlowStats(unittest.TestCase):
             self.assertEqual(flow_stats["successful_runs"], 0)
             self.assertEqual(flow_stats["failed_runs"], 0)
             self.assertIsNone(flow_stats["first_run"])
-            self.assertIsNone(flow_stats["last_run"])
-
-    def test_get_flow_usage_from_logs_various_messages(self):
-        """Test get_flow_usage_from_logs with various log messages"""
-        test_logs = [
-            {
-                "timestamp": "2024-01-15 14:30:00",
-                "message": "✅ Notification sent for flow 'Sonarr Downloads'",
-                "category": "Notifications"
-            },
-            {
-                "timestamp": "2024-01-15 14:25:00", 
-                "message": "⏰ Timer triggered for flow 'Server Monitoring'",
-                "category": "Timers"
-            },
-            {
-                "timestamp": "2024-01-15 14:20:00",
-                "message": "🔄 Change detected for 'Server Monitoring': status changed",
-                "category": "Change Detection"
-            },
-            {
-                "timestamp": "2024-01-15 14:15:00",
-                "message": "🌐 Incoming webhook for flow 'Sonarr Downloads'",
-                "category": "Webhooks"
-            },
-            {
-                "timestamp": "2024-01-15 14:10:00",
-                "message": "❌ Failed to send notification for flow 'GitHub Releases'",
-                "category": "Errors"
-            },
-            {
-                "timestamp": "2024-01-15 14:05:00",
-                "message": "🧪 Test notification sent for flow 'GitHub Releases'",
-                "category": "Testing"
-            }
-        ]
-        
-        stats = get_flow_usage_from_logs(test_logs)
-        
-        # Check Sonarr Downloads stats
-        sonarr_stats = stats.get("Sonarr Downloads", {})
-        self.assertEqual(sonarr_stats["total_runs"], 2)  # 1 notification + 1 webhook
-        self.assertEqual(sonarr_stats["webhook_runs"], 1)
-        self.assertEqual(sonarr_stats["successful_runs"], 1)
-        
-        # Check Server Monitoring stats
-        server_stats = stats.get("Server Monitoring", {})
-        self.assertEqual(server_stats["total_runs"], 2)  # 1 timer + 1 change
-        self.assertEqual(server_stats["timer_runs"], 1)
-        self.assertEqual(server_stats["change_runs"], 1)
-        
-        # Check GitHub Releases stats
-        github_stats = stats.get("GitHub Releases", {})
-        self.assertEqual(github_stats["total_runs"], 2)  # 1 failed + 1 test
-        self.assertEqual(github_stats["failed_runs"], 1)
-        self.assertEqual(github_stats["test_runs"], 1)
 
-    def test_extract_flow_name_from_message_various_patterns(self):
-        """Test extract_flow_name_from_message with various message patterns"""
-        test_cases = [
-            ("✅ Notification sent for flow 'Test Flow'", "Test Flow"),
-            ("⏰ Timer triggered for flow 'Server Monitoring'", "Server Monitoring"),
-            ("🔄 Change detected for 'API Monitor': value changed", "API Monitor"),
-            ("🌐 Incoming webhook for flow 'Sonarr Downloads'", "Sonarr Downloads"),
-            ("❌ Failed to send notification for flow 'GitHub'", "GitHub"),
-            ("🧪 Test notification sent for flow 'Test'", "Test"),
-            ("Random message without flow name", None),
-            ("Flow mentioned but no quotes", None)
-        ]
-        
-        for message, expected in test_cases:
-            with self.subTest(message=message):
-                result = extract_flow_name_from_message(message)
-                self.assertEqual(result, expected)
-
-    def test_update_flow_stats_new_flow(self):
-        """Test update_flow_stats with new flow (no existing stats)"""
-        flow_stats = {}
-        flow_name = "New Flow"
-        trigger_type = "timer"
-        timestamp = "2024-01-15 14:30:00"
-        
-        update_flow_stats(flow_stats, flow_name, trigger_type, timestamp)
-        
-        self.assertIn(flow_name, flow_stats)
-        stats = flow_stats[flow_name]
-        self.assertEqual(stats["total_runs"], 1)
-        self.assertEqual(stats["timer_runs"], 1)
-        self.assertEqual(stats["first_run"], timestamp)
-        self.assertEqual(stats["last_run"], timestamp)
-
-    def test_update_flow_stats_existing_flow(self):
-        """Test update_flow_stats with existing flow stats"""
-        flow_stats = {
-            "Existing Flow": {
-                "total_runs": 5,
-                "timer_runs": 3,
-                "webhook_runs": 2,
-                "first_run": "2024-01-14 10:00:00",
-                "last_run": "2024-01-15 12:00:00"
-            }
-        }
+    def test_display_run_stats(self):
+        """Test converting aggregated run stats for display"""
+        run_stats = _aggregate([
+            _event("Server Monitoring", "timer", "sent", ts=3000),
+            _event("Server Monitoring", "change", "skipped", ts=4000)
+        ])["Server Monitoring"]
         
-        flow_name = "Existing Flow"
-        trigger_type = "webhook"
-        timestamp = "2024-01-15 14:30:00"
+        stats = display_run_stats(run_stats)
         
-        update_flow_stats(flow_stats, flow_name, trigger_type, timestamp)
-        
-        stats = flow_stats[flow_name]
-        self.assertEqual(stats["total_runs"], 6)
-        self.assertEqual(stats["timer_runs"], 3)
-        self.assertEqual(stats["webhook_runs"], 3)
-        self.assertEqual(stats["first_run"], "2024-01-14 10:00:00")  # Unchanged
-        self.assertEqual(stats["last_run"], timestamp)  # Updated
-
-    def test_update_flow_stats_various_trigger_types(self):
-        """Test update_flow_stats with various trigger types"""
-        flow_stats = {}
-        flow_name = "Test Flow"
-        
-        trigger_types = ["timer", "webhook", "change", "test", "unknown"]
-        
-        for trigger_type in trigger_types:
-            update_flow_stats(flow_stats, flow_name, trigger_type, "2024-01-15 14:30:00")
-        
-        stats = flow_stats[flow_name]
-        self.assertEqual(stats["total_runs"], 5)
+        self.assertEqual(stats["total_runs"], 2)
         self.assertEqual(stats["timer_runs"], 1)
-        self.assertEqual(stats["webhook_runs"], 1)
         self.assertEqual(stats["change_runs"], 1)
-        self.assertEqual(stats["test_runs"], 1)
+        self.assertEqual(stats["skipped_runs"], 1)
+        self.assertEqual(stats["first_run"], format_ts(3000))
+        self.assertEqual(stats["last_run"], format_ts(4000))
+        self.assertNotIn("first_ts", stats)
 
-    @patch('functions.flow_stats.get_logs')
-    def test_get_flow_success_rate_with_logs(self, mock_get_logs):
-        """Test get_flow_success_rate with success and failure logs"""
-        test_logs = [
-            {
-                "message": "✅ Notification sent for flow 'Test Flow'",
-                "category": "Notifications"
-            },
-            {
-                "message": "✅ Notification sent for flow 'Test Flow'",
-                "category": "Notifications"
-            },
-            {
-                "message": "❌ Failed to send notification for flow 'Test Flow'",
-                "category": "Errors"
-            },
-            {
-                "message": "✅ Notification sent for flow 'Other Flow'",
-                "category": "Notifications"
-            }
-        ]
-        mock_get_logs.return_value = test_logs
+    @patch('functions.flow_stats.get_flow_run_stats')
+    def test_get_flow_success_rate_with_runs(self, mock_run_stats):
+        """Test get_flow_success_rate with successful and failed runs"""
+        mock_run_stats.return_value = _aggregate([
+            _event("Test Flow", "timer", "sent"),
+            _event("Test Flow", "timer", "sent"),
+            _event("Test Flow", "timer", "failed", http_status=500),
+            _event("Test Flow", "timer", "skipped")
+        ])["Test Flow"]
         
         success_rate = get_flow_success_rate("Test Flow")
         
-        # 2 successes out of 3 total = 66.67%
+        # 2 successes out of 3 sends = 66.67%; skipped runs don't count
         self.assertAlmostEqual(success_rate, 66.67, places=1)
+        mock_run_stats.assert_called_once_with("Test Flow")
 
-    @patch('functions.flow_stats.get_logs')
-    def test_get_flow_success_rate_no_runs(self, mock_get_logs):
+    @patch('functions.flow_stats.get_flow_run_stats')
+    def test_get_flow_success_rate_no_runs(self, mock_run_stats):
         """Test get_flow_success_rate for flow with no runs"""
-        mock_get_logs.return_value = []
+        mock_run_stats.return_value = empty_run_stats()
         
         success_rate = get_flow_success_rate("Nonexistent Flow")
         
         self.assertEqual(success_rate, 0.0)
 
-    @patch('functions.flow_stats.get_logs')
-    def test_get_flow_success_rate_all_success(self, mock_get_logs):
+    @patch('functions.flow_stats.get_flow_run_stats')
+    def test_get_flow_success_rate_all_success(self, mock_run_stats):
         """Test get_flow_success_rate for flow with 100% success"""
-        test_logs = [
-            {
-                "message": "✅ Notification sent for flow 'Perfect Flow'",
-                "category": "Notifications"
-            },
-            {
-                "message": "✅ Notification sent for flow 'Perfect Flow'",
-                "category": "Notifications"
-            }
-        ]
-        mock_get_logs.return_value = test_logs
+        mock_run_stats.return_value = _aggregate([
+            _event("Perfect Flow", "webhook", "sent"),
+            _event("Perfect Flow", "webhook", "sent")
+        ])["Perfect Flow"]
         
         success_rate = get_flow_success_rate("Perfect Flow")
         
         self.assertEqual(success_rate, 100.0)
 
-    @patch('functions.flow_stats.get_logs')
-    def test_get_recent_flow_activity_default_hours(self, mock_get_logs):
+    @patch('functions.flow_stats.get_events')
+    def test_get_recent_flow_activity_default_hours(self, mock_get_events):
         """Test get_recent_flow_activity with default 24 hours"""
-        now = datetime.now()
-        recent_time = now - timedelta(hours=12)
-        old_time = now - timedelta(hours=30)
-        
-        test_logs = [
-            {
-                "timestamp": recent_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "message": "✅ Notification sent for flow 'Recent Flow'",
-                "category": "Notifications"
-            },
-            {
-                "timestamp": old_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "message": "✅ Notification sent for flow 'Old Flow'",
-                "category": "Notifications"
-            }
-        ]
-        mock_get_logs.return_value = test_logs
+        now = time.time()
+        mock_get_events.side_effect = _events_of([
+            _event("Old Flow", "timer", "sent", ts=(now - 30 * 3600) * 1000),
+            _event("Recent Flow", "timer", "sent", http_status=204, latency_ms=120, ts=(now - 12 * 3600) * 1000)
+        ])
         
         recent_activity = get_recent_flow_activity()
         
         # Should only include recent activity
-        self.assertIn("Recent Flow", [item["flow_name"] for item in recent_activity])
-        self.assertNotIn("Old Flow", [item["flow_name"] for item in recent_activity])
+        self.assertEqual(list(recent_activity), ["Recent Flow"])
+        activity = recent_activity["Recent Flow"][0]
+        self.assertEqual(activity["type"], "timer")
+        self.assertEqual(activity["message"], "sent, HTTP 204, 120 ms")
 
-    @patch('functions.flow_stats.get_logs')
-    def test_get_recent_flow_activity_custom_hours(self, mock_get_logs):
-        """Test get_recent_flow_activity with custom time range"""
-        now = datetime.now()
-        within_range = now - timedelta(hours=6)
-        outside_range = now - timedelta(hours=15)
-        
-        test_logs = [
-            {
-                "timestamp": within_range.strftime("%Y-%m-%d %H:%M:%S"),
-                "message": "✅ Notification sent for flow 'Within Range'",
-                "category": "Notifications"
-            },
-            {
-                "timestamp": outside_range.strftime("%Y-%m-%d %H:%M:%S"),
-                "message": "✅ Notification sent for flow 'Outside Range'",
-                "category": "Notifications"
-            }
-        ]
-        mock_get_logs.return_value = test_logs
+    @patch('functions.flow_stats.get_events')
+    def test_get_recent_flow_activity_custom_hours(self, mock_get_events):
+        """Test get_recent_flow_activity with custom time range, newest first"""
+        now = time.time()
+        mock_get_events.side_effect = _events_of([
+            _event("Outside Range", "timer", "sent", ts=(now - 15 * 3600) * 1000),
+            _event("Within Range", "change", "sent", ts=(now - 6 * 3600) * 1000),
+            _event("Within Range", "change", "failed", ts=(now - 1 * 3600) * 1000)
+        ])
         
         recent_activity = get_recent_flow_activity(hours=12)
         
         # Should only include activity within 12 hours
-        flow_names = [item["flow_name"] for item in recent_activity]
-        self.assertIn("Within Range", flow_names)
-        self.assertNotIn("Outside Range", flow_names)
+        self.assertNotIn("Outside Range", recent_activity)
+        self.assertEqual([a["outcome"] for a in recent_activity["Within Range"]], ["failed", "sent"])
 
     @patch('functions.config.get_config')
     def test_export_flow_config_single_flow(self, mock_get_config):
@@ -458,49 +329,5 @@ class TestFlowStats(unittest.TestCase):
         # Should create "Sonarr Downloads (Copy 2)"
         self.assertIn("(Copy 2)", result["new_name"])
 
-    def test_flow_stats_edge_cases(self):
-        """Test edge cases in flow statistics"""
-        # Empty logs
-        stats = get_flow_usage_from_logs([])
-        self.assertEqual(stats, {})
-        
-        # Logs with no flow names
-        logs_no_flows = [
-            {"message": "General system message", "timestamp": "2024-01-15 14:30:00"}
-        ]
-        stats = get_flow_usage_from_logs(logs_no_flows)
-        self.assertEqual(stats, {})
-        
-        # Malformed timestamp handling
-        logs_bad_timestamp = [
-            {
-                "message": "✅ Notification sent for flow 'Test'",
-                "timestamp": "invalid-timestamp"
-            }
-        ]
-        # Should not crash
-        stats = get_flow_usage_from_logs(logs_bad_timestamp)
-        self.assertIsInstance(stats, dict)
-
-    def test_performance_large_dataset(self):
-        """Test performance with large number of logs"""
-        # Create large log dataset
-        large_logs = []
-        for i in range(1000):
-            large_logs.append({
-                "timestamp": f"2024-01-15 {i//60:02d}:{i%60:02d}:00",
-                "message": f"✅ Notification sent for flow 'Flow {i % 10}'",
-                "category": "Notifications"
-            })
-        
-        # Should complete without timeout
-        stats = get_flow_usage_from_logs(large_logs)
-        
-        # Should have stats for 10 different flows
-        self.assertEqual(len(stats), 10)
-        # Each flow should have 100 runs
-        for flow_name, flow_stats in stats.items():
-            self.assertEqual(flow_stats["total_runs"], 100)
-
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Comprehensive tests for functions/journal.py module.
+Tests journaling, replaying onto the stored state and failed flushes.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.journal import Journal
+
+def _add(state, op):
+    state['count'] += op
+
+class TestJournal(unittest.TestCase):
+    """Test suite for the Journal class"""
+
+    def setUp(self):
+        """Keep the stored state in a dict; locks go to a temp dir"""
+        self.test_dir = tempfile.mkdtemp()
+        self.target = ('json', os.path.join(self.test_dir, 'state.json'))
+        self.stored = {'count': 10}
+        self.loads = 0
+        self.fail_store = False
+        self.journal = Journal(self._load, self._store, _add)
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _load(self, target):
+        self.loads += 1
+        return dict(self.stored)
+
+    def _store(self, target, state):
+        if self.fail_store:
+            raise OSError('disk full')
+        self.stored = dict(state)
+
+    def test_record_updates_live_state(self):
+        """Test that operations apply in memory and nothing is stored before a replay"""
+        with self.journal.lock:
+            self.journal.record(self.target, 1)
+            state = self.journal.record(self.target, 2)
+
+        self.assertEqual(state, {'count': 13})
+        self.assertEqual(self.stored, {'count': 10})
+        self.assertEqual(self.loads, 1)
+
+    def test_replay_adds_up_with_other_workers(self):
+        """Test that a replay applies only this process's operations to what is stored"""
+        with self.journal.lock:
+            self.journal.record(self.target, 5)
+        # Another worker flushed in the meantime
+        self.stored = {'count': 100}
+
+        self.journal.replay(self.target)
+
+        self.assertEqual(self.stored, {'count': 105})
+        with self.journal.lock:
+            self.assertEqual(self.journal.get(self.target), {'count': 105})
+        self.journal.replay(self.target)
+        self.assertEqual(self.stored, {'count': 105})
+
+    def test_failed_replay_keeps_operations(self):
+        """Test that operations survive a failed store and go out with the next replay"""
+        with self.journal.lock:
+            self.journal.record(self.target, 1)
+        self.fail_store = True
+        with self.assertRaises(OSError):
+            self.journal.replay(self.target)
+        with self.journal.lock:
+            self.journal.record(self.target, 2)
+        self.fail_store = False
+
+        self.journal.replay(self.target)
+
+        self.assertEqual(self.stored, {'count': 13})
+
+    def test_clear(self):
+        """Test that clearing drops the live state so the next read loads again"""
+        with self.journal.lock:
+            self.journal.get(self.target)
+        self.journal.clear()
+        with self.journal.lock:
+            self.journal.get(self.target)
+
+        self.assertEqual(self.loads, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Comprehensive tests for functions/live_tail.py module.
+Tests the in-process feed behind the /api/logs/stream live tail.
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch, Mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.live_tail import LiveFeed, matches, get_live_feed
+from functions.config import queue_log, flush_logs
+from functions.utils import log_notification_sent, flush_notification_logs
+from functions.notifications import send_discord_notification
+from functions.events import clear_event_cache
+from functions.counters import clear_counter_cache
+from functions.flow_aggregates import clear_flow_stats_cache
+from functions.rollups import clear_rollup_cache
+from test_data import DataDirTestCase
+
+class TestLiveFeed(unittest.TestCase):
+    """Test suite for live_tail.py functions"""
+
+    def test_read_after(self):
+        """Test that readers get the items after the id they have seen, in order"""
+        feed = LiveFeed()
+        first = feed.publish('log', {'message': 'a'})
+        feed.publish('delivery', {'flow_name': 'A'})
+
+        self.assertEqual(feed.read_after(first), [(first + 1, 'delivery', {'flow_name': 'A'})])
+        self.assertEqual(len(feed.read_after(0)), 2)
+        self.assertEqual(feed.read_after(first + 1, timeout=0.01), [])
+
+    def test_history_is_bounded(self):
+        """Test that a reader far behind gets what is still kept"""
+        feed = LiveFeed(history=3)
+        for i in range(5):
+            feed.publish('log', {'message': str(i)})
+
+        self.assertEqual([item['message'] for _, _, item in feed.read_after(1)], ['2', '3', '4'])
+        self.assertEqual(feed.get_stats(), {'last_event_id': 5, 'history': 3})
+
+    def test_resume_id(self):
+        """Test Last-Event-ID handling: known ids resume, missing or unknown ones start at the end"""
+        feed = LiveFeed()
+        for i in range(3):
+            feed.publish('log', {})
+
+        self.assertEqual(feed.resume_id(1), 1)
+        self.assertEqual(feed.resume_id(None), 3)
+        self.assertEqual(feed.resume_id(99), 3)
+        self.assertEqual(feed.resume_id(-1), 3)
+
+    def test_reader_wakes_up_on_publish(self):
+        """Test that a waiting reader returns as soon as something is published"""
+        feed = LiveFeed()
+        timer = threading.Timer(0.05, feed.publish, args=('log', {'message': 'late'}))
+        timer.start()
+        started = time.monotonic()
+
+        items = feed.read_after(0, timeout=5)
+        self.assertEqual(items[0][2], {'message': 'late'})
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_matches(self):
+        """Test category and flow filters per kind"""
+        log = {'message': "✅ Notification sent for flow 'Radarr Grabs'", 'category': 'Notifications'}
+        self.assertTrue(matches('log', log, category='Notifications', flow='radarr grabs'))
+        self.assertFalse(matches('log', log, category='Errors'))
+        self.assertFalse(matches('log', log, flow='Sonarr'))
+        self.assertTrue(matches('delivery', {'flow_name': 'Sonarr'}, category='Errors', flow='Sonarr'))
+        self.assertFalse(matches('notification', {'flow_name': 'Radarr'}, flow='Sonarr'))
+
+class TestPublishers(DataDirTestCase):
+    """Test that logs and sent notifications are published as they are written"""
+
+    data_config = {}
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        flush_logs()
+        flush_notification_logs()
+        clear_event_cache()
+        clear_counter_cache()
+        clear_flow_stats_cache()
+        clear_rollup_cache()
+        super().tearDown()
+
+    def test_logs_and_notifications_are_published(self):
+        """Test the log and notification items"""
+        feed = get_live_feed()
+        after = feed.resume_id(None)
+        queue_log({'timestamp': '2024-01-15 10:00:00', 'message': 'hello', 'category': 'General'}, 100)
+        log_notification_sent('Flow', 'Sent!')
+
+        items = feed.read_after(after)
+        self.assertEqual([(kind, item.get('message') or item.get('message_content')) for _, kind, item in items],
+                         [('log', 'hello'), ('notification', 'Sent!')])
+
+    @patch('functions.notifications.requests.post')
+    def test_deliveries_are_published(self, mock_post):
+        """Test that delivery outcomes are published with their event fields"""
+        mock_post.return_value = Mock(status_code=429, text='rate limited')
+        feed = get_live_feed()
+        after = feed.resume_id(None)
+        flow = {'name': 'Radarr Grabs', 'webhook_url': 'https://discord.test/webhook', 'message_template': 'x'}
+        send_discord_notification('x', flow, {}, trigger='webhook')
+
+        deliveries = [item for _, kind, item in feed.read_after(after) if kind == 'delivery']
+        self.assertEqual([(d['flow_name'], d['outcome'], d['http_status']) for d in deliveries],
+                         [('Radarr Grabs', 'failed', 429)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+"""
+Comprehensive tests for functions/log_buffer.py module.
+Tests the in-memory ring buffer of recent logs and the config.py API on top of it.
+"""
+
+import unittest
+import os
+import json
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.log_buffer import LogRingBuffer, encode_cursor, decode_cursor
+from functions.config import (
+    queue_log, flush_logs, get_logs, get_recent_logs, get_log_categories, get_log_count,
+    get_log_stats, save_logs, query_logs, logs_truncated
+)
+from test_data import SAMPLE_LOGS, DataDirTestCase
+
+def _entry(i, category='General'):
+    return {'timestamp': f'2024-01-15 10:00:{i:02d}', 'message': f'log {i}', 'category': category}
+
+class TestLogRingBuffer(unittest.TestCase):
+    """Test suite for log_buffer.py functions"""
+
+    def test_keeps_only_the_newest_entries(self):
+        """Test that the buffer evicts the oldest entries once full"""
+        buffer = LogRingBuffer(3)
+        for i in range(5):
+            buffer.append(_entry(i))
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual([e['message'] for e in buffer.newest()], ['log 4', 'log 3', 'log 2'])
+        self.assertEqual([e['message'] for e in buffer.oldest_first(2)], ['log 3', 'log 4'])
+
+    def test_truncated_once_entries_are_dropped(self):
+        """Test that the buffer reports dropped entries, unless a time range starts after them"""
+        buffer = LogRingBuffer(3, [dict(_entry(i), ts=i) for i in range(2)])
+        self.assertFalse(buffer.truncated())
+        buffer.append(dict(_entry(2), ts=2))
+        buffer.append(dict(_entry(3), ts=3))
+
+        self.assertTrue(buffer.truncated())
+        self.assertTrue(buffer.truncated(since=0))
+        self.assertFalse(buffer.truncated(since=1))
+        buffer.replace([])
+        self.assertFalse(buffer.truncated())
+
+    def test_category_counts_follow_evictions(self):
+        """Test that per-category counts are updated as entries fall out"""
+        buffer = LogRingBuffer(3)
+        buffer.append(_entry(0, 'Errors'))
+        buffer.append(_entry(1, 'Timers'))
+        buffer.append(_entry(2, 'Timers'))
+        buffer.append(_entry(3, 'Webhooks'))
+
+        self.assertEqual(buffer.stats()['category_counts'], {'Timers': 2, 'Webhooks': 1})
+        self.assertEqual(buffer.categories(), ['Timers', 'Webhooks'])
+
+    def test_category_filter_newest_first(self):
+        """Test filtered slices"""
+        buffer = LogRingBuffer(10, [_entry(i, 'Errors' if i % 2 else 'General') for i in range(6)])
+
+        self.assertEqual([e['message'] for e in buffer.newest(2, 'Errors')], ['log 5', 'log 3'])
+        self.assertEqual(buffer.newest(category='Missing'), [])
+
+    def test_stats(self):
+        """Test stats overall and for one category"""
+        buffer = LogRingBuffer(10, [_entry(1, 'Errors'), _entry(2), _entry(3, 'Errors')])
+
+        stats = buffer.stats('Errors')
+        self.assertEqual(stats['total_logs'], 2)
+        self.assertEqual(stats['oldest_log'], '2024-01-15 10:00:01')
+        self.assertEqual(stats['newest_log'], '2024-01-15 10:00:03')
+        self.assertEqual(stats['category_counts'], {'Errors': 2, 'General': 1})
+        self.assertEqual(LogRingBuffer(5).stats()['total_logs'], 0)
+
+    def test_resize_and_replace(self):
+        """Test shrinking the buffer and replacing its contents"""
+        buffer = LogRingBuffer(5, [_entry(i) for i in range(5)])
+        buffer.resize(2)
+
+        self.assertEqual([e['message'] for e in buffer.oldest_first()], ['log 3', 'log 4'])
+        buffer.replace([_entry(7, 'Errors')])
+        self.assertEqual(buffer.stats()['category_counts'], {'Errors': 1})
+
+class TestLogQuery(unittest.TestCase):
+    """Test suite for cursor-paginated log queries"""
+
+    def _pages(self, buffer, limit, **filters):
+        pages, cursor = [], None
+        while True:
+            page, cursor = buffer.query(limit, cursor=cursor, **filters)
+            pages.append([e['message'] for e in page])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_everything_once(self):
+        """Test that following the cursors returns every entry once, newest first"""
+        buffer = LogRingBuffer(100, [dict(_entry(i), ts=i // 3) for i in range(10)])
+
+        pages = self._pages(buffer, 4)
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual(sum(pages, []), [e['message'] for e in buffer.newest()])
+
+    def test_cursor_survives_new_and_evicted_entries(self):
+        """Test that a cursor still points at the same place after the buffer moved on"""
+        buffer = LogRingBuffer(6, [dict(_entry(i), ts=i) for i in range(6)])
+        page, cursor = buffer.query(2)
+        self.assertEqual([e['message'] for e in page], ['log 5', 'log 4'])
+
+        buffer.append(dict(_entry(6), ts=6))
+        buffer.append(dict(_entry(7), ts=7))
+        page, cursor = buffer.query(2, cursor=cursor)
+        self.assertEqual([e['message'] for e in page], ['log 3', 'log 2'])
+        self.assertIsNone(cursor)
+
+    def test_filters(self):
+        """Test category, time range and search filters, alone and with paging"""
+        entries = [dict(_entry(i, 'Errors' if i % 2 else 'General'), ts=i * 1000) for i in range(10)]
+        entries[7]['message'] = 'Webhook FAILED'
+        buffer = LogRingBuffer(100, entries)
+
+        self.assertEqual(self._pages(buffer, 2, category='Errors'),
+                         [['log 9', 'Webhook FAILED'], ['log 5', 'log 3'], ['log 1']])
+        self.assertEqual(buffer.query(10, since=3000, until=6000)[0],
+                         [entries[5], entries[4], entries[3]])
+        self.assertEqual(buffer.query(10, search='failed')[0], [entries[7]])
+        self.assertEqual(buffer.query(10, category='Missing'), ([], None))
+
+    def test_invalid_cursor(self):
+        """Test that malformed cursors are rejected"""
+        self.assertEqual(decode_cursor(encode_cursor(1705329000000, 2)), (1705329000000, 2))
+        for cursor in ('not a cursor', encode_cursor(1, -1), '!!'):
+            with self.assertRaises(ValueError):
+                LogRingBuffer(5).query(cursor=cursor)
+
+class TestLogBufferBackedApi(DataDirTestCase):
+    """Test that config.py serves logs from the buffer"""
+
+    data_config = {'log_retention': 4}
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        flush_logs()
+        super().tearDown()
+
+    def test_warm_start_from_disk(self):
+        """Test that existing logs are loaded once, up to log_retention"""
+        with open(os.path.join(self.test_dir, 'notification_logs.json'), 'w') as f:
+            json.dump(SAMPLE_LOGS, f)
+
+        self.assertEqual(get_logs(), SAMPLE_LOGS[-4:])
+        self.assertEqual(get_log_count(), 4)
+
+    def test_queued_entries_are_served_without_disk_reads(self):
+        """Test that reads after the warm-up don't touch the log files"""
+        get_logs()
+        for i in range(6):
+            queue_log(_entry(i, 'Errors' if i == 5 else 'General'), 4)
+
+        with patch('functions.config._read_stored_logs') as read_stored:
+            self.assertEqual([e['message'] for e in get_recent_logs(2)], ['log 5', 'log 4'])
+            self.assertEqual(get_log_categories(), ['Errors', 'General'])
+            self.assertEqual(get_log_stats()['category_counts'], {'Errors': 1, 'General': 3})
+            self.assertEqual(get_log_stats('Errors')['total_logs'], 1)
+        read_stored.assert_not_called()
+
+    def test_query_logs(self):
+        """Test paging through the logs through config.py"""
+        for i in range(4):
+            queue_log(dict(_entry(i), ts=i), 4)
+
+        page, cursor = query_logs(3)
+        self.assertEqual([e['message'] for e in page], ['log 3', 'log 2', 'log 1'])
+        self.assertEqual([e['message'] for e in query_logs(3, cursor=cursor)[0]], ['log 0'])
+
+    def test_logs_truncated_past_retention(self):
+        """Test that entries past log_retention are reported as dropped"""
+        for i in range(4):
+            queue_log(dict(_entry(i), ts=i), 4)
+        self.assertFalse(logs_truncated())
+
+        queue_log(dict(_entry(4), ts=4), 4)
+        self.assertTrue(logs_truncated())
+        self.assertFalse(logs_truncated(since=1))
+
+    def test_save_logs_replaces_buffer(self):
+        """Test that clearing the logs empties the buffer too"""
+        queue_log(_entry(1), 4)
+        save_logs([])
+
+        self.assertEqual(get_logs(), [])
+        flush_logs()
+        self.assertEqual(get_log_count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
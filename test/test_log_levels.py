@@ -0,0 +1,129 @@
+"""
+Comprehensive tests for functions/log_levels.py module.
+Tests log levels, the minimum stored level and summaries of repeated messages.
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import utils
+from functions.log_levels import LogRateLimiter, normalize_level, level_enabled, format_window, summarize
+from functions.config import flush_logs, get_logs
+from functions.utils import log_notification, flush_log_summaries, detect_log_level
+from test_data import DataDirTestCase
+
+class TestLogLevels(unittest.TestCase):
+    """Test suite for log_levels.py functions"""
+
+    def test_normalize_level(self):
+        """Test level names, aliases and fallbacks"""
+        self.assertEqual(normalize_level('WARNING'), 'warn')
+        self.assertEqual(normalize_level(' error '), 'error')
+        self.assertEqual(normalize_level('verbose'), 'info')
+        self.assertEqual(normalize_level(None, 'debug'), 'debug')
+
+    def test_level_enabled(self):
+        """Test comparison against the minimum level"""
+        self.assertTrue(level_enabled('error', 'warn'))
+        self.assertTrue(level_enabled('info', 'info'))
+        self.assertFalse(level_enabled('debug', 'info'))
+
+    def test_format_window(self):
+        """Test window descriptions used in summaries"""
+        self.assertEqual(format_window(3600), 'hour')
+        self.assertEqual(format_window(300), '5 minutes')
+        self.assertEqual(format_window(7200), '2 hours')
+        self.assertEqual(format_window(90), '90 seconds')
+
+    def test_rate_limiter_windows(self):
+        """Test that repeats within a window are counted and the window closes afterwards"""
+        limiter = LogRateLimiter()
+        self.assertEqual(limiter.hit('No change', 'A', 60, 'General', 'debug', now=0), (True, None))
+        self.assertEqual(limiter.hit('No change', 'A', 60, 'General', 'debug', now=30), (False, None))
+        self.assertEqual(limiter.hit('No change', 'B', 60, 'General', 'debug', now=30)[0], True)
+
+        first, closed = limiter.hit('No change', 'A', 60, 'General', 'debug', now=61)
+        self.assertTrue(first)
+        self.assertEqual(summarize(closed), "No change ×2 in last minute for flow 'A'")
+        self.assertEqual([w['flow'] for w in limiter.expired(now=95)], ['B'])
+        self.assertEqual(limiter.get_stats()['suppressed'], 1)
+
+class TestLogNotificationLevels(DataDirTestCase):
+    """Test levels and rate limiting in utils.log_notification"""
+
+    data_config = {'log_retention': 100, 'log_level': 'info', 'log_rate_limit_window': 3600}
+
+    def setUp(self):
+        """Start every test with an empty rate limiter"""
+        super().setUp()
+        utils._log_rate_limiter.clear()
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        utils._log_rate_limiter.clear()
+        flush_logs()
+        super().tearDown()
+
+    def messages(self):
+        return [entry['message'] for entry in get_logs()]
+
+    def test_detect_log_level(self):
+        """Test level detection from the message and category"""
+        self.assertEqual(detect_log_level('❌ Discord send error: timeout', 'Notifications'), 'error')
+        self.assertEqual(detect_log_level('API request error: boom', 'Errors'), 'error')
+        self.assertEqual(detect_log_level('⚠️ Slow response', 'API'), 'warn')
+        self.assertEqual(detect_log_level('System configuration updated', 'System'), 'info')
+
+    def test_entries_carry_their_level(self):
+        """Test that stored entries include the level"""
+        log_notification('System configuration updated')
+        log_notification('❌ Failed to send notification')
+
+        self.assertEqual([entry['level'] for entry in get_logs()], ['info', 'error'])
+
+    def test_levels_below_minimum_are_dropped(self):
+        """Test the configured minimum level"""
+        log_notification('Polling details', level='debug')
+        log_notification('Flow saved', level='info')
+
+        self.assertEqual(self.messages(), ['Flow saved'])
+
+    def test_repeats_are_summarized(self):
+        """Test that a keyed message is logged once per window and summarized"""
+        with patch('functions.log_levels.time.time', return_value=1000.0):
+            for _ in range(5):
+                log_notification("🔄 No change detected in flow 'Price'", key='No change detected', flow='Price')
+        self.assertEqual(self.messages(), ["🔄 No change detected in flow 'Price'"])
+
+        with patch('functions.log_levels.time.time', return_value=1000.0 + 3600):
+            flush_log_summaries()
+        self.assertEqual(self.messages()[-1], "No change detected ×5 in last hour for flow 'Price'")
+
+    def test_debug_repeats_are_summarized_at_info(self):
+        """Test that filtered debug repeats still leave one summary entry"""
+        with patch('functions.log_levels.time.time', return_value=0.0):
+            for _ in range(3600):
+                log_notification('🔄 No change detected', level='debug', key='No change detected', flow='X')
+        self.assertEqual(self.messages(), [])
+
+        with patch('functions.log_levels.time.time', return_value=3600.0):
+            log_notification('🔄 No change detected', level='debug', key='No change detected', flow='X')
+        logs = get_logs()
+        self.assertEqual([entry['message'] for entry in logs], ["No change detected ×3,600 in last hour for flow 'X'"])
+        self.assertEqual(logs[0]['level'], 'info')
+
+    def test_zero_window_logs_every_repeat(self):
+        """Test that rate limiting can be turned off"""
+        self.write_config({'log_retention': 100, 'log_rate_limit_window': 0})
+        for _ in range(3):
+            log_notification('Repeated', key='Repeated')
+
+        self.assertEqual(self.messages(), ['Repeated'] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Comprehensive tests for functions/log_search.py module.
+Tests the inverted index and full-text search over system logs and sent notifications.
+"""
+
+import unittest
+import os
+import json
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.log_search import SearchIndex, tokenize
+from functions.log_buffer import LogRingBuffer
+from functions.config import queue_log, flush_logs, save_logs, search_logs
+from functions.utils import (
+    log_notification_sent, flush_notification_logs, search_notification_logs, save_notification_logs,
+    count_notification_logs, notification_logs_truncated
+)
+from test_data import DataDirTestCase
+
+def _text(entry):
+    return entry['message']
+
+def _entry(i, message, category='General'):
+    return {'ts': i, 'timestamp': f'2024-01-15 10:00:{i % 60:02d}', 'message': message, 'category': category}
+
+class TestSearchIndex(unittest.TestCase):
+    """Test suite for log_search.py functions"""
+
+    def test_tokenize(self):
+        """Test lowercased word tokens, punctuation and emoji dropped"""
+        self.assertEqual(tokenize("❌ Radarr webhook failed: HTTP 429 (rate_limited)"),
+                         ['radarr', 'webhook', 'failed', 'http', '429', 'rate_limited'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_all_words_must_match(self):
+        """Test AND semantics, newest first"""
+        index = SearchIndex(10, _text, [
+            {'message': 'Radarr sent 204'},
+            {'message': 'Radarr failed 429'},
+            {'message': 'Sonarr failed 429'},
+            {'message': 'radarr FAILED again, 429'},
+        ])
+
+        self.assertEqual([e['message'] for e in index.search('radarr 429')],
+                         ['radarr FAILED again, 429', 'Radarr failed 429'])
+        self.assertEqual(index.search('radarr 429', limit=1), [{'message': 'radarr FAILED again, 429'}])
+        self.assertEqual(index.search('lidarr'), [])
+        self.assertEqual(index.search('  '), [])
+
+    def test_forgets_oldest_entries(self):
+        """Test that entries beyond capacity stop matching, also after the posting lists are pruned"""
+        index = SearchIndex(3, _text)
+        for i in range(2500):
+            index.add({'message': f'flow {i % 2} run {i}'})
+
+        self.assertEqual([e['message'] for e in index.search('flow 0')], ['flow 0 run 2498'])
+        self.assertEqual(index.search('run 5'), [])
+        self.assertEqual(index.get_stats()['entries'], 3)
+        self.assertLess(index.get_stats()['tokens'], 1100)
+
+    def test_filters_and_time_range(self):
+        """Test the match filter and time bounds"""
+        index = SearchIndex(10, _text, [_entry(i, f'Price Watch check {i}', 'Errors' if i % 2 else 'General')
+                                        for i in range(6)])
+
+        results = index.search('price watch', match=lambda e: e['category'] == 'Errors', since=2, until=5)
+        self.assertEqual([e['ts'] for e in results], [3])
+
+    def test_truncated(self):
+        """Test that an index reports forgotten entries older than a time range start"""
+        index = SearchIndex(2, _text, [_entry(1, 'a')])
+        self.assertFalse(index.truncated())
+        index.add(_entry(2, 'b'))
+        index.add(_entry(3, 'c'))
+
+        self.assertTrue(index.truncated())
+        self.assertTrue(index.truncated(since=1))
+        self.assertFalse(index.truncated(since=2))
+        # A warm-up read that fills the index may have been cut as well
+        self.assertTrue(SearchIndex(2, _text, [_entry(1, 'a'), _entry(2, 'b')]).truncated())
+
+    def test_replace_and_resize(self):
+        """Test replacing and shrinking the index"""
+        index = SearchIndex(5, _text, [{'message': 'old entry'}])
+        index.replace([{'message': 'new entry'}, {'message': 'newer entry'}])
+        self.assertEqual([e['message'] for e in index.search('entry')], ['newer entry', 'new entry'])
+
+        index.resize(1)
+        self.assertEqual([e['message'] for e in index.search('entry')], ['newer entry'])
+
+    def test_log_buffer_search(self):
+        """Test that the log buffer keeps its index in step and filters by category and flow"""
+        buffer = LogRingBuffer(3, [_entry(0, "❌ Failed to send for flow 'Radarr Grabs'", 'Errors')])
+        buffer.append(_entry(1, "✅ Notification sent for flow 'Radarr Grabs'", 'Notifications'))
+        buffer.append(_entry(2, "❌ Failed to send for flow 'Sonarr'", 'Errors'))
+
+        self.assertEqual(len(buffer.search('failed')), 2)
+        self.assertEqual([e['ts'] for e in buffer.search('flow', category='Errors', flow='radarr grabs')], [0])
+        buffer.append(_entry(3, 'unrelated'))
+        self.assertEqual([e['ts'] for e in buffer.search('failed')], [2])
+
+class TestHistorySearch(DataDirTestCase):
+    """Test searching the stored logs and sent notifications"""
+
+    data_config = {'log_retention': 100, 'notification_log_retention': 2}
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        flush_logs()
+        flush_notification_logs()
+        super().tearDown()
+
+    def test_search_logs(self):
+        """Test that queued logs are searchable right away and a clear empties the index"""
+        queue_log(_entry(1, "❌ Radarr webhook returned 429", 'Errors'), 100)
+        queue_log(_entry(2, "✅ Radarr notification sent", 'Notifications'), 100)
+
+        self.assertEqual([e['ts'] for e in search_logs('radarr 429')], [1])
+        save_logs([])
+        self.assertEqual(search_logs('radarr'), [])
+
+    def test_search_notifications(self):
+        """Test searching the message and embed of sent notifications, warm from disk and live"""
+        with open(self.notification_log_file, 'w') as f:
+            json.dump([{'ts': 1, 'flow_name': 'Radarr Grabs', 'message_content': 'Grabbed Dune',
+                        'embed_info': None, 'category': 'Notifications'}], f)
+
+        self.assertEqual(len(search_notification_logs('dune')), 1)
+        log_notification_sent('Sonarr', 'New episode', {'title': 'Dune: Prophecy', 'description': 'S01E01'})
+        self.assertEqual([e['flow_name'] for e in search_notification_logs('dune')], ['Sonarr', 'Radarr Grabs'])
+        self.assertEqual([e['flow_name'] for e in search_notification_logs('dune', flow='Radarr Grabs')],
+                         ['Radarr Grabs'])
+
+        # notification_log_retention is 2
+        self.assertFalse(notification_logs_truncated())
+        log_notification_sent('Lidarr', 'New album')
+        self.assertEqual([e['flow_name'] for e in search_notification_logs('dune')], ['Sonarr'])
+        self.assertTrue(notification_logs_truncated())
+        save_notification_logs([])
+        self.assertEqual(search_notification_logs('album'), [])
+
+    def test_count_notifications(self):
+        """Test counting the retained sent-notification records, in all and from a time on"""
+        with open(self.notification_log_file, 'w') as f:
+            json.dump([{'ts': 1, 'flow_name': 'Old', 'message_content': 'a'},
+                       {'ts': 5, 'flow_name': 'New', 'message_content': 'b'}], f)
+
+        self.assertEqual(count_notification_logs(), 2)
+        self.assertEqual(count_notification_logs(since=2), 1)
+        log_notification_sent('Sonarr', 'New episode')
+        self.assertEqual(count_notification_logs(since=2), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Comprehensive tests for functions/log_segments.py module.
+Tests appending, rotation, retention and backwards reads of JSONL segments.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.log_segments import SegmentLog
+
+def _entry(i):
+    return {'timestamp': '2024-01-15 10:00:00', 'message': f'log {i}', 'category': 'General'}
+
+class TestSegmentLog(unittest.TestCase):
+    """Test suite for log_segments.py functions"""
+
+    def setUp(self):
+        """Set up a fresh log directory for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.test_dir, 'logs')
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_append_and_read(self):
+        """Test that entries come back in order"""
+        log = SegmentLog(self.log_dir)
+        for i in range(3):
+            log.append(_entry(i))
+
+        self.assertEqual([e['message'] for e in log.read_all()], ['log 0', 'log 1', 'log 2'])
+        self.assertEqual([e['message'] for e in log.read_recent(2)], ['log 2', 'log 1'])
+        self.assertEqual(log.count(), 3)
+
+    def test_rotation_and_retention(self):
+        """Test that full segments are sealed and old ones dropped whole"""
+        log = SegmentLog(self.log_dir, max_bytes=300)
+        for i in range(100):
+            log.append(_entry(i), retention=20)
+
+        entries = log.read_all()
+        self.assertGreaterEqual(len(entries), 20)
+        self.assertEqual(entries[-1]['message'], 'log 99')
+        self.assertEqual(log.count(), len(entries))
+        self.assertGreater(log.get_stats()['segments'], 1)
+
+    def test_read_recent_stops_at_newest_segments(self):
+        """Test that a small read doesn't touch old segments"""
+        log = SegmentLog(self.log_dir, max_bytes=300)
+        for i in range(50):
+            log.append(_entry(i))
+        segments = sorted(os.listdir(self.log_dir))
+
+        with patch.object(log, '_read_segment', wraps=log._read_segment) as read_segment:
+            self.assertEqual(log.read_recent(1)[0]['message'], 'log 49')
+
+        self.assertGreater(len(segments), 2)
+        self.assertEqual(read_segment.call_count, 1)
+
+    def test_torn_line_is_skipped(self):
+        """Test that a partial trailing line doesn't break reads"""
+        log = SegmentLog(self.log_dir)
+        log.append(_entry(0))
+        with open(os.path.join(self.log_dir, os.listdir(self.log_dir)[0]), 'a') as f:
+            f.write('{"timestamp": "2024')
+
+        self.assertEqual(len(log.read_all()), 1)
+
+    def test_replace_is_seen_by_other_writers(self):
+        """Test that a writer whose segment was replaced moves on to the new one"""
+        writer = SegmentLog(self.log_dir)
+        other = SegmentLog(self.log_dir)
+        writer.append(_entry(0))
+
+        other.replace([])
+        writer.append(_entry(1))
+
+        self.assertEqual([e['message'] for e in other.read_all()], ['log 1'])
+        self.assertEqual(len(os.listdir(self.log_dir)), 1)
+
+    def test_import_legacy(self):
+        """Test the one-shot import of a JSON array log file"""
+        legacy_file = os.path.join(self.test_dir, 'notification_logs.json')
+        with open(legacy_file, 'w') as f:
+            json.dump([_entry(0), _entry(1)], f)
+        log = SegmentLog(self.log_dir)
+
+        self.assertEqual(log.import_legacy(legacy_file), 2)
+        self.assertEqual(len(log.read_all()), 2)
+        self.assertTrue(os.path.exists(legacy_file + '.migrated'))
+        self.assertEqual(log.import_legacy(legacy_file), 0)
+
+if __name__ == '__main__':
+    unittest.main()
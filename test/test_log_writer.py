@@ -0,0 +1,128 @@
+"""
+Comprehensive tests for functions/log_writer.py module.
+Tests queueing, group commit, flushing and the log_notification hand-off.
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.log_writer import AsyncLogWriter, batch_per_target
+from functions.config import get_logs, flush_logs
+from functions.utils import log_notification, log_notification_sent, get_notification_logs
+from test_data import DataDirTestCase
+
+class TestAsyncLogWriter(unittest.TestCase):
+    """Test suite for log_writer.py functions"""
+
+    def setUp(self):
+        """Collect written batches in memory"""
+        self.batches = []
+
+    def test_flush_writes_everything_in_order(self):
+        """Test that flush waits for every queued item"""
+        writer = AsyncLogWriter('test', self.batches.append, max_latency=5)
+        for i in range(10):
+            writer.submit(i)
+
+        self.assertTrue(writer.flush())
+        self.assertEqual([item for batch in self.batches for item in batch], list(range(10)))
+        self.assertEqual(writer.get_stats()['written'], 10)
+        self.assertEqual(writer.get_stats()['depth'], 0)
+
+    def test_burst_is_group_committed(self):
+        """Test that a burst is written in a few batches, not one write per entry"""
+        writer = AsyncLogWriter('test', self.batches.append, batch_size=50, max_latency=0.5)
+        for i in range(100):
+            writer.submit(i)
+        writer.flush()
+
+        self.assertLess(len(self.batches), 10)
+        self.assertLessEqual(max(len(batch) for batch in self.batches), 50)
+
+    def test_max_latency_bounds_the_wait(self):
+        """Test that a lone entry is written without a flush once max_latency passes"""
+        written = threading.Event()
+        writer = AsyncLogWriter('test', lambda batch: written.set(), max_latency=0.05)
+        writer.submit('x')
+
+        self.assertTrue(written.wait(2))
+
+    def test_full_queue_drops_and_counts(self):
+        """Test that entries beyond the queue size are dropped, not blocking the caller"""
+        release = threading.Event()
+        writer = AsyncLogWriter('test', lambda batch: release.wait(2), batch_size=1,
+                                max_latency=0, max_queue=2)
+        results = [writer.submit(i) for i in range(10)]
+        release.set()
+        writer.flush()
+
+        self.assertIn(False, results)
+        self.assertEqual(writer.get_stats()['dropped'], results.count(False))
+
+    def test_write_errors_are_counted(self):
+        """Test that a failing batch doesn't kill the writer"""
+        calls = []
+        def write(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise OSError('disk full')
+        writer = AsyncLogWriter('test', write, max_latency=0)
+        writer.submit(1)
+        writer.flush()
+        writer.submit(2)
+        writer.flush()
+
+        stats = writer.get_stats()
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['written'], 1)
+
+    @patch('functions.sqlite_store.append_logs')
+    def test_batch_per_target(self, mock_append_logs):
+        """Test that a batch is written with one append per target"""
+        file_appends = []
+        write_batch = batch_per_target('append_logs', lambda *args: file_appends.append(args))
+        write_batch([(('json', 'a.json'), 1, 10), (('sqlite', 'x.db'), 2, 10),
+                     (('json', 'a.json'), 3, 20), (('json', 'b.json'), 4, 10)])
+
+        self.assertEqual(file_appends, [('a.json', [1, 3], 20), ('b.json', [4], 10)])
+        mock_append_logs.assert_called_once_with('x.db', [2], 10)
+
+class TestQueuedLogging(DataDirTestCase):
+    """Test that log_notification hands entries to the writer"""
+
+    data_config = {'log_retention': 100, 'notification_log_retention': 100}
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        # Write queued entries while the temp dir still exists
+        flush_logs()
+        get_notification_logs()
+        super().tearDown()
+
+    def test_log_notification_does_not_write_synchronously(self):
+        """Test that the caller returns before the entry is on disk"""
+        with patch('functions.config.SegmentLog.append_many', side_effect=lambda *a: time.sleep(0.3)):
+            start = time.monotonic()
+            log_notification('Flow check done')
+            self.assertLess(time.monotonic() - start, 0.2)
+            flush_logs()
+
+    def test_reads_see_queued_entries(self):
+        """Test that readers flush the queue first"""
+        for i in range(5):
+            log_notification(f'message {i}', 'General')
+        log_notification_sent('Flow', 'Hello')
+
+        self.assertEqual([log['message'] for log in get_logs()], [f'message {i}' for i in range(5)])
+        self.assertEqual(get_notification_logs()[-1]['flow_name'], 'Flow')
+
+if __name__ == '__main__':
+    unittest.main()
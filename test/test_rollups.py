@@ -0,0 +1,141 @@
+"""
+Comprehensive tests for functions/rollups.py module.
+Tests minute/hour/day activity buckets, window sums and latency percentiles.
+"""
+
+import unittest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.events import make_event, record_event, clear_event_cache
+from functions.rollups import (
+    RollupSeries, latency_percentile, record_rollup_event, record_change_detected,
+    get_timeseries, get_window_totals, clear_rollup_cache, get_change_rollups_file, LATENCY_BUCKETS_MS
+)
+from test_data import DataDirTestCase
+
+# 2024-01-15 14:00:00 UTC, on an hour and day boundary of the epoch
+NOW = 1705327200.0
+
+def _event(flow_name, outcome, seconds_ago=0, latency_ms=None):
+    return make_event(flow_name, 'timer', outcome, 204, latency_ms, ts=(NOW - seconds_ago) * 1000)
+
+class TestRollups(DataDirTestCase):
+    """Test suite for rollups.py functions"""
+
+    data_config = {}
+
+    def setUp(self):
+        """Start every test with empty rollups"""
+        super().setUp()
+        clear_rollup_cache()
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        clear_rollup_cache()
+        clear_event_cache()
+        super().tearDown()
+
+    def test_series_ring_reuses_slots(self):
+        """Test that a slot is reset when a newer bucket takes it over and older events are dropped"""
+        series = RollupSeries(60, 3)
+        series.add(0, 0)
+        series.add(30, 0)
+        series.add(180, 0)  # same slot as bucket 0, three minutes later
+        series.add(10, 0)   # too old for the ring now
+
+        self.assertEqual([values[0] for _, values in series.last(3, 180)], [0, 0, 1])
+        self.assertEqual([start for start, _ in series.last(3, 180)], [60, 120, 180])
+
+    def test_latency_percentile(self):
+        """Test percentiles from histogram counts"""
+        histogram = [0] * len(LATENCY_BUCKETS_MS)
+        histogram[2] = 90  # <= 100 ms
+        histogram[5] = 10  # <= 800 ms
+
+        self.assertEqual(latency_percentile(histogram, 50), 100)
+        self.assertEqual(latency_percentile(histogram, 95), 800)
+        self.assertIsNone(latency_percentile([0] * len(LATENCY_BUCKETS_MS), 50))
+
+    def test_timeseries_per_resolution(self):
+        """Test that events land in the minute, hour and day buckets they fall in"""
+        record_rollup_event(_event('Flow', 'sent', seconds_ago=30, latency_ms=80))
+        record_rollup_event(_event('Flow', 'failed', seconds_ago=90))
+        record_rollup_event(_event('Flow', 'skipped', seconds_ago=2 * 3600 - 1))
+        record_change_detected('Flow', ts=NOW - 30)
+
+        minutes = get_timeseries('Flow', 'minute', 2, now=NOW - 1)
+        self.assertEqual([b['start'] for b in minutes], [(NOW - 120) * 1000, (NOW - 60) * 1000])
+        self.assertEqual((minutes[0]['failures'], minutes[1]['sends'], minutes[1]['changes']), (1, 1, 1))
+        self.assertEqual(minutes[1]['latency_p50'], 100)
+
+        hours = get_timeseries('Flow', 'hour', 2, now=NOW - 1)
+        self.assertEqual([(b['sends'], b['failures'], b['skips']) for b in hours], [(0, 0, 1), (1, 1, 0)])
+        self.assertEqual(get_timeseries('Flow', 'day', 1, now=NOW - 1)[0]['sends'], 1)
+
+    def test_window_totals(self):
+        """Test summing the last N hours, per flow and for all flows"""
+        record_rollup_event(_event('A', 'sent', seconds_ago=3600))
+        record_rollup_event(_event('B', 'sent', seconds_ago=5 * 3600))
+        record_rollup_event(_event('A', 'sent', seconds_ago=30 * 3600))
+        record_rollup_event(_event(None, 'sent', seconds_ago=60))
+
+        self.assertEqual(get_window_totals('A', 24, now=NOW)['sends'], 1)
+        self.assertEqual(get_window_totals(None, 24, now=NOW)['sends'], 3)
+        self.assertEqual(get_window_totals('A', 24 * 7, now=NOW)['sends'], 2)
+        self.assertEqual(get_window_totals('A', 1, now=NOW)['resolution'], 'minute')
+
+    def test_window_totals_stay_inside_the_window(self):
+        """Test that buckets starting before the window are left out"""
+        record_rollup_event(_event('A', 'sent', seconds_ago=23 * 3600 + 1800))
+        record_rollup_event(_event('A', 'sent', seconds_ago=24 * 3600 + 1800))
+        # In the day bucket starting 206 hours ago, which 200 hours no longer reach
+        record_rollup_event(_event('A', 'sent', seconds_ago=205 * 3600))
+
+        totals = get_window_totals('A', 24, now=NOW)
+        self.assertEqual(totals['sends'], 1)
+        self.assertEqual(totals['since'], (NOW - 24 * 3600) * 1000)
+        self.assertEqual(get_window_totals('A', 200, now=NOW)['sends'], 2)
+
+    def test_detected_changes_survive_a_restart(self):
+        """Test that detected changes, which are not events, are restored from storage"""
+        record_change_detected('Flow', ts=NOW - 30)
+        record_change_detected('Flow', ts=NOW - 3 * 86400)
+        clear_rollup_cache()
+
+        self.assertTrue(os.path.exists(get_change_rollups_file()))
+        self.assertEqual(get_window_totals('Flow', 1, now=NOW)['changes'], 1)
+        self.assertEqual(get_window_totals(None, 24 * 7, now=NOW)['changes'], 2)
+        self.assertEqual(get_timeseries('Flow', 'day', 4, now=NOW)[0]['changes'], 1)
+
+    def test_unknown_flow_and_resolution(self):
+        """Test empty series for flows without activity and invalid resolutions"""
+        self.assertEqual([b['sends'] for b in get_timeseries('Nothing', 'hour', 3, now=NOW)], [0, 0, 0])
+        with self.assertRaises(ValueError):
+            get_timeseries('Nothing', 'week')
+
+    def test_rebuilt_from_events(self):
+        """Test that the rollups start from the retained events"""
+        record_event(**_event('Flow', 'sent', seconds_ago=10))
+        clear_rollup_cache()
+
+        self.assertEqual(get_window_totals('Flow', 1, now=NOW)['sends'], 1)
+
+class TestRollupsSqlite(TestRollups):
+    """Run the same tests against the SQLite backend"""
+
+    backend = 'sqlite'
+
+    def test_detected_changes_survive_a_restart(self):
+        """Test that detected changes are restored from the change_rollups table"""
+        record_change_detected('Flow', ts=NOW - 30)
+        clear_rollup_cache()
+
+        self.assertFalse(os.path.exists(get_change_rollups_file()))
+        self.assertEqual(get_window_totals('Flow', 1, now=NOW)['changes'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
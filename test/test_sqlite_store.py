@@ -0,0 +1,231 @@
+"""
+Comprehensive tests for functions/sqlite_store.py module.
+Tests the SQLite storage engine and the config.py/utils.py API on top of it.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import sys
+import copy
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import sqlite_store
+from functions.config import (
+    initialize_files, get_config, save_config, get_logs, save_logs, append_log,
+    increment_notification_counter
+)
+from functions.utils import get_notification_logs, append_notification_log
+from functions.counters import get_total_sent, clear_counter_cache
+from test_data import SAMPLE_CONFIG, SAMPLE_LOGS, SAMPLE_NOTIFICATION_LOGS, DataDirTestCase
+
+class TestSqliteStore(unittest.TestCase):
+    """Test suite for sqlite_store.py functions"""
+
+    def setUp(self):
+        """Set up a fresh database for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'turtifications.db')
+        self.addCleanup(sqlite_store.close_connections)
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_connection_uses_wal_mode(self):
+        """Test that the database is opened in WAL mode"""
+        conn = sqlite_store.get_connection(self.db_path)
+        mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode.lower(), 'wal')
+
+    def test_save_and_load_config_round_trip(self):
+        """Test that a config survives a save/load round trip"""
+        sqlite_store.save_config(self.db_path, copy.deepcopy(SAMPLE_CONFIG))
+
+        loaded = sqlite_store.load_config(self.db_path)
+
+        self.assertEqual(loaded['discord_webhook'], SAMPLE_CONFIG['discord_webhook'])
+        self.assertEqual([f['name'] for f in loaded['notification_flows']],
+                         [f['name'] for f in SAMPLE_CONFIG['notification_flows']])
+        self.assertEqual(sqlite_store.get_flow_state(self.db_path, 'Sonarr Downloads')['last_value'],
+                         'Breaking Bad - Pilot')
+
+    def test_runtime_state_stored_separately(self):
+        """Test that last_value lives in flow_state, not the flow definition"""
+        sqlite_store.save_config(self.db_path, copy.deepcopy(SAMPLE_CONFIG))
+        conn = sqlite_store.get_connection(self.db_path)
+
+        definition = json.loads(conn.execute(
+            "SELECT definition FROM flows WHERE name = 'Sonarr Downloads'").fetchone()[0])
+        state = conn.execute(
+            "SELECT last_value FROM flow_state WHERE flow_name = 'Sonarr Downloads'").fetchone()
+
+        self.assertNotIn('last_value', definition)
+        self.assertEqual(json.loads(state[0]), 'Breaking Bad - Pilot')
+
+    def test_save_config_writes_only_changed_rows(self):
+        """Test that changing one last_value touches a single row"""
+        config = copy.deepcopy(SAMPLE_CONFIG)
+        sqlite_store.save_config(self.db_path, config)
+        conn = sqlite_store.get_connection(self.db_path)
+
+        config['notification_flows'][1]['last_value'] = 'Offline'
+        before = conn.total_changes
+        sqlite_store.save_config(self.db_path, config)
+
+        # One flow_state row plus the generation counter in meta
+        self.assertEqual(conn.total_changes - before, 2)
+
+    def test_save_config_removes_deleted_flows(self):
+        """Test that deleted flows are removed"""
+        config = copy.deepcopy(SAMPLE_CONFIG)
+        sqlite_store.save_config(self.db_path, config)
+
+        config['notification_flows'].pop(0)
+        sqlite_store.save_config(self.db_path, config)
+        loaded = sqlite_store.load_config(self.db_path)
+
+        self.assertEqual(len(loaded['notification_flows']), len(SAMPLE_CONFIG['notification_flows']) - 1)
+        self.assertNotIn('Sonarr Downloads', [f['name'] for f in loaded['notification_flows']])
+
+    def test_flow_state_row_round_trip(self):
+        """Test single-row flow state reads and writes"""
+        sqlite_store.set_flow_state(self.db_path, 'Timer', {'last_value': None, 'last_run': 12.5})
+
+        self.assertEqual(sqlite_store.get_flow_state(self.db_path, 'Timer'),
+                         {'last_value': None, 'last_run': 12.5})
+        sqlite_store.delete_flow_state(self.db_path, 'Timer')
+        self.assertEqual(sqlite_store.get_flow_state(self.db_path, 'Timer'), {})
+
+    def test_config_generation_increments(self):
+        """Test that every save bumps the config generation"""
+        sqlite_store.save_config(self.db_path, {'check_interval': 5})
+        first = sqlite_store.get_config_generation(self.db_path)
+        sqlite_store.save_config(self.db_path, {'check_interval': 6})
+
+        self.assertEqual(sqlite_store.get_config_generation(self.db_path), first + 1)
+
+    def test_append_log_enforces_retention(self):
+        """Test that appending trims old log rows"""
+        for i in range(15):
+            sqlite_store.append_log(self.db_path, {'timestamp': '2024-01-15 10:00:00',
+                                                   'message': f'log {i}', 'category': 'General'}, 10)
+
+        logs = sqlite_store.get_logs(self.db_path)
+
+        self.assertEqual(len(logs), 10)
+        self.assertEqual(logs[0]['message'], 'log 5')
+        self.assertEqual(logs[-1]['message'], 'log 14')
+
+    def test_append_notification_log_enforces_retention(self):
+        """Test that sent-notification records are trimmed"""
+        for i in range(5):
+            sqlite_store.append_notification_log(self.db_path, {'timestamp': '2024-01-15 10:00:00',
+                                                                'flow_name': f'flow {i}'}, 3)
+
+        logs = sqlite_store.get_notification_logs(self.db_path)
+
+        self.assertEqual([log['flow_name'] for log in logs], ['flow 2', 'flow 3', 'flow 4'])
+
+    def test_save_and_get_counters(self):
+        """Test the counters table round trip"""
+        self.assertIsNone(sqlite_store.get_counters(self.db_path))
+
+        sqlite_store.save_counters(self.db_path, {'total': 7, 'flows': {'A': 3, 'B': 4}})
+        sqlite_store.save_counters(self.db_path, {'total': 8, 'flows': {'A': 4}})
+
+        self.assertEqual(sqlite_store.get_counters(self.db_path), {'total': 8, 'flows': {'A': 4}})
+
+    def test_migrate_from_json(self):
+        """Test the one-shot migration from the JSON data files"""
+        config_file = os.path.join(self.test_dir, 'config.json')
+        log_file = os.path.join(self.test_dir, 'notification_logs.json')
+        notification_log_file = os.path.join(self.test_dir, 'sent_notifications.json')
+        with open(config_file, 'w') as f:
+            json.dump(SAMPLE_CONFIG, f)
+        with open(log_file, 'w') as f:
+            json.dump(SAMPLE_LOGS, f)
+        with open(notification_log_file, 'w') as f:
+            json.dump(SAMPLE_NOTIFICATION_LOGS, f)
+
+        summary = sqlite_store.migrate_from_json(self.db_path, config_file, log_file, notification_log_file)
+
+        self.assertEqual(summary['flows'], len(SAMPLE_CONFIG['notification_flows']))
+        self.assertEqual(summary['logs'], len(SAMPLE_LOGS))
+        self.assertEqual(len(sqlite_store.get_notification_logs(self.db_path)), len(SAMPLE_NOTIFICATION_LOGS))
+
+        # Second run is a no-op
+        self.assertIsNone(sqlite_store.migrate_from_json(self.db_path, config_file, log_file, notification_log_file))
+
+class TestSqliteBackend(DataDirTestCase):
+    """Test the config.py/utils.py API with the SQLite backend enabled"""
+
+    backend = 'sqlite'
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        # Flush buffered counts while the temp dir still exists
+        clear_counter_cache()
+        super().tearDown()
+
+    def test_initialize_files_creates_default_config(self):
+        """Test that initialize_files seeds the database instead of JSON files"""
+        initialize_files()
+
+        config = get_config()
+
+        self.assertEqual(config['check_interval'], 5)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'config.json')))
+
+    def test_initialize_files_migrates_existing_json(self):
+        """Test that existing JSON files are imported on first start"""
+        with open(os.path.join(self.test_dir, 'config.json'), 'w') as f:
+            json.dump(SAMPLE_CONFIG, f)
+
+        initialize_files()
+
+        self.assertEqual(len(get_config()['notification_flows']), len(SAMPLE_CONFIG['notification_flows']))
+
+    def test_save_config_visible_to_get_config(self):
+        """Test that saves invalidate the cached config"""
+        initialize_files()
+        config = get_config()
+        config['check_interval'] = 30
+        save_config(config)
+
+        self.assertEqual(get_config()['check_interval'], 30)
+
+    def test_logs_go_through_database(self):
+        """Test log append, read and replace"""
+        initialize_files()
+        append_log({'timestamp': '2024-01-15 10:00:00', 'message': 'hello', 'category': 'General'}, 100)
+
+        self.assertEqual(get_logs()[-1]['message'], 'hello')
+        save_logs([])
+        self.assertEqual(get_logs(), [])
+
+    def test_notification_logs_go_through_database(self):
+        """Test sent-notification logging with the SQLite backend"""
+        initialize_files()
+        append_notification_log({'timestamp': '2024-01-15 10:00:00', 'flow_name': 'Test'}, 10)
+
+        self.assertEqual(get_notification_logs()[-1]['flow_name'], 'Test')
+
+    def test_increment_notification_counter(self):
+        """Test that the counter increments without a config rewrite"""
+        initialize_files()
+        db_path = os.path.join(self.test_dir, 'turtifications.db')
+        generation = sqlite_store.get_config_generation(db_path)
+        increment_notification_counter('Test')
+        clear_counter_cache()
+
+        self.assertEqual(get_total_sent(), 1)
+        self.assertEqual(sqlite_store.get_counters(db_path), {'total': 1, 'flows': {'Test': 1}})
+        self.assertEqual(sqlite_store.get_config_generation(db_path), generation)
+
+if __name__ == '__main__':
+    unittest.main()
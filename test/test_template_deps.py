@@ -0,0 +1,153 @@
+"""
+Comprehensive tests for functions/template_deps.py module.
+Tests template dependency analysis, memo keys, payload projection and render memoization.
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch, Mock
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.template_deps import (
+    RenderMemo, NO_DEPENDENCIES, WHOLE_DATA, get_render_memo_stats, clear_render_memo
+)
+from functions.utils import template_dependencies, format_message_template
+from functions.embed_utils import embed_dependencies
+from functions.flow_spec import FlowSpec
+from functions.flow_state import payload_to_store
+from functions.notifications import send_discord_notification
+
+class TestTemplateDependencies(unittest.TestCase):
+    """Test suite for template_deps.py functions"""
+
+    def test_template_dependencies(self):
+        """Test the paths, user variables and flags found in templates"""
+        deps = template_dependencies("{series['title']} S{episode.season} {$owner} {img:{poster.url}}")
+        self.assertEqual(deps.as_dict(), {
+            'data_paths': ['$owner', 'episode.season', 'poster.url', 'series.title'],
+            'user_variables': ['owner'], 'volatile': False, 'whole_data': False, 'calc_scope': False
+        })
+        self.assertTrue(template_dependencies("At {time}").volatile)
+        self.assertTrue(template_dependencies("{data}").whole_data)
+        self.assertTrue(template_dependencies("[{price} * 2]").calc_scope)
+        self.assertIs(template_dependencies(None), WHOLE_DATA)
+        self.assertIs(template_dependencies("Hi {name}"), template_dependencies("Hi {name}"))
+
+    def test_embed_dependencies(self):
+        """Test embed templates, dynamic fields and color rules"""
+        embed = {'enabled': True, 'title': '{series.title}', 'fields': [{'name': 'Size', 'value': '{size}'}],
+                 'dynamic_fields': [{'enabled': True, 'name': 'Quality', 'path': 'release.quality'}]}
+        self.assertEqual(embed_dependencies(embed).as_dict()['data_paths'],
+                         ['release.quality', 'series.title', 'size'])
+        self.assertTrue(embed_dependencies(dict(embed, color_mode='if')).whole_data)
+        self.assertIs(embed_dependencies({'enabled': False, 'title': '{x}'}), NO_DEPENDENCIES)
+
+    def test_memo_key(self):
+        """Test that keys only change with the values renders read"""
+        deps = template_dependencies("{title} {stats.size}")
+        key = deps.memo_key({'title': 'A', 'stats': {'size': 1, 'other': 1}, 'noise': 1})
+        self.assertEqual(deps.memo_key({'title': 'A', 'stats': {'size': 1}, 'noise': 2}), key)
+        self.assertNotEqual(deps.memo_key({'title': 'A', 'stats': {'size': 1.0}}), key)
+        # A null value renders differently from a missing one
+        self.assertNotEqual(deps.memo_key({'title': None}), deps.memo_key({}))
+        self.assertIsNone(template_dependencies("{time}").memo_key({}))
+
+    def test_memo_key_with_calculations(self):
+        """Test that a value inserted into a calculation may name another top-level value"""
+        deps = template_dependencies("[{price} * 2]")
+        data = {'price': 'base', 'base': 3, 'nested': {'x': 1}}
+        self.assertEqual(format_message_template("[{price} * 2]", data), "6")
+        self.assertNotEqual(deps.memo_key(data), deps.memo_key(dict(data, base=4)))
+        self.assertEqual(deps.memo_key(data), deps.memo_key(dict(data, nested={'x': 2})))
+
+    def test_project(self):
+        """Test that projected data renders the same"""
+        template = "{series['title']} {items.1.name} {meta}"
+        data = {'series': {'title': 'B', 'overview': 'x' * 100}, 'items': [{'name': 'a'}, {'name': 'b', 'id': 2}],
+                'meta': {'k': [1, 2]}, 'other': 1}
+        projected = template_dependencies(template).project(data)
+        self.assertEqual(projected, {'series': {'title': 'B'}, 'items': [None, {'name': 'b'}], 'meta': {'k': [1, 2]}})
+        self.assertEqual(format_message_template(template, projected), format_message_template(template, data))
+        self.assertIs(WHOLE_DATA.project(data), data)
+        self.assertEqual(template_dependencies("[{a.b} + 1]").project({'a': {'b': 1, 'c': 2}, 'n': 5, 'd': {}}),
+                         {'a': {'b': 1}, 'n': 5})
+
+    def test_payload_to_store(self):
+        """Test that payloads are only projected with the project_last_data setting"""
+        deps = template_dependencies("{title}")
+        with patch('functions.flow_state.get_config', return_value={}):
+            self.assertEqual(payload_to_store({'title': 'A', 'big': 'x'}, deps), {'title': 'A', 'big': 'x'})
+        with patch('functions.flow_state.get_config', return_value={'project_last_data': True}):
+            self.assertEqual(payload_to_store({'title': 'A', 'big': 'x'}, deps), {'title': 'A'})
+
+    def test_render_memo(self):
+        """Test least-recently-used eviction and hit counts"""
+        memo = RenderMemo(size=2)
+        memo.put('a', 1)
+        memo.put('b', 2)
+        self.assertEqual(memo.get('a'), 1)
+        memo.put('c', 3)
+        self.assertIsNone(memo.get('b'))
+        self.assertEqual(memo.get_stats(), {'entries': 2, 'hits': 1, 'misses': 1})
+
+class TestRenderMemoization(unittest.TestCase):
+    """Test that sends of a flow reuse renders with the same inputs"""
+
+    def setUp(self):
+        clear_render_memo()
+        self.addCleanup(clear_render_memo)
+        self.config = {'user_variables': {'team': 'Ops'}}
+        patchers = [
+            patch('functions.notifications.get_config', return_value=self.config),
+            patch('functions.notifications._record_delivery'),
+            patch('functions.notifications.log_notification'),
+            patch('functions.notifications.log_notification_sent'),
+            patch('functions.notifications.increment_notification_counter'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch('functions.notifications.requests.post')
+    def test_same_inputs_render_once(self, mock_post):
+        """Test that the message and embed are rendered once for the same values"""
+        mock_post.return_value = Mock(status_code=204)
+        flow = {'name': 'Grabs', 'webhook_url': 'https://discord.test/webhook', 'message_template': '{title} for {$team}',
+                'embed_config': {'enabled': True, 'title': '{title}', 'timestamp': True}}
+        spec = FlowSpec(flow, self.config, index=0)
+        hits = get_render_memo_stats()['hits']
+
+        with patch('functions.notifications.format_message_template', wraps=format_message_template) as mock_format:
+            for data in ({'title': 'A', 'id': 1}, {'title': 'A', 'id': 2}, {'title': 'B', 'id': 3}):
+                self.assertTrue(send_discord_notification(spec.message_template, spec, data, trigger='webhook'))
+        self.assertEqual(mock_format.call_count, 2)
+        self.assertEqual([call.kwargs['json']['content'] for call in mock_post.call_args_list],
+                         ['A for Ops', 'A for Ops', 'B for Ops'])
+        self.assertEqual(mock_post.call_args_list[1].kwargs['json']['embeds'][0]['title'], 'A')
+        self.assertEqual(get_render_memo_stats()['hits'] - hits, 1)
+
+    @patch('functions.notifications.requests.post')
+    def test_user_variables_and_volatile_templates(self, mock_post):
+        """Test that changed user variables and {time} templates are rendered again"""
+        mock_post.return_value = Mock(status_code=204)
+        spec = FlowSpec({'name': 'A', 'webhook_url': 'https://discord.test/webhook', 'message_template': '{$team}'},
+                        self.config, index=0)
+        timed = FlowSpec({'name': 'B', 'webhook_url': 'https://discord.test/webhook', 'message_template': '{time}'},
+                         self.config, index=1)
+        before = get_render_memo_stats()
+
+        send_discord_notification(spec.message_template, spec, {})
+        self.config['user_variables'] = {'team': 'Dev'}
+        send_discord_notification(spec.message_template, spec, {})
+        send_discord_notification(timed.message_template, timed, {})
+        send_discord_notification(timed.message_template, timed, {})
+        self.assertEqual(mock_post.call_args_list[1].kwargs['json']['content'], 'Dev')
+        after = get_render_memo_stats()
+        self.assertEqual((after['entries'], after['hits'] - before['hits'], after['misses'] - before['misses']),
+                         (2, 0, 2))
+
+if __name__ == '__main__':
+    unittest.main()
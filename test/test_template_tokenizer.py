@@ -0,0 +1,90 @@
+"""
+Comprehensive tests for functions/template_tokenizer.py module.
+Tests tokenizing message templates, escapes, Markdown brackets and syntax errors.
+"""
+
+import unittest
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions.template_tokenizer import (
+    tokenize_template, check_template, TEXT, PLACEHOLDER, CALC_START, CALC_END
+)
+
+def _tokens(template):
+    return [(kind, value) for kind, value, _ in tokenize_template(template)[0]]
+
+class TestTemplateTokenizer(unittest.TestCase):
+    """Test suite for template_tokenizer.py functions"""
+
+    def test_placeholders_and_positions(self):
+        """Test text and placeholder tokens with their positions, nested braces included"""
+        tokens, errors = tokenize_template("Hi {name}, see {img:{url}}")
+
+        self.assertEqual(tokens, [(TEXT, 'Hi ', 0), (PLACEHOLDER, 'name', 3), (TEXT, ', see ', 9),
+                                  (PLACEHOLDER, 'img:{url}', 15)])
+        self.assertEqual(errors, [])
+
+    def test_calculations(self):
+        """Test that bracket spans become calculations, placeholders inside included"""
+        self.assertEqual(_tokens("Total: [{price} * 2]!"),
+                         [(TEXT, 'Total: '), (CALC_START, None), (PLACEHOLDER, 'price'), (TEXT, ' * 2'),
+                          (CALC_END, None), (TEXT, '!')])
+
+    def test_markdown_brackets_are_text(self):
+        """Test links, images, reference links and blank spans"""
+        for template in ["[Open {name}](https://example.com/{id})", "![poster](https://img.example.com/1.png)",
+                         "[docs][1] and [ ] todo", "[{img:https://img.example.com/{id}.png}]"]:
+            with self.subTest(template=template):
+                kinds = {kind for kind, _ in _tokens(template)}
+                self.assertNotIn(CALC_START, kinds)
+                self.assertEqual(tokenize_template(template)[1], [])
+
+    def test_escapes(self):
+        """Test that escaped characters are text and other backslashes are kept"""
+        self.assertEqual(_tokens(r"\{name\} costs \[price\] C:\temp \\{x}"),
+                         [(TEXT, "{name} costs [price] C:\\temp \\"), (PLACEHOLDER, 'x')])
+
+    def test_errors(self):
+        """Test that unbalanced characters are text and reported with their position"""
+        tokens, errors = tokenize_template("{a {b} c] [d")
+
+        self.assertEqual([(kind, value) for kind, value, _ in tokens],
+                         [(TEXT, '{a '), (PLACEHOLDER, 'b'), (TEXT, ' c] [d')])
+        self.assertEqual(errors, [(0, "Unclosed '{'"), (8, "Unmatched ']'"), (10, "Unclosed '['")])
+
+    def test_braces_inside_a_calculation(self):
+        """Test that a ] inside a placeholder does not close the span around it"""
+        tokens, errors = tokenize_template("[a {b] c}")
+
+        self.assertEqual([(kind, value) for kind, value, _ in tokens], [(TEXT, '[a '), (PLACEHOLDER, 'b] c')])
+        self.assertEqual(errors, [(0, "Unclosed '['")])
+
+    def test_check_template(self):
+        """Test error messages with line and column"""
+        self.assertEqual(check_template("Title\n**{series['title']**\n}}"),
+                         ["Unmatched '}' at line 3, column 2"])
+        self.assertEqual(check_template("ok {name}"), [])
+
+    def test_linear_time(self):
+        """Test that large unbalanced templates are tokenized quickly"""
+        for template in ["{" * 50000 + "x", "{a" * 25000 + "}" * 10, "[{]" * 20000, "[a{b]}" * 20000]:
+            started = time.monotonic()
+            tokenize_template(template)
+            self.assertLess(time.monotonic() - started, 2)
+
+    def test_nested_braces_in_linear_time(self):
+        """Test that deeply nested placeholders don't copy their content once per level"""
+        depth = 200000
+        started = time.monotonic()
+        tokens, errors = tokenize_template("{" * depth + "}" * depth)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(tokens, [(PLACEHOLDER, "{" * (depth - 1) + "}" * (depth - 1), 0)])
+        self.assertEqual(errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
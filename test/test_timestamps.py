@@ -0,0 +1,169 @@
+"""
+Comprehensive tests for functions/timestamps.py module.
+Tests epoch timestamps on logs and sent notifications, time-window lookups and the migration of existing data.
+"""
+
+import unittest
+import os
+import json
+import sqlite3
+import sys
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import sqlite_store
+from functions.timestamps import (
+    parse_display_time, format_ts, record_times, record_ts, add_epoch_ts, index_since, records_since
+)
+from functions.log_buffer import LogRingBuffer
+from functions.config import (
+    initialize_files, get_log_dir, get_recent_logs, flush_logs, save_logs, get_db_path
+)
+from functions.log_segments import SegmentLog
+from functions.utils import (
+    get_notification_logs, log_notification_sent, flush_notification_logs, log_notification
+)
+from test_data import DataDirTestCase
+
+def _entry(minute, message='log'):
+    return {'timestamp': f'2024-01-15 10:{minute:02d}:00', 'message': message, 'category': 'General'}
+
+class TestTimestamps(unittest.TestCase):
+    """Test suite for timestamps.py functions"""
+
+    def test_display_round_trip(self):
+        """Test that display strings and epoch ms describe the same local time"""
+        ts = parse_display_time('2024-01-15 10:30:00')
+        self.assertEqual(format_ts(ts), '2024-01-15 10:30:00')
+        self.assertEqual(parse_display_time('2024-01-15T10:30:00'), ts)
+        self.assertIsNone(parse_display_time('yesterday'))
+        self.assertIsNone(parse_display_time(None))
+
+        times = record_times(ts + 250)
+        self.assertEqual(times, {'timestamp': '2024-01-15 10:30:00', 'ts': ts + 250})
+
+    def test_record_ts_prefers_ts(self):
+        """Test that ts wins over the display string and records without either sort first"""
+        self.assertEqual(record_ts({'ts': 5, 'timestamp': '2024-01-15 10:30:00'}), 5)
+        self.assertEqual(record_ts(_entry(30)), parse_display_time('2024-01-15 10:30:00'))
+        self.assertEqual(record_ts({'message': 'no time'}), 0)
+
+    def test_add_epoch_ts(self):
+        """Test that only records lacking ts and having a readable time are changed"""
+        records = [_entry(1), {'ts': 7, 'timestamp': 'x'}, {'message': 'no time'}]
+
+        self.assertEqual(add_epoch_ts(records), 1)
+        self.assertEqual(records[0]['ts'], parse_display_time('2024-01-15 10:01:00'))
+        self.assertEqual(records[1]['ts'], 7)
+        self.assertNotIn('ts', records[2])
+
+    def test_window_lookup(self):
+        """Test binary search over records sorted oldest first, old and new records mixed"""
+        records = [_entry(minute) for minute in range(0, 60, 10)]
+        add_epoch_ts(records[3:])
+        since = parse_display_time('2024-01-15 10:25:00')
+
+        self.assertEqual(index_since(records, since), 3)
+        self.assertEqual([r['timestamp'][-5:] for r in records_since(records, since)],
+                         ['30:00', '40:00', '50:00'])
+        self.assertIs(records_since(records, None), records)
+        self.assertEqual(records_since(records, since + 10 ** 9), [])
+        self.assertEqual(index_since([{'ts': 5}, {'ts': 7}, {'ts': 7}, {'ts': 9}], 7), 1)
+        self.assertEqual(index_since([], since), 0)
+
+    def test_ring_buffer_since(self):
+        """Test the since filter of the in-memory log buffer, with and without a category"""
+        entries = [dict(_entry(minute), category='Errors' if minute % 20 else 'General')
+                   for minute in range(0, 60, 10)]
+        buffer = LogRingBuffer(10, entries)
+        since = parse_display_time('2024-01-15 10:25:00')
+
+        self.assertEqual([e['timestamp'][-5:] for e in buffer.newest(since=since)], ['50:00', '40:00', '30:00'])
+        self.assertEqual([e['timestamp'][-5:] for e in buffer.newest(1, since=since)], ['50:00'])
+        self.assertEqual([e['timestamp'][-5:] for e in buffer.newest(category='Errors', since=since)],
+                         ['50:00', '30:00'])
+
+class TestEpochTimestampStorage(DataDirTestCase):
+    """Test suite for epoch timestamps on stored logs and sent notifications"""
+
+    data_config = {'notification_flows': []}
+
+    def tearDown(self):
+        """Clean up test environment after each test"""
+        flush_logs()
+        flush_notification_logs()
+        super().tearDown()
+
+    def test_new_records_carry_ts(self):
+        """Test that logs and sent-notification records are written with ts"""
+        log_notification('System started', category='System')
+        log_notification_sent('Flow', 'Hello')
+        flush_logs()
+
+        log = get_recent_logs(1)[0]
+        notification = get_notification_logs()[0]
+        for record in (log, notification):
+            self.assertIsInstance(record['ts'], int)
+            self.assertEqual(format_ts(record['ts']), record['timestamp'])
+
+    def test_notification_logs_since(self):
+        """Test the time window of sent-notification records"""
+        with open(self.notification_log_file, 'w') as f:
+            json.dump([dict(_entry(minute), ts=minute) for minute in range(5)], f)
+
+        self.assertEqual([n['ts'] for n in get_notification_logs(since=3)], [3, 4])
+
+    def test_migration_of_json_files(self):
+        """Test that initialize_files adds ts to existing log and sent-notification files"""
+        SegmentLog(get_log_dir()).replace([_entry(1), _entry(2)])
+        with open(self.notification_log_file, 'w') as f:
+            json.dump([_entry(3)], f)
+
+        initialize_files()
+
+        stored_logs = SegmentLog(get_log_dir()).read_all()
+        self.assertEqual([log['ts'] for log in stored_logs],
+                         [parse_display_time('2024-01-15 10:01:00'), parse_display_time('2024-01-15 10:02:00')])
+        with open(self.notification_log_file) as f:
+            self.assertEqual(json.load(f)[0]['ts'], parse_display_time('2024-01-15 10:03:00'))
+
+    def test_sqlite_schema_upgrade(self):
+        """Test that an existing database gets ts columns filled from the stored display times"""
+        db_path = os.path.join(self.test_dir, 'turtifications.db')
+        conn = sqlite3.connect(db_path)
+        conn.executescript("""
+            CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL,
+                               category TEXT NOT NULL, entry TEXT NOT NULL);
+            CREATE TABLE sent_notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL,
+                                             flow_name TEXT, category TEXT, entry TEXT NOT NULL);
+        """)
+        for minute in (1, 2):
+            entry = _entry(minute)
+            conn.execute('INSERT INTO logs (timestamp, category, entry) VALUES (?, ?, ?)',
+                         (entry['timestamp'], entry['category'], json.dumps(entry)))
+            conn.execute('INSERT INTO sent_notifications (timestamp, flow_name, category, entry) '
+                         'VALUES (?, ?, ?, ?)', (entry['timestamp'], 'Flow', 'Notifications', json.dumps(entry)))
+        conn.commit()
+        conn.close()
+
+        since = parse_display_time('2024-01-15 10:02:00')
+        self.assertEqual([log['ts'] for log in sqlite_store.get_logs(db_path)],
+                         [parse_display_time('2024-01-15 10:01:00'), since])
+        self.assertEqual([n['timestamp'] for n in sqlite_store.get_notification_logs(db_path, since)],
+                         ['2024-01-15 10:02:00'])
+
+    def test_sqlite_backend_windows(self):
+        """Test time windows with the SQLite backend"""
+        with patch('functions.config.STORAGE_BACKEND', 'sqlite'):
+            self.assertEqual(get_db_path(), os.path.join(self.test_dir, 'turtifications.db'))
+            sqlite_store.replace_notification_logs(get_db_path(), [_entry(1), _entry(2), _entry(3)])
+            save_logs([_entry(1), _entry(2)])
+
+            since = parse_display_time('2024-01-15 10:02:00')
+            self.assertEqual(len(get_notification_logs(since=since)), 2)
+            self.assertEqual([log['message'] for log in get_recent_logs(since=since)], ['log'])
+
+if __name__ == '__main__':
+    unittest.main()
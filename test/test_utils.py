@@ -17,7 +17,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from functions.utils import (
     get_notification_logs, save_notification_logs, detect_log_category,
     log_notification_sent, log_notification, format_message_template,
-    get_nested_value, evaluate_condition
+    compile_message_template, get_nested_value, evaluate_condition
 )
 from test_data import (
     SAMPLE_NOTIFICATION_LOGS, CONDITION_TEST_DATA, TEMPLATE_TEST_DATA,
@@ -247,6 +247,44 @@ class TestUtils(unittest.TestCase):
         expected = "🖥️ Status: online | Memory: 68.5% | Disk: 45.2%"
         self.assertEqual(result, expected)
 
+    def test_compile_message_template_cached(self):
+        """Test that a template is compiled once and the ops are reused"""
+        template = "Cached {name} [{count} * 2]"
+        ops = compile_message_template(template)
+        
+        self.assertIs(compile_message_template(template), ops)
+        self.assertEqual(format_message_template(template, {"name": "A", "count": 2}, {}), "Cached A 4")
+        self.assertEqual(format_message_template(template, {"name": "B", "count": 5}, {}), "Cached B 10")
+    
+    def test_format_message_template_bracket_calculations(self):
+        """Test [calculation] spans with placeholders inside and brackets that are not calculations"""
+        data = {"price": 10.5, "qty": "3", "title": "[1+1]"}
+        
+        self.assertEqual(format_message_template("Total: [price * qty]", data, {}), "Total: 31.50")
+        self.assertEqual(format_message_template("Twice: [{price} * 2]", data, {}), "Twice: 21")
+        self.assertEqual(format_message_template("Empty [] and [ unclosed", data, {}), "Empty [] and [ unclosed")
+        # Values from the data are not evaluated as calculations
+        self.assertEqual(format_message_template("{title}", data, {}), "[1+1]")
+    
+    def test_format_message_template_markdown_and_escapes(self):
+        """Test that Markdown links stay text and escaped brackets and braces are printed as is"""
+        data = {"title": "Dune", "id": 7, "price": 4}
+        
+        self.assertEqual(format_message_template("[{title}](https://example.com/{id})", data, {}),
+                         "[Dune](https://example.com/7)")
+        self.assertEqual(format_message_template(r"\[price\] is [price * 2], \{title\}", data, {}),
+                         "[price] is 8, {title}")
+    
+    def test_format_message_template_extract_images(self):
+        """Test that {img:url} placeholders are rendered into the image list"""
+        template = "Poster {img:https://img.example.com/{id}.png} for {name}"
+        data = {"id": 42, "name": "Dune"}
+        
+        self.assertEqual(format_message_template(template, data, {}, extract_images=True),
+                         ("Poster  for Dune", ["https://img.example.com/42.png"]))
+        self.assertEqual(format_message_template(template, data, {}),
+                         "Poster {img:https://img.example.com/{id}.png} for Dune")
+
     def test_get_nested_value_simple(self):
         """Test get_nested_value with simple paths"""
         data = {"name": "test", "status": "active"}
@@ -0,0 +1,130 @@
+"""
+Comprehensive tests for functions/write_behind.py module.
+Tests write coalescing, flushing, retries and write-through mode.
+"""
+
+import unittest
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from functions import write_behind
+from functions.write_behind import WriteBehind, flush_all, get_write_behind_stats
+
+class TestWriteBehind(unittest.TestCase):
+    """Test suite for the WriteBehind buffer"""
+
+    def setUp(self):
+        """Create a buffer that records its writes"""
+        self.writes = []
+        self.interval = 60
+        self.buffer = WriteBehind('test', lambda key, value: self.writes.append((key, value)),
+                                  lambda: self.interval)
+        self.addCleanup(self._unregister)
+
+    def _unregister(self):
+        self.buffer.flush()
+        write_behind._registry.remove(self.buffer)
+
+    def test_burst_coalesces_into_one_write(self):
+        """Test that repeated marks of one key produce a single write"""
+        for i in range(10):
+            self.buffer.mark_dirty('config', i)
+
+        self.assertEqual(self.writes, [])
+        self.buffer.flush()
+
+        self.assertEqual(self.writes, [('config', 9)])
+        stats = self.buffer.get_stats()
+        self.assertEqual(stats['coalesced'], 9)
+        self.assertEqual(stats['writes'], 1)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_pending_value_visible_before_flush(self):
+        """Test that readers can see the not-yet-written value"""
+        self.buffer.mark_dirty('a', {'x': 1})
+
+        self.assertTrue(self.buffer.is_pending('a'))
+        self.assertEqual(self.buffer.get_pending('a'), {'x': 1})
+        self.assertIsNone(self.buffer.get_pending('b'))
+
+    def test_flush_single_key(self):
+        """Test flushing one key leaves the others pending"""
+        self.buffer.mark_dirty('a', 1)
+        self.buffer.mark_dirty('b', 2)
+
+        self.buffer.flush('a')
+
+        self.assertEqual(self.writes, [('a', 1)])
+        self.assertTrue(self.buffer.is_pending('b'))
+
+    def test_discard_drops_pending_write(self):
+        """Test that a discarded key is never written"""
+        self.buffer.mark_dirty('a', 1)
+        self.buffer.discard('a')
+        self.buffer.flush()
+
+        self.assertEqual(self.writes, [])
+
+    def test_zero_interval_writes_through(self):
+        """Test that an interval <= 0 disables buffering"""
+        self.interval = 0
+        self.buffer.mark_dirty('a', 1)
+
+        self.assertEqual(self.writes, [('a', 1)])
+        self.assertFalse(self.buffer.is_pending('a'))
+
+    def test_timer_flushes_after_interval(self):
+        """Test that the background timer writes pending keys"""
+        self.interval = 0.05
+        self.buffer.mark_dirty('a', 1)
+
+        deadline = time.time() + 2
+        while not self.writes and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.writes, [('a', 1)])
+
+    def test_write_errors_are_counted(self):
+        """Test that a failing write is reported instead of raised"""
+        def failing_write(key, value):
+            raise IOError('disk full')
+        self.buffer.write_fn = failing_write
+        self.buffer.mark_dirty('a', 1)
+
+        self.buffer.flush()
+
+        self.assertEqual(self.buffer.get_stats()['errors'], 1)
+        self.buffer.write_fn = lambda key, value: self.writes.append((key, value))
+
+    def test_failed_write_is_retried(self):
+        """Test that a value whose write failed stays pending for the next flush"""
+        def failing_write(key, value):
+            raise IOError('disk full')
+        self.buffer.write_fn = failing_write
+        self.buffer.mark_dirty('a', 1)
+        self.buffer.mark_dirty('b', 2)
+        self.buffer.flush()
+
+        self.assertEqual(self.buffer.get_pending('a'), 1)
+        self.buffer.mark_dirty('b', 3)
+        self.buffer.write_fn = lambda key, value: self.writes.append((key, value))
+        self.buffer.flush()
+
+        self.assertEqual(sorted(self.writes), [('a', 1), ('b', 3)])
+        self.assertEqual(self.buffer.get_stats()['pending'], 0)
+
+    def test_flush_all_and_stats(self):
+        """Test the module-level shutdown flush and stats"""
+        self.buffer.mark_dirty('a', 1)
+
+        self.assertEqual(get_write_behind_stats()['test']['pending'], 1)
+        flush_all()
+
+        self.assertEqual(self.writes, [('a', 1)])
+
+if __name__ == '__main__':
+    unittest.main()